@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import numpy
+from scipy import sparse
+
+
+def normalize_rows(vectors, dtype=numpy.float64):
+    """
+    Scales every row to unit L2 norm, so that dot products are cosine similarities.
+    Rows of zeros are left as they are.
+    :param vectors: A scipy.sparse matrix or a NumPy array with a row per sample.
+    :param dtype: The floating point type of the result.
+    :return: A normalized CSR matrix, or NumPy array, of the given type.
+    """
+    if sparse.issparse(vectors):
+        vectors = sparse.csr_matrix(vectors, dtype=dtype, copy=True)
+        norms = numpy.sqrt(numpy.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        vectors.data /= numpy.repeat(norms, numpy.diff(vectors.indptr))
+        return vectors
+    vectors = numpy.array(vectors, dtype=dtype)
+    norms = numpy.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1
+    vectors /= norms[:, numpy.newaxis]
+    return vectors
+
+
+def knn_graph(vectors, n_neighbors, block_size=1024, max_block_bytes=2 ** 27):
+    """
+    Builds a sparse symmetric k-nearest-neighbour graph weighted by cosine
+    similarity. Similarities are computed exactly in float32, one block of rows
+    against all rows at a time, instead of the whole n x n kernel. Blocks have
+    at most block_size rows and are made shorter for many rows, so a block never
+    takes more than max_block_bytes.
+    :param vectors: A scipy.sparse matrix or a NumPy array with a row per sample.
+    :param n_neighbors: The number of neighbours of every sample.
+    :param block_size: The largest number of rows whose similarities are computed at a time.
+    :param max_block_bytes: The largest size of a block of similarities in bytes.
+    :return: A scipy.sparse.csr_matrix affinity, the average of the graph and its transpose.
+    """
+    assert isinstance(n_neighbors, int) and n_neighbors > 0
+    assert isinstance(block_size, int) and block_size > 0
+    normalized = normalize_rows(vectors, dtype=numpy.float32)
+    num_rows = normalized.shape[0]
+    n_neighbors = min(n_neighbors, num_rows - 1)
+    if n_neighbors <= 0:
+        return sparse.csr_matrix((num_rows, num_rows), dtype=numpy.float64)
+    transposed = normalized.T.tocsc() if sparse.issparse(normalized) else normalized.T
+    block_size = max(1, min(block_size, max_block_bytes // (numpy.dtype(numpy.float32).itemsize * num_rows)))
+
+    rows = []
+    columns = []
+    similarities = []
+    for start in range(0, num_rows, block_size):
+        end = min(num_rows, start + block_size)
+        block = normalized[start:end] @ transposed
+        block = block.toarray() if sparse.issparse(block) else numpy.asarray(block)
+        # A sample is not its own neighbour.
+        block[numpy.arange(end - start), numpy.arange(start, end)] = -numpy.inf
+        neighbors = numpy.argpartition(block, -n_neighbors, axis=1)[:, -n_neighbors:]
+        rows.append(numpy.repeat(numpy.arange(start, end), n_neighbors))
+        columns.append(neighbors.ravel())
+        similarities.append(numpy.take_along_axis(block, neighbors, axis=1).ravel().astype(numpy.float64))
+
+    similarities = numpy.maximum(numpy.concatenate(similarities), 0)
+    graph = sparse.csr_matrix((similarities, (numpy.concatenate(rows), numpy.concatenate(columns))),
+                              shape=(num_rows, num_rows))
+    graph.eliminate_zeros()
+    return ((graph + graph.T) * 0.5).tocsr()
+
+
+def cosine_similarity(vectors, block_size=1024, out=None, path=None):
+    """
+    Computes the dense cosine similarity matrix one tile of block_size x block_size
+    at a time. Rows are normalized once, tiles are float32 matrix products and
+    only the tiles on and above the diagonal are computed, the others are mirrored.
+    Besides the output, peak memory depends on the block size, not on the number of rows.
+    :param vectors: A scipy.sparse matrix or a NumPy array with a row per sample.
+    :param block_size: The number of rows and columns of a tile.
+    :param out: A preallocated n x n float32 array to write to, or None.
+    :param path: A path to a .npy file memory-mapped as the output if out is None,
+    or None to allocate the output in memory.
+    :return: The n x n float32 similarity matrix.
+    """
+    assert isinstance(block_size, int) and block_size > 0
+    normalized = normalize_rows(vectors, dtype=numpy.float32)
+    num_rows = normalized.shape[0]
+    if out is None:
+        if path is not None:
+            out = numpy.lib.format.open_memmap(path, mode='w+', dtype=numpy.float32,
+                                               shape=(num_rows, num_rows))
+        else:
+            out = numpy.empty((num_rows, num_rows), dtype=numpy.float32)
+    assert out.shape == (num_rows, num_rows)
+
+    transposed = normalized.T.tocsc() if sparse.issparse(normalized) else normalized.T
+    for start in range(0, num_rows, block_size):
+        end = min(num_rows, start + block_size)
+        rows = normalized[start:end]
+        for column_start in range(start, num_rows, block_size):
+            column_end = min(num_rows, column_start + block_size)
+            tile = rows @ transposed[:, column_start:column_end]
+            tile = tile.toarray() if sparse.issparse(tile) else tile
+            out[start:end, column_start:column_end] = tile
+            if column_start != start:
+                out[column_start:column_end, start:end] = tile.T
+    return out
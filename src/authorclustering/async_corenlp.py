@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import asyncio
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from .cache import AnnotationCache
+from .corenlp import PARSE_PROPERTIES, SPLIT_PROPERTIES, StanfordCoreNLP
+
+
+class AsyncStanfordCoreNLP:
+    """
+    This class is an asyncio counterpart of StanfordCoreNLP. A single process
+    keeps up to a given number of requests in flight to the CoreNLP server,
+    instead of forking a worker process per core just to wait on HTTP.
+    It is meant to be used as an async context manager:
+
+        async with AsyncStanfordCoreNLP(url, max_in_flight=200) as nlp:
+            results = await nlp.parse_many(texts)
+    """
+
+    def __init__(self, server_url='http://192.241.215.92:8011', cache=None, max_in_flight=100,
+                 retries=3, backoff=0.5, timeout=None):
+        """
+        :param server_url: URL to the CoreNLP server.
+        :param cache: An AnnotationCache to look up annotations in before
+        calling the server. The default is None, which means no caching.
+        :param max_in_flight: The maximum number of concurrent requests.
+        :param retries: The number of times a failed request is retried.
+        :param backoff: The backoff factor in seconds between retries.
+        :param timeout: Seconds to wait for the server response, or None to wait forever.
+        """
+        assert isinstance(server_url, str)
+        assert isinstance(cache, AnnotationCache) or cache is None
+        assert isinstance(max_in_flight, int) and max_in_flight > 0
+        self.server_url = server_url
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Shares the cache handling and output processing of the synchronous client.
+        self._nlp = StanfordCoreNLP(server_url, cache=cache)
+        self._session = None
+        self._semaphore = None
+        self._executor = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        """
+        Opens the HTTP session and checks that the CoreNLP server is started.
+        :return: None.
+        """
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        try:
+            async with self._session.get(self.server_url) as response:
+                await response.read()
+        except aiohttp.ClientConnectionError:
+            await self.close()
+            raise Exception('Check whether you have started the CoreNLP server.')
+
+    async def close(self):
+        """
+        Closes the HTTP session.
+        :return: None.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _run_blocking(self, function, *args):
+        """
+        Runs a blocking call, e.g. a lookup in the SQLite cache, off the event loop,
+        so that it does not hold up the requests in flight. Calls are run one at a
+        time on a single thread, which owns the cache connection of this client.
+        :param function: A function.
+        :param args: Arguments of the function.
+        :return: The return value of the function.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args))
+
+    async def _request(self, text, properties):
+        """
+        Sends a RESTful API call to the CoreNLP server, retrying with
+        exponential backoff on connection errors and server errors.
+        :param text: A text data to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A JSON output.
+        """
+        if self._session is None:
+            await self.open()
+
+        data = text.encode()
+        params = {'properties': str(properties)}
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._session.post(self.server_url, params=params, data=data) as response:
+                        if response.status < 500:
+                            response.raise_for_status()
+                            body = await response.read()
+                            return json.loads(body.decode('utf-8'), strict=True)
+                        error = Exception(str.format('CoreNLP server error {}.', response.status))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt >= self.retries:
+                raise error
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    async def _annotate(self, text, properties):
+        """
+        Annotates a text, looking it up in the cache first.
+        :param text: A text data to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A JSON output.
+        """
+        assert isinstance(text, str)
+        assert isinstance(properties, dict)
+
+        if self.cache is not None:
+            output = await self._run_blocking(self.cache.get, text, properties)
+            if output is not None:
+                return output
+
+        output = await self._request(text, properties)
+
+        if self.cache is not None:
+            await self._run_blocking(self.cache.put, text, properties, output)
+        return output
+
+    async def _annotate_many(self, texts, properties):
+        """
+        Annotates many texts, packing them into as few requests as possible
+        and sending the requests concurrently.
+        :param texts: A list of texts to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A list of JSON outputs, one per text.
+        """
+        assert isinstance(texts, list)
+        assert isinstance(properties, dict)
+        nlp = self._nlp
+        properties = nlp._batch_properties(properties)
+        if self.cache is None:
+            outputs, pending = nlp._lookup_many(texts, properties)
+        else:
+            outputs, pending = await self._run_blocking(nlp._lookup_many, texts, properties)
+
+        async def run(batch):
+            indices = [pending[i] for i in batch]
+            batch_texts = [texts[i] for i in indices]
+            if len(batch_texts) == 1:
+                batch_outputs = [await self._request(batch_texts[0], properties)]
+            else:
+                text, starts = nlp._join(batch_texts)
+                batch_outputs = nlp._split_output(await self._request(text, properties), starts)
+            if self.cache is None:
+                nlp._store_many(texts, properties, indices, batch_outputs, outputs)
+            else:
+                await self._run_blocking(nlp._store_many, texts, properties, indices, batch_outputs, outputs)
+
+        await asyncio.gather(*[run(batch) for batch in nlp.pack([texts[i] for i in pending])])
+        return outputs
+
+    async def parse(self, text):
+        """
+        Stanford CoreNLP parses texts and returns tokens
+        and their corresponding POS tags.
+        :param text: Input texts that are less than 100,000 bytes.
+        :return: A tuple (list of words, list of POS tags)
+        """
+        assert isinstance(text, str)
+        if text.strip() == '':
+            return [], []
+
+        output = await self._annotate(text, properties=PARSE_PROPERTIES)
+        return self._nlp._words_and_tags(output)
+
+    async def parse_many(self, texts):
+        """
+        Parses many texts with as few requests as possible.
+        Blank lines inside a text are treated as sentence breaks.
+        :param texts: A list of input texts.
+        :return: A list of tuples (list of words, list of POS tags), one per text.
+        """
+        assert isinstance(texts, list)
+        indices = [i for i, text in enumerate(texts) if text.strip() != '']
+        outputs = await self._annotate_many([texts[i] for i in indices], PARSE_PROPERTIES)
+
+        results = [([], [])] * len(texts)
+        for i, output in zip(indices, outputs):
+            results[i] = self._nlp._words_and_tags(output)
+        return results
+
+    async def split_sentences(self, text):
+        """
+        Stanford CoreNLP parses texts and returns sentences as a list
+        :param text: Input texts that are less than 100,000 bytes.
+        :return: A list of sentences.
+        """
+        assert isinstance(text, str)
+        text = text.replace('\n', '')
+
+        if text.strip() == '':
+            return []
+
+        output = await self._annotate(text, properties=SPLIT_PROPERTIES)
+        return self._nlp._sentence_texts(text, output)
+
+    async def split_sentences_many(self, texts):
+        """
+        Splits many texts into sentences with as few requests as possible.
+        :param texts: A list of input texts.
+        :return: A list of lists of sentences, one per text.
+        """
+        assert isinstance(texts, list)
+        texts = [text.replace('\n', '') for text in texts]
+        indices = [i for i, text in enumerate(texts) if text.strip() != '']
+        outputs = await self._annotate_many([texts[i] for i in indices], SPLIT_PROPERTIES)
+
+        results = [[] for _ in texts]
+        for i, output in zip(indices, outputs):
+            results[i] = self._nlp._sentence_texts(texts[i], output)
+        return results
@@ -1,8 +1,12 @@
 import nltk
+import numpy
 
 from sklearn import cluster
 from sklearn import metrics
 
+from .affinity import knn_graph
+from .spectral import SpectralEmbedding
+
 class AuthorCluster:
     def __init__(self, verbose = False):
         self.Verbose = verbose
@@ -46,10 +50,72 @@ class AuthorCluster:
             ret[label] += chunkIds[i]
         return ret
 
-    def cluster_unknown_number(self, text, chunkSize):
+    def cluster_unknown_number(self, text, chunkSize, maxClusters = 10, numNeighbors = 10,
+                               silhouette = False, numCandidates = 3, sampleSize = 1000, nlp = None):
         """
-        Splits text into chunks of size 'chunkSize' and clusters those chunks
+        Splits text into chunks of size 'chunkSize' and clusters those chunks.
+        The number of clusters is estimated with the eigengap heuristic on a single
+        eigendecomposition of a sparse k-nearest-neighbour cosine graph of the chunks.
         :param text: input text object.
+        :param maxClusters: the largest number of clusters considered.
+        :param numNeighbors: the number of neighbours of each chunk in the graph.
+        :param silhouette: picks the number of clusters among the 'numCandidates' largest
+        eigengaps by the silhouette score on a sample of 'sampleSize' chunks.
+        :param nlp: a CoreNLP client parsing the sentences if their words are not cached.
         :return: (number of clsuters, a list of lists of sentences belonging to each cluster)
         """
-        raise NotImplementedError()
+        chunkIds, vectors = self._chunkVectors(text, chunkSize, nlp)
+        if len(chunkIds) < 3:
+            return 1, [[i for ids in chunkIds for i in ids]]
+
+        affinity = knn_graph(vectors, min(numNeighbors, len(chunkIds) - 1))
+        embedding = SpectralEmbedding(affinity, min(maxClusters + 1, len(chunkIds) - 1), random_state=0)
+        candidates = embedding.eigengap_candidates(maxClusters)
+        numClusters = candidates[0]
+        labels = embedding.labels(numClusters, random_state=0) if numClusters > 1 else numpy.zeros(len(chunkIds), dtype=int)
+        if silhouette:
+            bestScore = None
+            for k in candidates[:numCandidates]:
+                if k < 2:
+                    continue
+                kLabels = embedding.labels(k, random_state=0)
+                score = embedding.silhouette(kLabels, sampleSize)
+                if self.Verbose:
+                    print('Clusters: %d, silhouette: %f' % (k, score))
+                if bestScore is None or score > bestScore:
+                    bestScore, numClusters, labels = score, k, kLabels
+
+        ret = [[] for _ in range(numClusters)]
+        for i, label in enumerate(labels):
+            ret[label] += chunkIds[i]
+        return numClusters, ret
+
+    def _chunkVectors(self, text, chunkSize, nlp = None):
+        """
+        Generates a binary vector per chunk of the presence of the 500 most common words.
+        The chunks are split into the cached words of the text if its sentence token
+        offsets are cached, otherwise the sentences are parsed with 'nlp', leaving
+        the text as it is, so the chunks are split into the same CoreNLP tokens as
+        the most common words are counted from.
+        :param text: input text object.
+        :param nlp: a CoreNLP client, or None if the words of the text are cached.
+        :return: (list of lists of sentence indices per chunk, NumPy array of a vector per chunk)
+        """
+        if text.TokenOffsets is not None:
+            words = text.Words
+            chunkIds, _, chunkWords, _ = text.fixed_length_chunk(chunkSize, tokens=True)
+        elif nlp is not None:
+            sentenceWords = []
+            for i in range(0, len(text.Sentences), 1500):
+                sentenceWords += [newWords for newWords, _ in nlp.parse_many(list(text.Sentences[i:i + 1500]))]
+            chunkIds, _ = text.fixed_length_chunk(chunkSize)
+            chunkWords = [[word for i in ids for word in sentenceWords[i]] for ids in chunkIds]
+            words = [word for newWords in sentenceWords for word in newWords]
+        else:
+            raise Exception('Sentence token offsets are not cached; call cacheWords() or pass a CoreNLP client.')
+        mostCommonWords = [word for word, _ in nltk.FreqDist(words).most_common(500)]
+        vectors = numpy.zeros((len(chunkIds), len(mostCommonWords)))
+        for i, chunk in enumerate(chunkWords):
+            chunk = set(chunk)
+            vectors[i] = [word in chunk for word in mostCommonWords]
+        return chunkIds, vectors
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import os
+
+import numpy
+from scipy import sparse
+
+from .vectorizer import FEATURE_FILES
+
+
+def _save_array(path, array):
+    """
+    Saves an array under a temporary name and renames it to the given path, so
+    other processes see either no file or the whole of it.
+    :param path: A path to the output .npy file.
+    :param array: A NumPy array.
+    :return: None.
+    """
+    temp_path = str.format('{}.{}.tmp', path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as file:
+            numpy.save(file, array)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def save_csr(matrix, path_prefix):
+    """
+    Saves a sparse matrix to <path_prefix>.data.npy, .indices.npy, .indptr.npy
+    and .shape.npy, so that it can be memory-mapped by many processes. Every
+    file is replaced at once and the shape is written last, so a matrix whose
+    shape file exists is complete.
+    :param matrix: A scipy.sparse matrix.
+    :param path_prefix: A path prefix of the output files.
+    :return: None.
+    """
+    assert isinstance(path_prefix, str)
+    matrix = sparse.csr_matrix(matrix)
+    _save_array(path_prefix + '.data.npy', matrix.data)
+    _save_array(path_prefix + '.indices.npy', matrix.indices)
+    _save_array(path_prefix + '.indptr.npy', matrix.indptr)
+    _save_array(path_prefix + '.shape.npy', numpy.array(matrix.shape, dtype=numpy.int64))
+
+
+def load_csr(path_prefix, mmap=True):
+    """
+    Loads a sparse matrix saved by save_csr().
+    :param path_prefix: A path prefix of the matrix files.
+    :param mmap: Memory-maps the files instead of reading them.
+    :return: A scipy.sparse.csr_matrix.
+    """
+    assert isinstance(path_prefix, str)
+    mmap_mode = 'r' if mmap else None
+    data = numpy.load(path_prefix + '.data.npy', mmap_mode=mmap_mode)
+    indices = numpy.load(path_prefix + '.indices.npy', mmap_mode=mmap_mode)
+    indptr = numpy.load(path_prefix + '.indptr.npy', mmap_mode=mmap_mode)
+    shape = tuple(numpy.load(path_prefix + '.shape.npy').tolist())
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def hstack_blocks(blocks):
+    """
+    Stacks the columns of blocks with the same rows into one matrix.
+    :param blocks: A non-empty list of scipy.sparse matrices.
+    :return: A scipy.sparse.csr_matrix.
+    """
+    assert len(blocks) > 0
+    if len(blocks) == 1:
+        return sparse.csr_matrix(blocks[0], copy=True)
+    return sparse.hstack(blocks, format='csr')
+
+
+class BlockCache:
+    """
+    This class keeps the matrix of every feature type in a directory, keyed by
+    the text, the rows the matrix was made of (e.g. chunks of a chunk size) and
+    the vocabulary of the feature type. The design matrix of any set of feature
+    types is stacked from the blocks, so only the blocks of feature types that
+    were never vectorized for a text and chunk size have to be computed.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a block directory, creating it if it does not exist.
+        :param path: A path to the block directory.
+        """
+        assert isinstance(path, str)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _path_prefix(self, feature_type, text_digest, rows, vocabulary_digest):
+        name = str.format('{}_{}_{}_{}', FEATURE_FILES[feature_type], rows, text_digest[:16], vocabulary_digest[:16])
+        return os.path.join(self.path, name)
+
+    def load(self, feature_type, text_digest, rows, vocabulary_digest):
+        """
+        :param feature_type: A feature type initial.
+        :param text_digest: A digest of the text generated by Text.digest().
+        :param rows: A string naming the rows of the block, e.g. chunk20 or sentences.
+        :param vocabulary_digest: A digest of the terms of the feature type generated by Vocabulary.digest().
+        :return: The memory-mapped scipy.sparse.csr_matrix block, or None if it is not stored.
+        """
+        path_prefix = self._path_prefix(feature_type, text_digest, rows, vocabulary_digest)
+        if not os.path.isfile(path_prefix + '.shape.npy'):
+            return None
+        return load_csr(path_prefix)
+
+    def store(self, feature_type, text_digest, rows, vocabulary_digest, matrix):
+        """
+        Stores the block of a feature type.
+        :param feature_type: A feature type initial.
+        :param text_digest: A digest of the text generated by Text.digest().
+        :param rows: A string naming the rows of the block, e.g. chunk20 or sentences.
+        :param vocabulary_digest: A digest of the terms of the feature type generated by Vocabulary.digest().
+        :param matrix: A scipy.sparse matrix of the columns of the feature type.
+        :return: None.
+        """
+        # Files are renamed into place and the shape comes last, so workers loading
+        # the block while it is stored never map a half-written file.
+        save_csr(matrix, self._path_prefix(feature_type, text_digest, rows, vocabulary_digest))
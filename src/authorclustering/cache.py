@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+
+class AnnotationCache:
+    """
+    This class keeps CoreNLP annotations on disk, keyed by a hash of
+    the text and the annotator properties, so that repeated runs over
+    the same texts do not go back to the server.
+    Entries are evicted in least recently used order once the cache grows
+    beyond the given size. The cache is backed by SQLite, which makes it safe
+    to share between the worker processes of a multiprocessing pool.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30):
+        """
+        Initializes with the cache file path and its size limit.
+        :param path: A path to the cache file. It is created if it does not exist.
+        :param max_bytes: The maximum total size of the cached annotations in bytes.
+        """
+        assert isinstance(path, str)
+        assert isinstance(max_bytes, int)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        # SQLite connections cannot be shared across processes,
+        # so every process opens its own one.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def _connect(self):
+        """
+        Opens the cache database for the current process.
+        :return: A SQLite connection.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        # The asynchronous client uses the connection from its own thread.
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS annotations ('
+                           'key TEXT PRIMARY KEY, '
+                           'value BLOB NOT NULL, '
+                           'size INTEGER NOT NULL, '
+                           'accessed REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS annotations_accessed '
+                           'ON annotations (accessed)')
+        # The total size of the annotations is kept up to date by put(), so it
+        # does not have to be summed over the whole table under the write lock.
+        connection.execute('CREATE TABLE IF NOT EXISTS totals ('
+                           'id INTEGER PRIMARY KEY CHECK (id = 0), '
+                           'size INTEGER NOT NULL)')
+        connection.execute('INSERT OR IGNORE INTO totals (id, size) '
+                           'SELECT 0, COALESCE(SUM(size), 0) FROM annotations')
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def make_key(text, properties):
+        """
+        Generates a cache key out of a text and annotator properties.
+        :param text: A text to be processed.
+        :param properties: A dictionary of annotator properties.
+        :return: A hex digest string.
+        """
+        assert isinstance(text, str)
+        assert isinstance(properties, dict)
+        digest = hashlib.sha256()
+        digest.update(json.dumps(properties, sort_keys=True).encode())
+        digest.update(b'\0')
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, text, properties):
+        """
+        Looks up the annotation of the given text.
+        :param text: A text to be processed.
+        :param properties: A dictionary of annotator properties.
+        :return: The cached JSON output, or None if it is not cached.
+        """
+        key = self.make_key(text, properties)
+        connection = self._connect()
+        row = connection.execute('SELECT value FROM annotations WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE annotations SET accessed = ? WHERE key = ?', (time.time(), key))
+        return json.loads(zlib.decompress(row[0]).decode())
+
+    def put(self, text, properties, output):
+        """
+        Stores the annotation of the given text and evicts the least
+        recently used annotations if the cache is full.
+        :param text: A text that was processed.
+        :param properties: A dictionary of annotator properties.
+        :param output: The JSON output returned by the CoreNLP server.
+        :return: None.
+        """
+        key = self.make_key(text, properties)
+        value = zlib.compress(json.dumps(output).encode())
+        if len(value) > self.max_bytes:
+            return
+
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT size FROM annotations WHERE key = ?', (key,)).fetchone()
+            replaced = row[0] if row is not None else 0
+            connection.execute('INSERT OR REPLACE INTO annotations (key, value, size, accessed) '
+                               'VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+            connection.execute('UPDATE totals SET size = size + ? WHERE id = 0', (len(value) - replaced,))
+            total = connection.execute('SELECT size FROM totals WHERE id = 0').fetchone()[0]
+            if total > self.max_bytes:
+                rows = connection.execute('SELECT key, size FROM annotations '
+                                          'WHERE key != ? ORDER BY accessed', (key,))
+                evicted = []
+                evicted_size = 0
+                for old_key, size in rows:
+                    if total - evicted_size <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    evicted_size += size
+                connection.executemany('DELETE FROM annotations WHERE key = ?', evicted)
+                connection.execute('UPDATE totals SET size = size - ? WHERE id = 0', (evicted_size,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM annotations').fetchone()[0]
@@ -1,5 +1,9 @@
 from __future__ import division
 
+import numpy
+
+from . import evaluation
+
 class ClusterEvaluator:
     def __init__(self, verbose = False):
         self.Verbose = verbose
@@ -15,36 +19,19 @@ class ClusterEvaluator:
         '''
 
         # count author classes in cluster
-        cluster_class_counts = {}
-        for i, clus in enumerate(clusters):
-            cluster_class_counts[i] = {}
-            if clus is None:
-                continue
-            for sent in clus:
-                #cur_class = sent.auth #TODO obtain author class from cur sentence
-                author_index = text.getAuthorIndexForSentence(sent)
-                if author_index not in cluster_class_counts[i]:
-                    cluster_class_counts[i][author_index] = 0
-                cluster_class_counts[i][author_index] += 1
-
-        clusterMajorityAuthorIndices = []
-        clusterPurities = []
-        total_correct = 0
-        total_sen = 0
-        # assign majority class label to cluster
-        for clusterIdx, class_counts in cluster_class_counts.items():
-            if len(class_counts.keys()) == 0:
-                clusterMajorityAuthorIndices.append(-1)
-                clusterPurities.append(-1)
-                continue
-            total_count = sum(class_counts.values())
-            majority_class = max(class_counts, key = lambda k: class_counts[k])
-            majority_count = class_counts[majority_class]
-            class_purity = majority_count/total_count
-            clusterMajorityAuthorIndices.append(majority_class)
-            clusterPurities.append(class_purity)
+        clusters = [[] if clus is None else clus for clus in clusters]
+        sentenceIds = numpy.concatenate([numpy.asarray(clus, dtype=numpy.int64) for clus in clusters] + [numpy.zeros(0, dtype=numpy.int64)])
+        if len(sentenceIds) == 0:
+            return [-1] * len(clusters), [-1] * len(clusters), 0
+        clusterIds = numpy.repeat(numpy.arange(len(clusters)), [len(clus) for clus in clusters])
+        authorIds = numpy.asarray(text.AuthorIds)[sentenceIds]
+        result = evaluation.evaluate(clusterIds, authorIds)
 
-            total_correct += majority_count
-            total_sen += total_count
+        # assign majority class label to cluster, -1 for empty clusters
+        clusterMajorityAuthorIndices = [-1] * len(clusters)
+        clusterPurities = [-1] * len(clusters)
+        for clusterIdx, majority_class, class_purity in zip(result['labels'], result['majorities'], result['purities']):
+            clusterMajorityAuthorIndices[clusterIdx] = int(majority_class)
+            clusterPurities[clusterIdx] = float(class_purity)
 
-        return clusterMajorityAuthorIndices, clusterPurities, total_correct/total_sen
+        return clusterMajorityAuthorIndices, clusterPurities, result['purity']
@@ -1,8 +1,28 @@
 #!/usr/bin/env python3
-import json
+import bisect
 import re
 
-import requests
+from .cache import AnnotationCache
+from .transport import CoreNLPTransport, get_transport
+
+# The CoreNLP server rejects requests larger than 100k bytes.
+MAX_REQUEST_BYTES = 100000
+
+# Documents packed into one request are separated by a blank line, which is
+# always a sentence break when ssplit.newlineIsSentenceBreak is 'two'.
+DOCUMENT_SEPARATOR = '\n\n'
+
+PARSE_PROPERTIES = {
+    "annotators": "tokenize,ssplit,pos",
+    "coref.md.type": "dep",
+    "coref.mode": "statistical"
+}
+
+SPLIT_PROPERTIES = {
+    "annotators": "tokenize,ssplit",
+    "coref.md.type": "dep",
+    "coref.mode": "statistical"
+}
 
 
 class StanfordCoreNLP:
@@ -11,57 +31,194 @@ class StanfordCoreNLP:
     in order to support unicode data and meet the our project needs.
     """
 
-    def __init__(self, server_url='http://192.241.215.92:8011'):
+    def __init__(self, server_url='http://192.241.215.92:8011', cache=None, transport=None):
         """
         You can specify your own server URL here if you have one.
         :param server_url: URL to the CoreNLP server.
         The default is http://192.241.215.92:8011.
+        :param cache: An AnnotationCache to look up annotations in before
+        calling the server. The default is None, which means no caching.
+        :param transport: A CoreNLPTransport to send requests with. The default
+        is None, which means the keep-alive transport shared by all clients of
+        the server in the current process.
         """
         assert isinstance(server_url, str)
+        assert isinstance(cache, AnnotationCache) or cache is None
+        assert isinstance(transport, CoreNLPTransport) or transport is None
         self.server_url = server_url
+        self.cache = cache
+        self.transport = transport if transport is not None else get_transport(server_url)
 
-    def _annotate(self, text, properties):
+    def _request(self, text, properties):
         """
         Sends a RESTful API call to the CoreNLP server.
         :param text: A text data to be processed.
         :param properties: Properties that are attached to the url.
         :return: A JSON text.
         """
+        # maximum length of data is 100k.
+        return self.transport.post(text, properties)
+
+    def _annotate(self, text, properties):
+        """
+        Annotates a text, looking it up in the cache first.
+        :param text: A text data to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A JSON text.
+        """
         assert isinstance(text, str)
         assert isinstance(properties, dict)
 
-        # Checks that the Stanford CoreNLP server is started.
-        try:
-            requests.get(self.server_url)
-        except requests.exceptions.ConnectionError:
-            raise Exception('Check whether you have started the CoreNLP server.')
+        if self.cache is not None:
+            output = self.cache.get(text, properties)
+            if output is not None:
+                return output
 
-        # texts should be encoded to deal with unicode.
-        # maximum length of data is 100k.
-        data = text.encode()
-        r = requests.post(self.server_url, params={'properties': str(properties)}, data=data,
-                          headers={'Connection': 'close'})
-        output = r.text
-        output = json.loads(output, encoding='utf-8', strict=True)
+        output = self._request(text, properties)
+
+        if self.cache is not None:
+            self.cache.put(text, properties, output)
         return output
 
-    def parse(self, text):
+    def _annotate_many(self, texts, properties):
         """
-        Stanford CoreNLP parses texts and returns tokens
-        and their corresponding POS tags.
-        :param text: Input texts that are less than 100,000 bytes.
-        :return: A tuple (list of words, list of POS tags)
+        Annotates many texts, packing as many of them as possible into each
+        request and splitting the output back to each text by character offsets.
+        :param texts: A list of texts to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A list of JSON outputs, one per text.
         """
-        assert isinstance(text, str)
-        if text.strip() == '':
-            return [], []
+        assert isinstance(texts, list)
+        assert isinstance(properties, dict)
+        properties = self._batch_properties(properties)
+        outputs, pending = self._lookup_many(texts, properties)
+
+        for batch in self.pack([texts[i] for i in pending]):
+            indices = [pending[i] for i in batch]
+            batch_texts = [texts[i] for i in indices]
+            if len(batch_texts) == 1:
+                batch_outputs = [self._request(batch_texts[0], properties)]
+            else:
+                text, starts = self._join(batch_texts)
+                batch_outputs = self._split_output(self._request(text, properties), starts)
+            self._store_many(texts, properties, indices, batch_outputs, outputs)
+        return outputs
+
+    @staticmethod
+    def _batch_properties(properties):
+        """
+        Adds the properties needed to annotate packed texts.
+        :param properties: Properties that are attached to the url.
+        :return: A new dictionary of properties.
+        """
+        properties = dict(properties)
+        properties['ssplit.newlineIsSentenceBreak'] = 'two'
+        return properties
+
+    def _lookup_many(self, texts, properties):
+        """
+        Looks up texts in the cache.
+        :param texts: A list of texts to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A tuple (list of cached outputs or None, list of indices of texts not cached)
+        """
+        outputs = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            assert isinstance(text, str)
+            if self.cache is not None:
+                outputs[i] = self.cache.get(text, properties)
+            if outputs[i] is None:
+                pending.append(i)
+        return outputs, pending
+
+    def _store_many(self, texts, properties, indices, batch_outputs, outputs):
+        """
+        Stores the outputs of a batch of texts into the output list and the cache.
+        :param texts: A list of texts to be processed.
+        :param properties: Properties that are attached to the url.
+        :param indices: A list of indices of the texts in the batch.
+        :param batch_outputs: A list of JSON outputs, one per text in the batch.
+        :param outputs: A list of outputs, one per text, to store the batch outputs into.
+        :return: None.
+        """
+        for i, output in zip(indices, batch_outputs):
+            outputs[i] = output
+            if self.cache is not None:
+                self.cache.put(texts[i], properties, output)
+
+    @staticmethod
+    def _join(texts):
+        """
+        Packs texts into a single text.
+        :param texts: A list of texts.
+        :return: A tuple (packed text, list of character offsets where each text begins)
+        """
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(DOCUMENT_SEPARATOR)
+        return DOCUMENT_SEPARATOR.join(texts), starts
+
+    @staticmethod
+    def pack(texts, max_bytes=MAX_REQUEST_BYTES):
+        """
+        Groups consecutive texts so that each group fits into a single request.
+        A text larger than the limit makes up a group on its own.
+        :param texts: A list of texts.
+        :param max_bytes: The maximum size of a request in bytes.
+        :return: A list of lists of text indices.
+        """
+        assert isinstance(texts, list)
+        batches = []
+        batch = []
+        size = 0
+        separator_size = len(DOCUMENT_SEPARATOR.encode())
+        for i, text in enumerate(texts):
+            text_size = len(text.encode())
+            if len(batch) > 0 and size + separator_size + text_size > max_bytes:
+                batches.append(batch)
+                batch = []
+                size = 0
+            if len(batch) > 0:
+                size += separator_size
+            batch.append(i)
+            size += text_size
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
 
-        output = self._annotate(text, properties={
-            "annotators": "tokenize,ssplit,pos",
-            "coref.md.type": "dep",
-            "coref.mode": "statistical"
-        })
+    @staticmethod
+    def _split_output(output, starts):
+        """
+        Splits the output of packed texts back into an output per text.
+        Token offsets are shifted so that they are relative to each text.
+        :param output: A JSON output of the packed texts.
+        :param starts: A sorted list of character offsets where each text begins.
+        :return: A list of JSON outputs, one per text.
+        """
+        outputs = [{'sentences': []} for _ in starts]
+        for sentence in output['sentences']:
+            current = None
+            for token in sentence['tokens']:
+                i = bisect.bisect_right(starts, token['characterOffsetBegin']) - 1
+                if current != i:
+                    current = i
+                    outputs[i]['sentences'].append({'tokens': []})
+                token = dict(token)
+                token['characterOffsetBegin'] -= starts[i]
+                token['characterOffsetEnd'] -= starts[i]
+                outputs[i]['sentences'][-1]['tokens'].append(token)
+        return outputs
 
+    @staticmethod
+    def _words_and_tags(output):
+        """
+        Collects tokens and their POS tags out of a JSON output.
+        :param output: A JSON output of the annotators tokenize, ssplit and pos.
+        :return: A tuple (list of words, list of POS tags)
+        """
         words = []
         postags = []
 
@@ -74,6 +231,52 @@ class StanfordCoreNLP:
                 postags.append(pos)
         return words, postags
 
+    @staticmethod
+    def _sentence_texts(text, output):
+        """
+        Collects sentences out of a JSON output.
+        :param text: The text that was annotated.
+        :param output: A JSON output of the annotators tokenize and ssplit.
+        :return: A list of sentences.
+        """
+        sentences = []
+        for sentence in output['sentences']:
+            num_token = len(sentence['tokens'])
+            start_index = sentence['tokens'][0]['characterOffsetBegin']
+            end_index = sentence['tokens'][num_token - 1]['characterOffsetEnd']
+            sentences.append(text[start_index:end_index])
+        return sentences
+
+    def parse(self, text):
+        """
+        Stanford CoreNLP parses texts and returns tokens
+        and their corresponding POS tags.
+        :param text: Input texts that are less than 100,000 bytes.
+        :return: A tuple (list of words, list of POS tags)
+        """
+        assert isinstance(text, str)
+        if text.strip() == '':
+            return [], []
+
+        output = self._annotate(text, properties=PARSE_PROPERTIES)
+        return self._words_and_tags(output)
+
+    def parse_many(self, texts):
+        """
+        Parses many texts with as few requests as possible.
+        Blank lines inside a text are treated as sentence breaks.
+        :param texts: A list of input texts.
+        :return: A list of tuples (list of words, list of POS tags), one per text.
+        """
+        assert isinstance(texts, list)
+        indices = [i for i, text in enumerate(texts) if text.strip() != '']
+        outputs = self._annotate_many([texts[i] for i in indices], PARSE_PROPERTIES)
+
+        results = [([], [])] * len(texts)
+        for i, output in zip(indices, outputs):
+            results[i] = self._words_and_tags(output)
+        return results
+
     def split_sentences(self, text):
         """
         Stanford CoreNLP parses texts and returns sentences as a list
@@ -86,16 +289,21 @@ class StanfordCoreNLP:
         if text.strip() == '':
             return []
 
-        output = self._annotate(text, properties={
-            "annotators": "tokenize,ssplit",
-            "coref.md.type": "dep",
-            "coref.mode": "statistical"
-        })
+        output = self._annotate(text, properties=SPLIT_PROPERTIES)
+        return self._sentence_texts(text, output)
 
-        sentences = []
-        for sentence in output['sentences']:
-            num_token = len(sentence['tokens'])
-            start_index = sentence['tokens'][0]['characterOffsetBegin']
-            end_index = sentence['tokens'][num_token - 1]['characterOffsetEnd']
-            sentences.append(text[start_index:end_index])
-        return sentences
+    def split_sentences_many(self, texts):
+        """
+        Splits many texts into sentences with as few requests as possible.
+        :param texts: A list of input texts.
+        :return: A list of lists of sentences, one per text.
+        """
+        assert isinstance(texts, list)
+        texts = [text.replace('\n', '') for text in texts]
+        indices = [i for i, text in enumerate(texts) if text.strip() != '']
+        outputs = self._annotate_many([texts[i] for i in indices], SPLIT_PROPERTIES)
+
+        results = [[] for _ in texts]
+        for i, output in zip(indices, outputs):
+            results[i] = self._sentence_texts(texts[i], output)
+        return results
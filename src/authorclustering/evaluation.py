@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import numpy
+
+
+def contingency_matrix(labels, truth):
+    """
+    Counts how many samples of every class fall into every cluster. The
+    cluster and class of a sample are combined into one index, so all the
+    counts are made by a single bincount.
+    :param labels: A sequence of cluster labels, one per sample.
+    :param truth: A sequence of ground truth classes, one per sample.
+    :return: A tuple (int64 NumPy array of clusters x classes counts,
+    NumPy array of the sorted distinct labels, NumPy array of the sorted distinct classes).
+    """
+    label_values, label_ids = numpy.unique(numpy.asarray(labels), return_inverse=True)
+    class_values, class_ids = numpy.unique(numpy.asarray(truth), return_inverse=True)
+    assert len(label_ids) == len(class_ids)
+    num_labels, num_classes = len(label_values), len(class_values)
+    counts = numpy.bincount(label_ids.ravel() * num_classes + class_ids.ravel(), minlength=num_labels * num_classes)
+    return counts.reshape(num_labels, num_classes), label_values, class_values
+
+
+def _entropy(counts, total):
+    counts = counts[counts > 0]
+    p = counts / total
+    return -float(numpy.sum(p * numpy.log(p)))
+
+
+def _pairs(counts):
+    counts = counts.astype(numpy.float64)
+    return float(numpy.sum(counts * (counts - 1) / 2))
+
+
+def scores(contingency):
+    """
+    Computes clustering scores out of a contingency matrix.
+    :param contingency: A clusters x classes NumPy array of counts.
+    :return: A dictionary of 'purity', 'nmi' (normalized by the arithmetic mean
+    of the entropies), 'ari', 'bcubed_precision', 'bcubed_recall', 'bcubed_f1', and
+    the per-cluster NumPy arrays 'sizes', 'majorities' (column index of the
+    majority class) and 'purities'.
+    """
+    contingency = numpy.asarray(contingency, dtype=numpy.int64)
+    total = int(contingency.sum())
+    if total == 0:
+        raise Exception('No samples to evaluate.')
+    sizes = contingency.sum(axis=1)
+    class_sizes = contingency.sum(axis=0)
+    majorities = contingency.argmax(axis=1)
+    majority_counts = contingency.max(axis=1)
+    purities = majority_counts / numpy.maximum(sizes, 1)
+
+    nonzero = contingency > 0
+    n_ij = contingency[nonzero].astype(numpy.float64)
+    outer = numpy.outer(sizes, class_sizes)[nonzero].astype(numpy.float64)
+    if contingency.shape[0] == contingency.shape[1] == 1 or len(n_ij) == 0:
+        nmi = 1.0
+    else:
+        mutual_information = float(numpy.sum(n_ij / total * (numpy.log(n_ij * total) - numpy.log(outer))))
+        mean_entropy = (_entropy(sizes, total) + _entropy(class_sizes, total)) / 2
+        nmi = mutual_information / mean_entropy if mean_entropy > 0 else 1.0
+
+    index = _pairs(contingency)
+    expected = _pairs(sizes) * _pairs(class_sizes) / (total * (total - 1) / 2) if total > 1 else 0.0
+    maximum = (_pairs(sizes) + _pairs(class_sizes)) / 2
+    ari = (index - expected) / (maximum - expected) if maximum != expected else 1.0
+
+    # B-cubed precision and recall averaged over samples: a sample of cell (i, j)
+    # shares its cluster with n_ij / a_i and its class with n_ij / b_j correct samples.
+    squares = contingency.astype(numpy.float64) ** 2
+    precision = float(numpy.sum(squares.sum(axis=1) / numpy.maximum(sizes, 1))) / total
+    recall = float(numpy.sum(squares.sum(axis=0) / numpy.maximum(class_sizes, 1))) / total
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+    return {
+        'purity': float(majority_counts.sum()) / total,
+        'nmi': nmi,
+        'ari': ari,
+        'bcubed_precision': precision,
+        'bcubed_recall': recall,
+        'bcubed_f1': f1,
+        'sizes': sizes,
+        'majorities': majorities,
+        'purities': purities
+    }
+
+
+def evaluate(labels, truth):
+    """
+    Scores cluster labels against the ground truth in one pass.
+    :param labels: A sequence of cluster labels, one per sample.
+    :param truth: A sequence of ground truth classes, one per sample.
+    :return: The dictionary of scores(), in which 'majorities' holds class values
+    instead of column indices, and 'labels' holds the cluster label of every row
+    of the per-cluster arrays.
+    """
+    contingency, label_values, class_values = contingency_matrix(labels, truth)
+    result = scores(contingency)
+    result['majorities'] = class_values[result['majorities']]
+    result['labels'] = label_values
+    return result
@@ -1,11 +1,195 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import collections
 import glob
+import itertools
 import logging
 import os
 from multiprocessing.pool import Pool
 
-from .corenlp import StanfordCoreNLP
+import numpy
+
+from .cache import AnnotationCache
+from .corenlp import DOCUMENT_SEPARATOR, MAX_REQUEST_BYTES, StanfordCoreNLP
+from .manifest import CountManifest
+from .vectorizer import count_ngrams
+from .vocabulary import StringTable
+
+# File extension of feature metadata saved in the binary format.
+BINARY_SUFFIX = '.npz'
+
+
+class NgramCounter:
+    """
+    This class counts words, word n-grams, character n-grams and POS tag n-grams
+    of a stretch of corpus. Counters of consecutive stretches can be counted
+    independently, e.g. one per chunk in worker processes, and merged in order
+    afterwards. The first and last few tokens of each stretch are kept, so n-grams
+    spanning stretches are counted exactly as if the whole corpus had been parsed at once.
+    """
+
+    # Model names and the n-gram sizes of words and POS tags.
+    WORD_MODELS = (('word', 1), ('biword', 2), ('triword', 3))
+    POSTAG_MODELS = (('pos', 1), ('bipos', 2), ('tripos', 3), ('fourpos', 4))
+
+    def __init__(self, num_gram=4, max_terms=None):
+        """
+        :param num_gram: A number n for character n-gram.
+        :param max_terms: The maximum number of distinct terms kept per model,
+        or None to keep all of them.
+        """
+        assert isinstance(num_gram, int)
+        assert isinstance(max_terms, int) or max_terms is None
+        self.num_gram = num_gram
+        self.max_terms = max_terms
+        self.counters = {}
+        for name, _ in self.WORD_MODELS + self.POSTAG_MODELS:
+            self.counters[name] = collections.Counter()
+        self.counters['char'] = collections.Counter()
+        self._word_head = []
+        self._word_tail = []
+        self._postag_head = []
+        self._postag_tail = []
+
+    @staticmethod
+    def from_chunk(words, postags, paragraphs, num_gram=4):
+        """
+        Counts the n-grams of a single chunk.
+        :param words: A list of words of the chunk.
+        :param postags: A list of POS tags of the chunk.
+        :param paragraphs: A list of paragraphs of the chunk for character n-grams.
+        :param num_gram: A number n for character n-gram.
+        :return: An NgramCounter.
+        """
+        counter = NgramCounter(num_gram)
+        for name, size in NgramCounter.WORD_MODELS:
+            counter.counters[name].update(count_ngrams(words, size))
+        for name, size in NgramCounter.POSTAG_MODELS:
+            counter.counters[name].update(count_ngrams(postags, size))
+        for paragraph in paragraphs:
+            counter.counters['char'].update(paragraph[i:i + num_gram]
+                                            for i in range(len(paragraph) - num_gram + 1))
+
+        num_words = NgramCounter.WORD_MODELS[-1][1] - 1
+        num_postags = NgramCounter.POSTAG_MODELS[-1][1] - 1
+        counter._word_head = list(words[:num_words])
+        counter._word_tail = list(words[max(0, len(words) - num_words):])
+        counter._postag_head = list(postags[:num_postags])
+        counter._postag_tail = list(postags[max(0, len(postags) - num_postags):])
+        return counter
+
+    def update(self, words, postags, paragraphs):
+        """
+        Counts the n-grams of the next chunk.
+        :param words: A list of words of the chunk.
+        :param postags: A list of POS tags of the chunk.
+        :param paragraphs: A list of paragraphs of the chunk for character n-grams.
+        :return: None.
+        """
+        self.merge(NgramCounter.from_chunk(words, postags, paragraphs, self.num_gram))
+
+    def merge(self, other):
+        """
+        Adds the counts of the stretch of corpus that immediately follows this one.
+        :param other: An NgramCounter of the following stretch.
+        :return: None.
+        """
+        assert isinstance(other, NgramCounter)
+        self._merge_boundary(self._word_tail, other._word_head, self.WORD_MODELS)
+        self._merge_boundary(self._postag_tail, other._postag_head, self.POSTAG_MODELS)
+
+        for name, counter in self.counters.items():
+            other_counter = other.counters[name]
+            if len(counter) < len(other_counter):
+                # Iterates over the smaller counter.
+                counter, other_counter = other_counter, counter
+                self.counters[name] = counter
+            counter.update(other_counter)
+
+        num_words = self.WORD_MODELS[-1][1] - 1
+        num_postags = self.POSTAG_MODELS[-1][1] - 1
+        self._word_head = (self._word_head + other._word_head)[:num_words]
+        self._word_tail = (self._word_tail + other._word_tail)[-num_words:]
+        self._postag_head = (self._postag_head + other._postag_head)[:num_postags]
+        self._postag_tail = (self._postag_tail + other._postag_tail)[-num_postags:]
+
+        if self.max_terms is not None:
+            for counter in self.counters.values():
+                self._prune(counter, self.max_terms)
+
+    def _merge_boundary(self, tail, head, models):
+        """
+        Counts the n-grams that start in the tail of this stretch and end in
+        the head of the following one.
+        :param tail: A list of the last tokens of this stretch.
+        :param head: A list of the first tokens of the following stretch.
+        :param models: A tuple of model names and n-gram sizes.
+        :return: None.
+        """
+        tokens = tail + head
+        for name, size in models:
+            for i in range(max(0, len(tail) - size + 1), min(len(tail), len(tokens) - size + 1)):
+                self.counters[name][' '.join(tokens[i:i + size])] += 1
+
+    @staticmethod
+    def tree_reduce(counters, max_terms=None):
+        """
+        Merges counters of consecutive stretches in order, pairing up counters of
+        similar size like a binary tree. Only one counter per tree level is kept
+        at a time, so the counters can be consumed as they arrive.
+        :param counters: An iterable of NgramCounters in corpus order.
+        :param max_terms: The maximum number of distinct terms kept per model,
+        or None to keep all of them.
+        :return: The merged NgramCounter.
+        """
+        stack = []
+        for counter in counters:
+            counter.max_terms = max_terms
+            level = 0
+            while len(stack) > 0 and stack[-1][0] == level:
+                _, left = stack.pop()
+                left.merge(counter)
+                counter = left
+                level += 1
+            stack.append((level, counter))
+
+        if len(stack) == 0:
+            return NgramCounter(max_terms=max_terms)
+        _, merged = stack[0]
+        for _, counter in stack[1:]:
+            merged.merge(counter)
+        return merged
+
+    @staticmethod
+    def _prune(counter, max_terms):
+        """
+        Drops the rarest terms until at most half of max_terms remain,
+        once a counter holds more than max_terms terms.
+        :param counter: A Counter to prune.
+        :param max_terms: The maximum number of terms.
+        :return: None.
+        """
+        if len(counter) <= max_terms:
+            return
+        threshold = 1
+        while len(counter) > max_terms // 2:
+            for term in [term for term, count in counter.items() if count <= threshold]:
+                del counter[term]
+            threshold += 1
+
+    def models(self, min_count=1):
+        """
+        :param min_count: Terms counted fewer times than this are left out.
+        :return: A dictionary of a model name to a dictionary of a term to its count.
+        """
+        models = {}
+        for name, counter in self.counters.items():
+            if min_count > 1:
+                models[name] = {term: count for term, count in counter.items() if count >= min_count}
+            else:
+                models[name] = dict(counter)
+        return models
 
 
 class Feature:
@@ -13,16 +197,36 @@ class Feature:
     This class generates feature metadata out of corpora.
     """
 
-    def __init__(self, url, num_gram=4):
+    def __init__(self, url, num_gram=4, cache=None, max_in_flight=None, binary=False,
+                 min_count=1, max_terms=None, window=None):
         """
         Initializes with the CoreNLP server URL and the number n for character n-grams.
         :param url: A URL to the CoreNLP server.
         :param num_gram: A number n for character n-gram.
+        :param cache: An AnnotationCache shared by the parsing workers, or None.
+        :param max_in_flight: The maximum number of concurrent requests sent by
+        an asynchronous client in this process. The default is None, which means
+        parsing in a pool of worker processes instead.
+        :param binary: Saves the metadata in the binary format instead of text.
+        :param min_count: Terms counted fewer times than this are left out of the metadata.
+        :param max_terms: The maximum number of distinct terms kept per n-gram type
+        while counting. The rarest terms are pruned when it is exceeded, so their counts
+        are approximate. The default is None, which means exact counts.
+        :param window: The maximum number of chunks being parsed at a time.
+        The default is None, which means four per CPU core.
         """
         assert isinstance(url, str)
         assert isinstance(num_gram, int)
+        assert isinstance(cache, AnnotationCache) or cache is None
+        assert isinstance(max_in_flight, int) or max_in_flight is None
         self.url = url
         self.num_gram = num_gram
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self.binary = binary
+        self.min_count = min_count
+        self.max_terms = max_terms
+        self.window = window if window is not None else 4 * (os.cpu_count() or 1)
 
         formatter = logging.Formatter('%(asctime)s %(message)s')
         handler = logging.StreamHandler()
@@ -33,7 +237,7 @@ class Feature:
 
     def build_model(self, input_path, word_path=None, biword_path=None,
                     triword_path=None, char_ngram_path=None, pos_path=None,
-                    bipos_path=None, tripos_path=None, fourpos_path=None):
+                    bipos_path=None, tripos_path=None, fourpos_path=None, manifest_path=None):
         """
         Builds feature metadata and saves to files.
         :param input_path: A path to a directory containing corpora.
@@ -45,6 +249,10 @@ class Feature:
         :param bipos_path: An output file path for POS tag bigram metadata.
         :param tripos_path: An output file path for POS tag trigram metadata.
         :param fourpos_path: An output file path for POS tag 4-gram metadata.
+        :param manifest_path: A path to a directory keeping per-file partial counts
+        of a corpora directory. Files whose content has not changed since the
+        previous run are not parsed again. The default is None, which means
+        parsing every file.
         :return: None.
         """
         assert isinstance(input_path, str)
@@ -56,127 +264,193 @@ class Feature:
         assert isinstance(bipos_path, str) or bipos_path is None
         assert isinstance(tripos_path, str) or tripos_path is None
         assert isinstance(fourpos_path, str) or fourpos_path is None
+        assert isinstance(manifest_path, str) or manifest_path is None
 
-        chunks = []
-        paragraphs = []
-        self.logger.info('Loading corpora...')
+        self.logger.info('Parsing and counting...')
 
-        if os.path.isdir(input_path):
-            texts = ''
-            input_paths = str.format('{}/*/*', input_path)
-
-            for file_path in glob.glob(input_paths):
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    for line in file:
-                        paragraphs.append(line)
-                        if len(texts) + len(line) >= 100000:
-                            chunks.append(texts)
-                            texts = ''
-                        texts += line
-            chunks.append(texts)
-        elif os.path.isfile(input_path):
-            with open(input_path, 'r', encoding='utf-8') as file:
-                for line in file:
-                    paragraphs.append(line)
-                    chunks.append(line)
+        if manifest_path is not None and os.path.isdir(input_path):
+            counter = self._count_incrementally(input_path, manifest_path)
         else:
-            raise Exception(str.format('{} is not a directory nor a file.', input_path))
-
-        words = []
-        biwords = []
-        triwords = []
-        chars = []
-        postags = []
-        bipostag = []
-        tripostag = []
-        fourpostag = []
-
-        self.logger.info('Parsing...')
-
-        with Pool() as pool:
-            args = []
-            for chunk in chunks:
-                args.append((self.url, chunk))
-
-            results = pool.starmap(Feature._multi_run, args)
-            for result in results:
-                words.extend(result[0])
-                postags.extend(result[1])
-
-        for pair in self._make_ngram(words, 2):
-            biwords.append(str.format('{} {}', pair[0], pair[1]))
-
-        for pair in self._make_ngram(words, 3):
-            triwords.append(str.format('{} {} {}', pair[0], pair[1], pair[2]))
-
-        for para in paragraphs:
-            g = self._make_ngram(para, self.num_gram)
-            chars.extend(g)
-
-        for pair in self._make_ngram(postags, 2):
-            bipostag.append(str.format('{} {}', pair[0], pair[1]))
-
-        for pair in self._make_ngram(postags, 3):
-            tripostag.append(str.format('{} {} {}', pair[0], pair[1], pair[2]))
-
-        for pair in self._make_ngram(postags, 4):
-            fourpostag.append(str.format('{} {} {} {}', pair[0], pair[1], pair[2], pair[3]))
-
-        self.logger.info('Counting...')
-
-        word_model = self.count_tokens(words)
-        biword_model = self.count_tokens(biwords)
-        triwords_model = self.count_tokens(triwords)
-        char_model = self.count_tokens(chars)
-        postag_model = self.count_tokens(postags)
-        bigram_model = self.count_tokens(bipostag)
-        tripos_model = self.count_tokens(tripostag)
-        fourpos_model = self.count_tokens(fourpostag)
+            chunk_counters = self._count_chunks(self._read_chunks(input_path))
+            counter = NgramCounter.tree_reduce(chunk_counters, max_terms=self.max_terms)
+
+        models = counter.models(self.min_count)
+        word_model = models['word']
+        biword_model = models['biword']
+        triwords_model = models['triword']
+        char_model = models['char']
+        postag_model = models['pos']
+        bigram_model = models['bipos']
+        tripos_model = models['tripos']
+        fourpos_model = models['fourpos']
 
         if word_path is not None:
-            self.save_model(word_model, word_path)
-            self.logger.info('Exported word frequency model to files.')
+            path = self.save_model(word_model, word_path, self.binary)
+            self.logger.info(str.format('Exported word frequency model to {}.', path))
 
         if biword_path is not None:
-            self.save_model(biword_model, biword_path)
-            self.logger.info('Exported word bigram model to files.')
+            path = self.save_model(biword_model, biword_path, self.binary)
+            self.logger.info(str.format('Exported word bigram model to {}.', path))
 
         if triword_path is not None:
-            self.save_model(triwords_model, triword_path)
-            self.logger.info('Exported word trigram model to files.')
+            path = self.save_model(triwords_model, triword_path, self.binary)
+            self.logger.info(str.format('Exported word trigram model to {}.', path))
 
         if char_ngram_path is not None:
-            self.save_model(char_model, char_ngram_path)
-            self.logger.info('Exported character n-gram model to files.')
+            path = self.save_model(char_model, char_ngram_path, self.binary)
+            self.logger.info(str.format('Exported character n-gram model to {}.', path))
 
         if pos_path is not None:
-            self.save_model(postag_model, pos_path)
-            self.logger.info('Exported POS tag model to files.')
+            path = self.save_model(postag_model, pos_path, self.binary)
+            self.logger.info(str.format('Exported POS tag model to {}.', path))
 
         if bipos_path is not None:
-            self.save_model(bigram_model, bipos_path)
-            self.logger.info('Exported POS tag bigram model to files.')
+            path = self.save_model(bigram_model, bipos_path, self.binary)
+            self.logger.info(str.format('Exported POS tag bigram model to {}.', path))
 
         if tripos_path is not None:
-            self.save_model(tripos_model, tripos_path)
-            self.logger.info('Exported POS tag trigram model to files.')
+            path = self.save_model(tripos_model, tripos_path, self.binary)
+            self.logger.info(str.format('Exported POS tag trigram model to {}.', path))
 
         if fourpos_path is not None:
-            self.save_model(fourpos_model, fourpos_path)
-            self.logger.info('Exported POS tag 4gram model to files.')
+            path = self.save_model(fourpos_model, fourpos_path, self.binary)
+            self.logger.info(str.format('Exported POS tag 4gram model to {}.', path))
+
+    def _read_chunks(self, input_path):
+        """
+        Reads corpora chunk by chunk, so that only a bounded number of chunks
+        are in memory at a time.
+        :param input_path: A path to a directory containing corpora, or a file.
+        :return: A generator of tuples (chunk, list of paragraphs in the chunk).
+        A chunk is a text of at most 100k characters for a directory, and a list of
+        lines that fit into a single request for a file.
+        """
+        self.logger.info('Loading corpora...')
+
+        if os.path.isdir(input_path):
+            texts = ''
+            paragraphs = []
+            input_paths = str.format('{}/*/*', input_path)
+
+            # Files are read in the order _count_incrementally() merges them in,
+            # so the n-grams spanning files are the same either way.
+            for file_path in sorted(glob.glob(input_paths)):
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        if len(texts) + len(line) >= MAX_REQUEST_BYTES:
+                            yield texts, paragraphs
+                            texts = ''
+                            paragraphs = []
+                        texts += line
+                        paragraphs.append(line)
+            yield texts, paragraphs
+        elif os.path.isfile(input_path):
+            # Each line is parsed as a separate document, packed into as few requests as possible.
+            lines = []
+            size = 0
+            with open(input_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line_size = len(line.encode()) + len(DOCUMENT_SEPARATOR)
+                    if len(lines) > 0 and size + line_size > MAX_REQUEST_BYTES:
+                        yield lines, lines
+                        lines = []
+                        size = 0
+                    lines.append(line)
+                    size += line_size
+            if len(lines) > 0:
+                yield lines, lines
+        else:
+            raise Exception(str.format('{} is not a directory nor a file.', input_path))
+
+    def _count_incrementally(self, input_path, manifest_path):
+        """
+        Counts a corpora directory file by file, parsing only the files that are
+        new or modified since the previous run and reusing the stored partial
+        counts of the others.
+        :param input_path: A path to a directory containing corpora.
+        :param manifest_path: A path to the manifest directory.
+        :return: An NgramCounter of the whole corpora.
+        """
+        manifest = CountManifest(manifest_path, self.num_gram)
+        file_paths = sorted(glob.glob(str.format('{}/*/*', input_path)))
+        names = {file_path: os.path.relpath(file_path, input_path) for file_path in file_paths}
+        hashes = {file_path: CountManifest.hash_file(file_path) for file_path in file_paths}
+        changed = [file_path for file_path in file_paths
+                   if not manifest.is_current(names[file_path], hashes[file_path])]
+        self.logger.info(str.format('Parsing {} new or modified files out of {}...', len(changed), len(file_paths)))
+
+        if len(changed) > 0:
+            tagged_paths, tagged_chunks = itertools.tee(self._read_files(changed))
+            chunk_counters = self._count_chunks((chunk, paragraphs) for _, chunk, paragraphs in tagged_chunks)
+            tagged_counters = zip((file_path for file_path, _, _ in tagged_paths), chunk_counters)
+            for file_path, group in itertools.groupby(tagged_counters, key=lambda pair: pair[0]):
+                counter = NgramCounter.tree_reduce(counter for _, counter in group)
+                manifest.store(names[file_path], hashes[file_path], counter)
+        manifest.save(list(names.values()))
+
+        partial_counters = (manifest.load(names[file_path]) for file_path in file_paths)
+        return NgramCounter.tree_reduce(partial_counters, max_terms=self.max_terms)
 
     @staticmethod
-    def _make_ngram(iterable, size):
+    def _read_files(file_paths):
         """
-        Generates n-grams out of iterable objects, such as strings or lists.
-        :param iterable: An iterable object.
-        :param size: A constant number of n to make n-gram.
-        :return: A set of generated n-grams out of the iterable object.
+        Reads corpus files chunk by chunk without joining files into a chunk.
+        :param file_paths: A list of paths to corpus files.
+        :return: A generator of tuples (file path, chunk, list of paragraphs in the chunk).
+        Every file yields at least one, possibly empty, chunk.
         """
-        grams = []
-        for i in range(len(iterable) - size + 1):
-            grams.append(iterable[i:i + size])
-        return grams
+        for file_path in file_paths:
+            texts = ''
+            paragraphs = []
+            with open(file_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if len(paragraphs) > 0 and len(texts) + len(line) >= MAX_REQUEST_BYTES:
+                        yield file_path, texts, paragraphs
+                        texts = ''
+                        paragraphs = []
+                    texts += line
+                    paragraphs.append(line)
+            yield file_path, texts, paragraphs
+
+    def _count_chunks(self, chunks):
+        """
+        Parses and counts chunks in worker processes, keeping only a window
+        of chunks in flight.
+        :param chunks: An iterable of tuples (chunk, paragraphs) generated by _read_chunks().
+        :return: A generator of NgramCounters, one per chunk, in input order.
+        """
+        with Pool() as pool:
+            pending = collections.deque()
+            for result in self._count_tasks(pool, chunks):
+                pending.append(result)
+                if len(pending) >= self.window:
+                    yield pending.popleft().get()
+            while len(pending) > 0:
+                yield pending.popleft().get()
+
+    def _count_tasks(self, pool, chunks):
+        """
+        Submits a counting task per chunk to the pool. With an asynchronous
+        client, a window of chunks is parsed in this process first and only the
+        counting runs in the pool.
+        :param pool: A process pool.
+        :param chunks: An iterable of tuples (chunk, paragraphs) generated by _read_chunks().
+        :return: A generator of AsyncResults of NgramCounters.
+        """
+        if self.max_in_flight is None:
+            for chunk, paragraphs in chunks:
+                yield pool.apply_async(Feature._multi_count,
+                                       (self.url, chunk, paragraphs, self.cache, self.num_gram))
+            return
+
+        chunks = iter(chunks)
+        while True:
+            batch = list(itertools.islice(chunks, self.window))
+            if len(batch) == 0:
+                break
+            results = asyncio.run(self._async_run([chunk for chunk, _ in batch]))
+            for (_, paragraphs), (words, postags) in zip(batch, results):
+                yield pool.apply_async(NgramCounter.from_chunk, (words, postags, paragraphs, self.num_gram))
 
     @staticmethod
     def count_tokens(tokens):
@@ -195,34 +469,119 @@ class Feature:
         return model
 
     @staticmethod
-    def save_model(model, output_file):
+    def save_model(model, output_file, binary=False):
         """
         Saves the given model to the file.
         :param model: A dictionary generated by the function build_model().
         :param output_file: A path to the output file you want to save to.
-        :return: None.
+        :param binary: Saves the model as a compressed NumPy .npz archive of a sorted
+        term table and a count array instead of a text file. BINARY_SUFFIX is
+        appended to the output file path if it does not end with it, since the
+        format of metadata files is told by their suffix when they are loaded.
+        :return: The path of the saved file.
         """
         assert isinstance(model, dict)
         assert isinstance(output_file, str)
+        if binary:
+            if not output_file.endswith(BINARY_SUFFIX):
+                output_file += BINARY_SUFFIX
+            terms = sorted(model)
+            table = StringTable.from_strings(terms)
+            counts = numpy.fromiter((model[term] for term in terms), dtype=numpy.int64, count=len(terms))
+            with open(output_file, 'wb') as file:
+                numpy.savez_compressed(file, blob=table.blob, offsets=table.offsets, counts=counts)
+            return output_file
+
         with open(output_file, 'w', encoding='utf-8') as file:
             for word, num in model.items():
                 file.write(str.format('{} {}\n', word, num))
+        return output_file
+
+    @staticmethod
+    def load_model(input_file):
+        """
+        Loads a model saved in the binary format with one bulk read.
+        :param input_file: A path to a model file saved by save_model(binary=True).
+        :return: A tuple (StringTable of sorted terms, NumPy array of their counts).
+        """
+        assert isinstance(input_file, str)
+        with numpy.load(input_file) as data:
+            return StringTable(data['blob'], data['offsets']), data['counts']
 
     @staticmethod
-    def _multi_run(url, text):
+    def _multi_run(url, text, cache=None):
         """
         This function is internally used for RESTful API calls to
         the CoreNLP server in parallel.
         :param url: A URL to the CoreNLP server.
-        :param text: A text to be processed.
+        :param text: A text to be processed, or a list of texts that
+        fit into a single request.
+        :param cache: An AnnotationCache to look up annotations in, or None.
         :return: A tuple containing a list of words and a list of POS tags.
         """
         assert isinstance(url, str)
-        assert isinstance(text, str)
-        nlp = StanfordCoreNLP(str.format('http://{}:8011', url))
-        words, postags = nlp.parse(text)
+        assert isinstance(text, str) or isinstance(text, list)
+        nlp = StanfordCoreNLP(str.format('http://{}:8011', url), cache=cache)
+        if isinstance(text, str):
+            return nlp.parse(text)
+
+        words = []
+        postags = []
+        for text_words, text_postags in nlp.parse_many(text):
+            words.extend(text_words)
+            postags.extend(text_postags)
         return words, postags
 
+    @staticmethod
+    def _multi_count(url, text, paragraphs, cache=None, num_gram=4):
+        """
+        This function is internally used to parse and count a chunk in parallel.
+        :param url: A URL to the CoreNLP server.
+        :param text: A text to be processed, or a list of texts that
+        fit into a single request.
+        :param paragraphs: A list of paragraphs of the chunk for character n-grams.
+        :param cache: An AnnotationCache to look up annotations in, or None.
+        :param num_gram: A number n for character n-gram.
+        :return: An NgramCounter of the chunk.
+        """
+        words, postags = Feature._multi_run(url, text, cache)
+        return NgramCounter.from_chunk(words, postags, paragraphs, num_gram)
+
+    async def _async_run(self, chunks):
+        """
+        This function is internally used for concurrent RESTful API calls
+        to the CoreNLP server from a single process.
+        :param chunks: A list of texts, or lists of texts, to be processed.
+        :return: A list of tuples containing a list of words and a list of POS tags, one per chunk.
+        """
+        assert isinstance(chunks, list)
+        texts = []
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                texts.append(chunk)
+            else:
+                texts.extend(chunk)
+
+        # aiohttp is only needed when the asynchronous client is used.
+        from .async_corenlp import AsyncStanfordCoreNLP
+
+        url = str.format('http://{}:8011', self.url)
+        async with AsyncStanfordCoreNLP(url, cache=self.cache, max_in_flight=self.max_in_flight) as nlp:
+            results = await nlp.parse_many(texts)
+
+        chunk_results = []
+        i = 0
+        for chunk in chunks:
+            num_texts = 1 if isinstance(chunk, str) else len(chunk)
+            words = []
+            postags = []
+            for text_words, text_postags in results[i:i + num_texts]:
+                words.extend(text_words)
+                postags.extend(text_postags)
+            chunk_results.append((words, postags))
+            i += num_texts
+        return chunk_results
+
 
 def main():
     parser = argparse.ArgumentParser(description='This generates feature metadata.')
@@ -236,6 +595,12 @@ def main():
     parser.add_argument('-bipos', metavar='<output_bipos.txt>', dest='bipos_file', help='POS tag bigram output file', required=False)
     parser.add_argument('-tripos', metavar='<output_tripos.txt>', dest='tripos_file', help='POS tag trigram output file', required=False)
     parser.add_argument('-4pos', metavar='<output_4pos.txt>', dest='fourpos_file', help='POS tag 4gram output file', required=False)
+    parser.add_argument('-cache', metavar='<corenlp_cache.db>', dest='cache_file', help='CoreNLP annotation cache file', required=False)
+    parser.add_argument('-binary', dest='binary', action='store_true', help='Save metadata in the binary .npz format, appending .npz to the output file names', required=False)
+    parser.add_argument('-mincount', metavar='<1>', dest='min_count', type=int, default=1, help='Minimum count of terms kept in the metadata', required=False)
+    parser.add_argument('-maxterms', metavar='<5000000>', dest='max_terms', type=int, help='Maximum distinct terms kept per n-gram type while counting, pruning the rarest', required=False)
+    parser.add_argument('-manifest', metavar='<output_manifest>', dest='manifest_path', help='Directory of per-file partial counts for incremental updates', required=False)
+    parser.add_argument('-concurrency', metavar='<100>', dest='max_in_flight', type=int, help='Maximum concurrent CoreNLP requests from a single process instead of a process pool', required=False)
     args = parser.parse_args()
 
     input_path = args.input_path
@@ -252,7 +617,12 @@ def main():
     if args.url is not None:
         url = args.url
 
-    wf = Feature(url)
+    cache = None
+    if args.cache_file is not None:
+        cache = AnnotationCache(args.cache_file)
+
+    wf = Feature(url, cache=cache, max_in_flight=args.max_in_flight, binary=args.binary,
+                 min_count=args.min_count, max_terms=args.max_terms)
     wf.build_model(input_path=input_path,
                    word_path=word_file,
                    biword_path=biword_file,
@@ -261,7 +631,8 @@ def main():
                    pos_path=pos_file,
                    bipos_path=bipos_file,
                    tripos_path=tripos_file,
-                   fourpos_path=fourpos_file)
+                   fourpos_path=fourpos_file,
+                   manifest_path=args.manifest_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import pickle
+
+
+class CountManifest:
+    """
+    This class keeps the content hash and the partial n-gram counts of every
+    corpus file in a directory, so that only new or modified files have to be
+    parsed again when the corpora change. The directory holds manifest.json,
+    which maps a file path to its hash, and a pickled NgramCounter per hash.
+    """
+
+    def __init__(self, path, num_gram=4):
+        """
+        Opens a manifest directory, creating it if it does not exist.
+        :param path: A path to the manifest directory.
+        :param num_gram: A number n for character n-gram. Partial counts made
+        with another n are discarded.
+        """
+        assert isinstance(path, str)
+        assert isinstance(num_gram, int)
+        self.path = path
+        self.num_gram = num_gram
+        self.files = {}
+        os.makedirs(path, exist_ok=True)
+
+        manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get('num_gram') == num_gram:
+                self.files = manifest['files']
+
+    @staticmethod
+    def hash_file(file_path):
+        """
+        :param file_path: A path to a corpus file.
+        :return: A hex SHA-1 digest of the file content.
+        """
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _partial_path(self, file_hash):
+        return os.path.join(self.path, file_hash + '.pickle')
+
+    def is_current(self, file_path, file_hash):
+        """
+        :param file_path: A path to a corpus file.
+        :param file_hash: The current hash of the file generated by hash_file().
+        :return: True if the partial counts of the file content are stored.
+        """
+        return self.files.get(file_path) == file_hash and os.path.isfile(self._partial_path(file_hash))
+
+    def load(self, file_path):
+        """
+        :param file_path: A path to a corpus file.
+        :return: The stored NgramCounter of the file.
+        """
+        with open(self._partial_path(self.files[file_path]), 'rb') as file:
+            return pickle.load(file)
+
+    def store(self, file_path, file_hash, counter):
+        """
+        Stores the partial counts of a file.
+        :param file_path: A path to a corpus file.
+        :param file_hash: The hash of the file generated by hash_file().
+        :param counter: An NgramCounter of the file.
+        :return: None.
+        """
+        with open(self._partial_path(file_hash), 'wb') as file:
+            pickle.dump(counter, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.files[file_path] = file_hash
+
+    def save(self, file_paths):
+        """
+        Saves the manifest, forgetting files that are no longer in the corpora
+        and deleting partial counts no file refers to.
+        :param file_paths: A list of paths to all the current corpus files.
+        :return: None.
+        """
+        file_paths = set(file_paths)
+        self.files = {path: file_hash for path, file_hash in self.files.items() if path in file_paths}
+        with open(os.path.join(self.path, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump({'num_gram': self.num_gram, 'files': self.files}, file, indent=1, sort_keys=True)
+
+        hashes = set(self.files.values())
+        for name in os.listdir(self.path):
+            if name.endswith('.pickle') and name[:-len('.pickle')] not in hashes:
+                os.remove(os.path.join(self.path, name))
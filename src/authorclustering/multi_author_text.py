@@ -1,4 +1,12 @@
+import hashlib
+import json
+import os
+from array import array
+
+import numpy
+
 from .corenlp import StanfordCoreNLP
+from .vocabulary import InternedStrings, StringTable
 
 class Text(object):
     def __init__(self, verbose = False):
@@ -7,27 +15,176 @@ class Text(object):
         self.AuthorIds = []
         self.Authors = []
         self.Language = None # TODO: needed? ignored for now. Assuming corenlp does the right thing for the langs we need.
-        self.Words = None # TODO: need per sentence words?
-        self.Tags = None
+        # Words and tags are interned: int32 ids into tables of distinct strings,
+        # with the offset of the first token of every sentence in TokenOffsets.
+        self.WordTable = None
+        self.WordIds = None
+        self.TagTable = None
+        self.TagIds = None
+        self.TokenOffsets = None
+        self._wordIndex = None
+        self._tagIndex = None
+        self._authorIndex = None
         self.Verbose = verbose
         #if self.Language not in [Language.Arabic, Language.English, Language.Spanish]:
         #    raise Exception("Not implemented for language", self.Language)
         return
 
+    @property
+    def Words(self):
+        """
+        :return: a sequence of the words of the text, or None if not cached.
+        """
+        if self.WordIds is None:
+            return None
+        return InternedStrings(self.WordTable, self.WordIds)
+
+    @Words.setter
+    def Words(self, words):
+        self.WordTable, self.WordIds, self._wordIndex = Text._intern_all(words)
+        self.TokenOffsets = None
+
+    @property
+    def Tags(self):
+        """
+        :return: a sequence of the POS tags of the text, or None if not cached.
+        """
+        if self.TagIds is None:
+            return None
+        return InternedStrings(self.TagTable, self.TagIds)
+
+    @Tags.setter
+    def Tags(self, tags):
+        self.TagTable, self.TagIds, self._tagIndex = Text._intern_all(tags)
+        self.TokenOffsets = None
+
+    @staticmethod
+    def _intern_all(tokens):
+        """
+        :param tokens: a list of tokens, or None
+        :return: a tuple (list of distinct tokens, array of ids, dictionary of a token to its id)
+        """
+        if tokens is None:
+            return None, None, None
+        index = {}
+        ids = array('i', (index.setdefault(token, len(index)) for token in tokens))
+        return list(index), ids, index
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_wordIndex'] = None
+        state['_tagIndex'] = None
+        state['_authorIndex'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Texts pickled before interning keep words and tags as lists of strings.
+        words = state.pop('Words', None)
+        tags = state.pop('Tags', None)
+        self.__dict__.update(state)
+        self._authorIndex = None
+        if 'WordIds' not in state:
+            self.Words = words
+            self.Tags = tags
+
+    def _append_tokens(self, words, tags):
+        """
+        Appends the words and tags of a sentence.
+        :param words: a list of words
+        :param tags: a list of POS tags
+        """
+        if self._wordIndex is None:
+            self._wordIndex = {word: i for i, word in enumerate(self.WordTable)}
+            self._tagIndex = {tag: i for i, tag in enumerate(self.TagTable)}
+        for index, table, ids, tokens in ((self._wordIndex, self.WordTable, self.WordIds, words),
+                                          (self._tagIndex, self.TagTable, self.TagIds, tags)):
+            for token in tokens:
+                i = index.get(token)
+                if i is None:
+                    i = len(table)
+                    index[token] = i
+                    table.append(token)
+                ids.append(i)
+        if self.TokenOffsets is not None:
+            self.TokenOffsets.append(len(self.WordIds))
+
+    def getSentenceTokenSpan(self, sentenceIdx):
+        """
+        :param sentenceIdx: a sentence index
+        :return: a tuple (start, end) of the token offsets of the sentence in Words and Tags
+        """
+        if self.TokenOffsets is None:
+            raise Exception('Sentence token offsets are not cached.')
+        return int(self.TokenOffsets[sentenceIdx]), int(self.TokenOffsets[sentenceIdx + 1])
+
+    def getSentenceTokens(self, sentenceIds):
+        """
+        :param sentenceIds: a list of sentence indices
+        :return: a tuple (int32 NumPy array of word ids, int32 NumPy array of tag ids)
+        of the sentences, ids into WordTable and TagTable
+        """
+        spans = []
+        for i in sentenceIds:
+            start, end = self.getSentenceTokenSpan(i)
+            if len(spans) > 0 and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        words = [Text._as_ids(self.WordIds[start:end]) for start, end in spans]
+        tags = [Text._as_ids(self.TagIds[start:end]) for start, end in spans]
+        if len(spans) == 1:
+            return words[0], tags[0]
+        empty = numpy.zeros(0, dtype=numpy.int32)
+        return numpy.concatenate([empty] + words), numpy.concatenate([empty] + tags)
+
+    @staticmethod
+    def _as_ids(ids):
+        """
+        :param ids: a slice of WordIds or TagIds, an array('i') or a NumPy array
+        :return: an int32 NumPy array of the ids
+        """
+        if isinstance(ids, numpy.ndarray):
+            return ids
+        return numpy.frombuffer(ids, dtype=numpy.int32)
+
     def _get_authorid(self, author):
-        idx = len(self.Authors)
-        if author in self.Authors:
-            idx = self.Authors.index(author)
-        else:
+        if self._authorIndex is None:
+            self._authorIndex = {name: i for i, name in enumerate(self.Authors)}
+        idx = self._authorIndex.get(author)
+        if idx is None:
+            idx = len(self.Authors)
+            self._authorIndex[author] = idx
             self.Authors.append(author)
         return idx
 
+    def _materialize(self):
+        """
+        Turns the columns of a text opened from disk into lists, so that
+        sentences can be added to it.
+        """
+        if isinstance(self.Sentences, list):
+            return
+        self.Paragraphs = list(self.Paragraphs)
+        self.Sentences = list(self.Sentences)
+        self.AuthorIds = [int(x) for x in self.AuthorIds]
+        if self.WordIds is not None:
+            self.WordTable = list(self.WordTable)
+            self.TagTable = list(self.TagTable)
+            self.WordIds = array('i', numpy.asarray(self.WordIds, dtype=numpy.int32).tobytes())
+            self.TagIds = array('i', numpy.asarray(self.TagIds, dtype=numpy.int32).tobytes())
+            self._wordIndex = None
+            self._tagIndex = None
+        if self.TokenOffsets is not None:
+            self.TokenOffsets = array('q', numpy.asarray(self.TokenOffsets, dtype=numpy.int64).tobytes())
+
     def getText(self):
         return ' '.join(self.Sentences)
 
     def cacheWords(self):
+        self._materialize()
         self.Words = []
         self.Tags = []
+        self.TokenOffsets = array('q', [0])
         chunk_size = 1500 # send chunk_size sentences to the server at a time
         for i in range(0, len(self.Sentences), chunk_size):
             lower = i
@@ -35,9 +192,8 @@ class Text(object):
             if self.Verbose:
                 print("Fetching parse for setences: %d-%d of %d" % (lower, upper, len(self.Sentences)))
             cnlp = StanfordCoreNLP()
-            newWords, newTags = cnlp.parse(' '.join(self.Sentences[lower:upper]))
-            self.Words += newWords
-            self.Tags += newTags
+            for newWords, newTags in cnlp.parse_many(list(self.Sentences[lower:upper])):
+                self._append_tokens(newWords, newTags)
 
     def getTextTokenizedBySentence(self):
         return self.Sentences
@@ -56,13 +212,25 @@ class Text(object):
         :param sentences: a list of sentences
         :param author: author name
         """
-        idx = self._get_authorid(author)
-        for sentence in sentences:
-            self.Sentences.append(sentence)
-            self.AuthorIds.append(idx)
-        if self.Words is not None:
+        self.add_sentence_batches([(author, sentences)])
+
+    def add_sentence_batches(self, batches):
+        """
+        Add many runs of sentences at once. If words are cached, the new
+        sentences are parsed together with as few requests as possible
+        after all of them are added.
+        :param batches: an iterable of tuples (author name, list of sentences)
+        """
+        self._materialize()
+        start = len(self.Sentences)
+        for author, sentences in batches:
+            idx = self._get_authorid(author)
+            self.Sentences.extend(sentences)
+            self.AuthorIds.extend([idx] * len(sentences))
+        if self.WordIds is not None and len(self.Sentences) > start:
             cnlp = StanfordCoreNLP()
-            self.Words += cnlp.parse(sentence)[0]
+            for newWords, newTags in cnlp.parse_many(self.Sentences[start:]):
+                self._append_tokens(newWords, newTags)
 
     def add_sentence(self, author, sentence):
         """
@@ -72,49 +240,145 @@ class Text(object):
         """
         self.add_sentences(author, [sentence])
 
-    def fixed_length_chunk(self, chunk_size):
+    def fixed_length_chunk(self, chunk_size, tokens = False):
         """
         Separates text into chunks of 'chunk_size' sentences.
         :param chunk_size: the number of sentences in each chunk
+        :param tokens: also returns the cached words and tags of each chunk,
+        sliced with the sentence token offsets recorded by cacheWords()
         :return: a tuple (list of lists of sentence indices per chunk, list of list of sentences per chunk)
-        ( [ [0, 1, 2], [3,4] ], [ ['sen1', 'sen2', 'sen3'], ['sen4', 'sen5'] ])
+        ( [ [0, 1, 2], [3,4] ], [ ['sen1', 'sen2', 'sen3'], ['sen4', 'sen5'] ]).
+        With tokens, a tuple (sentence indices, sentences, list of words per chunk, list of tags per chunk).
         """
         if chunk_size <= 0:
             raise Exception('Invalid chunk size.')
 
         chunkSentences = []
         chunkSentenceIds = []
+        chunkWords = []
+        chunkTags = []
 
         for i in range(0, len(self.Sentences), chunk_size):
-            chunkSentences.append(self.Sentences[i:min(len(self.Sentences), i + chunk_size)])
-            chunkSentenceIds.append(list( range(i, min(len(self.Sentences), i + chunk_size))))
+            upper = min(len(self.Sentences), i + chunk_size)
+            chunkSentences.append(self.Sentences[i:upper])
+            chunkSentenceIds.append(list( range(i, upper)))
+            if tokens:
+                start, _ = self.getSentenceTokenSpan(i)
+                _, end = self.getSentenceTokenSpan(upper - 1)
+                chunkWords.append(InternedStrings(self.WordTable, self.WordIds[start:end]))
+                chunkTags.append(InternedStrings(self.TagTable, self.TagIds[start:end]))
+        if tokens:
+            return (chunkSentenceIds, chunkSentences, chunkWords, chunkTags)
         return (chunkSentenceIds, chunkSentences)
 
+    def iter_chunks(self, chunk_size):
+        """
+        Generates chunks of 'chunk_size' sentences one by one, reading only
+        the sentences of the current chunk from a text opened from disk.
+        :param chunk_size: the number of sentences in each chunk
+        :return: a generator of tuples (list of sentence indices, list of sentences)
+        """
+        if chunk_size <= 0:
+            raise Exception('Invalid chunk size.')
+
+        for i in range(0, len(self.Sentences), chunk_size):
+            upper = min(len(self.Sentences), i + chunk_size)
+            yield list(range(i, upper)), self.Sentences[i:upper]
+
     def getAuthorForSentenceIndex(self, sentenceIdx):
         return self.Authors[self.AuthorIds[sentenceIdx]]
 
     def getAuthorIndexForSentence(self, sentenceIdx):
-        return self.AuthorIds[sentenceIdx]
+        return int(self.AuthorIds[sentenceIdx])
 
     def getAuthorForAuthorIndex(self, authorIdx):
         return self.Authors[authorIdx]
 
     def writeToFile(self, fname):
         """
-        :param fname: File name to write this text object to.
+        Writes this text object in the columnar format of save().
+        :param fname: Directory name to write this text object to.
         """
-        with open(fname, 'wb') as f:
-            import pickle
-            pickle.dump(self, f)
+        self.save(fname)
 
     @staticmethod
     def loadFromFile(fname, verbose = False):
         """
-        :param fname: File name to read a Text object from.
-        :return: the read Text object.
+        :param fname: Directory name written by writeToFile(), or file name of
+        a pickled Text object.
+        :return: the read Text object. A directory is memory-mapped with open().
         """
+        if os.path.isdir(fname):
+            return Text.open(fname, verbose)
         with open(fname, 'rb') as f:
             import pickle
             text = pickle.load(f)
             text.Verbose = verbose
             return text
+
+    def digest(self):
+        """
+        :return: a hex digest string identifying the sentences, their authors
+        and the cached words and tags, if their sentence offsets are cached.
+        """
+        def tableArrays(strings):
+            table = strings if isinstance(strings, StringTable) else StringTable.from_strings(strings)
+            return [numpy.asarray(table.offsets, dtype=numpy.int64), numpy.asarray(table.blob, dtype=numpy.uint8)]
+
+        arrays = tableArrays(self.Sentences) + [numpy.asarray(self.AuthorIds, dtype=numpy.int32)]
+        if self.TokenOffsets is not None:
+            arrays += tableArrays(self.WordTable) + [numpy.asarray(self.WordIds, dtype=numpy.int32)]
+            arrays += tableArrays(self.TagTable) + [numpy.asarray(self.TagIds, dtype=numpy.int32)]
+            arrays.append(numpy.asarray(self.TokenOffsets, dtype=numpy.int64))
+        digest = hashlib.sha1(json.dumps(self.Authors).encode())
+        for a in arrays:
+            digest.update(numpy.ascontiguousarray(a).tobytes())
+        return digest.hexdigest()
+
+    def save(self, dirname):
+        """
+        Saves this text object to a directory in a columnar format: sentences
+        and paragraphs as offset-indexed UTF-8 blobs, author ids as an int32
+        array, and words and tags as int32 ids into tables of distinct strings.
+        :param dirname: Directory name to write this text object to.
+        """
+        os.makedirs(dirname, exist_ok=True)
+        StringTable.from_strings(self.Paragraphs).save(os.path.join(dirname, 'paragraphs'))
+        StringTable.from_strings(self.Sentences).save(os.path.join(dirname, 'sentences'))
+        numpy.save(os.path.join(dirname, 'author_ids.npy'), numpy.asarray(self.AuthorIds, dtype=numpy.int32))
+        if self.WordIds is not None:
+            self.Words.save(os.path.join(dirname, 'words'))
+            self.Tags.save(os.path.join(dirname, 'tags'))
+        if self.TokenOffsets is not None:
+            numpy.save(os.path.join(dirname, 'token_offsets.npy'), numpy.asarray(self.TokenOffsets, dtype=numpy.int64))
+        with open(os.path.join(dirname, 'text.json'), 'w', encoding='utf-8') as f:
+            json.dump({'authors': self.Authors, 'language': self.Language,
+                       'words': self.WordIds is not None}, f)
+
+    @staticmethod
+    def open(dirname, verbose = False, mmap = True):
+        """
+        Opens a text object saved by save() without reading it into memory.
+        Sentences, author ids, words and tags are read lazily as they are accessed.
+        :param dirname: Directory name to read a Text object from.
+        :param mmap: Memory-maps the files instead of reading them.
+        :return: the opened Text object.
+        """
+        with open(os.path.join(dirname, 'text.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        text = Text(verbose)
+        text.Authors = meta['authors']
+        text.Language = meta['language']
+        text.Paragraphs = StringTable.load(os.path.join(dirname, 'paragraphs'), mmap)
+        text.Sentences = StringTable.load(os.path.join(dirname, 'sentences'), mmap)
+        mmap_mode = 'r' if mmap else None
+        text.AuthorIds = numpy.load(os.path.join(dirname, 'author_ids.npy'), mmap_mode=mmap_mode)
+        if meta['words']:
+            words = InternedStrings.load(os.path.join(dirname, 'words'), mmap)
+            tags = InternedStrings.load(os.path.join(dirname, 'tags'), mmap)
+            text.WordTable, text.WordIds = words.table, words.ids
+            text.TagTable, text.TagIds = tags.table, tags.ids
+        offsets_path = os.path.join(dirname, 'token_offsets.npy')
+        if os.path.isfile(offsets_path):
+            text.TokenOffsets = numpy.load(offsets_path, mmap_mode=mmap_mode)
+        return text
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import numpy
+import scipy.linalg
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import eigsh
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
+
+# Dense affinities with at most this many rows are decomposed with a full eigensolver.
+DENSE_SOLVER_MAX_ROWS = 2000
+
+
+class SpectralEmbedding:
+    """
+    This class computes the normalized Laplacian eigenvectors of an affinity
+    matrix once, so that k-means can be run on them for several numbers of
+    clusters and random seeds. It is the same embedding that SpectralClustering
+    computes internally on every fit.
+    """
+
+    def __init__(self, affinity, n_components, random_state=None):
+        """
+        Computes the eigenvectors of the smallest eigenvalues of the normalized Laplacian.
+        :param affinity: A symmetric affinity matrix, a NumPy array or a scipy.sparse matrix.
+        :param n_components: The number of eigenvectors to compute, which is
+        the largest number of clusters that can be asked for.
+        :param random_state: A seed of the starting vector of the sparse eigensolver, or None.
+        """
+        assert isinstance(n_components, int) and n_components > 0
+        num_rows = affinity.shape[0]
+        n_components = min(n_components, num_rows)
+        dense_solver = num_rows <= DENSE_SOLVER_MAX_ROWS or n_components >= num_rows - 1
+        if sparse.issparse(affinity) and not dense_solver:
+            affinity = sparse.csr_matrix(affinity, dtype=numpy.float64)
+        elif sparse.issparse(affinity):
+            affinity = affinity.toarray().astype(numpy.float64)
+        else:
+            affinity = numpy.asarray(affinity, dtype=numpy.float64)
+        laplacian, degrees = csgraph.laplacian(affinity, normed=True, return_diag=True)
+
+        if dense_solver:
+            laplacian[numpy.diag_indices_from(laplacian)] = 1
+            eigenvalues, eigenvectors = scipy.linalg.eigh(laplacian, subset_by_index=[0, n_components - 1])
+        else:
+            if sparse.issparse(laplacian):
+                laplacian = laplacian.tolil()
+                laplacian.setdiag(1)
+                laplacian = laplacian.tocsr()
+            else:
+                laplacian[numpy.diag_indices_from(laplacian)] = 1
+            v0 = numpy.random.RandomState(random_state).uniform(-1, 1, num_rows)
+            # Shift-invert around a small negative value finds the eigenvalues closest to 0.
+            eigenvalues, eigenvectors = eigsh(laplacian, k=n_components, sigma=-1e-5, which='LM', v0=v0)
+            order = numpy.argsort(eigenvalues)
+            eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+
+        # Recovers the eigenvectors of the random walk Laplacian.
+        embedding = eigenvectors / degrees[:, numpy.newaxis]
+        # Flips every eigenvector so that its largest absolute entry is positive.
+        largest = numpy.argmax(numpy.abs(embedding), axis=0)
+        embedding *= numpy.sign(embedding[largest, numpy.arange(embedding.shape[1])])
+        self.eigenvalues = eigenvalues
+        self.embedding = embedding
+
+    def labels(self, n_clusters, random_state=None, n_init=10):
+        """
+        Clusters the embedding with k-means.
+        :param n_clusters: The number of clusters, at most the number of components.
+        :param random_state: A seed of k-means, or None.
+        :param n_init: The number of k-means runs with different centroid seeds.
+        :return: A NumPy array of a cluster label per row of the affinity.
+        """
+        assert isinstance(n_clusters, int) and 0 < n_clusters <= self.embedding.shape[1]
+        k_means = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init)
+        return k_means.fit_predict(self.embedding[:, :n_clusters])
+
+    def eigengap_candidates(self, max_clusters=None):
+        """
+        Ranks numbers of clusters by the eigengap heuristic: k clusters are likely
+        when the gap between the k-th and (k + 1)-th smallest eigenvalues is large.
+        :param max_clusters: The largest number of clusters considered, or None
+        for as many as the computed eigenvalues allow.
+        :return: A list of numbers of clusters, from the largest gap to the smallest.
+        """
+        eigenvalues = self.eigenvalues
+        if max_clusters is not None:
+            eigenvalues = eigenvalues[:max_clusters + 1]
+        gaps = numpy.diff(eigenvalues)
+        return [int(k) + 1 for k in numpy.argsort(-gaps, kind='stable')]
+
+    def silhouette(self, labels, sample_size=1000, random_state=0):
+        """
+        Computes the silhouette score of labels in the embedding space on a
+        random sample of rows, so no n x n distance matrix is needed.
+        :param labels: A NumPy array of a cluster label per row.
+        :param sample_size: The maximum number of rows sampled.
+        :param random_state: A seed of the sample.
+        :return: A silhouette score between -1 and 1.
+        """
+        n_clusters = len(numpy.unique(labels))
+        num_rows = self.embedding.shape[0]
+        if n_clusters < 2 or n_clusters >= num_rows:
+            return -1.0
+        sample_size = min(sample_size, num_rows)
+        return float(silhouette_score(self.embedding[:, :max(2, n_clusters)], labels,
+                                      sample_size=sample_size, random_state=random_state))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CoreNLPTransport:
+    """
+    This class sends requests to a CoreNLP server over a pooled keep-alive
+    HTTP session. The server liveness is checked once and then refreshed
+    periodically rather than before every request, and failed requests
+    are retried with exponential backoff.
+    """
+
+    def __init__(self, server_url, retries=3, backoff=0.5, liveness_interval=300.0,
+                 pool_size=10, timeout=None):
+        """
+        Initializes with the CoreNLP server URL and the connection settings.
+        :param server_url: URL to the CoreNLP server.
+        :param retries: The number of times a failed request is retried.
+        :param backoff: The backoff factor in seconds between retries.
+        Retries wait backoff, 2 * backoff, 4 * backoff, ... seconds.
+        :param liveness_interval: Seconds after which the server liveness is checked again.
+        :param pool_size: The number of connections kept alive to the server.
+        :param timeout: Seconds to wait for the server response, or None to wait forever.
+        """
+        assert isinstance(server_url, str)
+        assert isinstance(retries, int)
+        self.server_url = server_url
+        self.retries = retries
+        self.backoff = backoff
+        self.liveness_interval = liveness_interval
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = None
+        self._pid = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sessions hold sockets, which cannot be shared across processes.
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['_pid'] = None
+        state['_checked_at'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        :return: The HTTP session of the current process.
+        """
+        # Threads of a process share one session, so only the first one creates it.
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                retry = Retry(total=self.retries, connect=self.retries, read=self.retries,
+                              backoff_factor=self.backoff, status_forcelist=(500, 502, 503, 504),
+                              allowed_methods=None)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+                self._checked_at = None
+            return self._session
+
+    def check_alive(self, force=False):
+        """
+        Checks that the Stanford CoreNLP server is started, unless it was
+        checked within the liveness interval.
+        :param force: Checks the server even if it was checked recently.
+        :return: None.
+        """
+        session = self.session
+        # Threads waiting for a check see its result instead of checking again.
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None \
+                    and now - self._checked_at < self.liveness_interval:
+                return
+            try:
+                session.get(self.server_url, timeout=self.timeout)
+            except requests.exceptions.ConnectionError:
+                raise Exception('Check whether you have started the CoreNLP server.')
+            self._checked_at = now
+
+    def post(self, text, properties):
+        """
+        Sends a RESTful API call to the CoreNLP server.
+        :param text: A text data to be processed.
+        :param properties: Properties that are attached to the url.
+        :return: A JSON output.
+        """
+        assert isinstance(text, str)
+        assert isinstance(properties, dict)
+        self.check_alive()
+
+        # texts should be encoded to deal with unicode.
+        data = text.encode()
+        try:
+            r = self.session.post(self.server_url, params={'properties': str(properties)},
+                                  data=data, timeout=self.timeout)
+        except requests.exceptions.ConnectionError:
+            # Checks the server again next time.
+            with self._lock:
+                self._checked_at = None
+            raise Exception('Check whether you have started the CoreNLP server.')
+        r.raise_for_status()
+        r.encoding = 'utf-8'
+        return json.loads(r.text, strict=True)
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(server_url):
+    """
+    Returns the transport shared by all the clients of the given server
+    in the current process, creating it on first use.
+    :param server_url: URL to the CoreNLP server.
+    :return: A CoreNLPTransport.
+    """
+    assert isinstance(server_url, str)
+    key = (os.getpid(), server_url)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = CoreNLPTransport(server_url)
+            _transports[key] = transport
+        return transport
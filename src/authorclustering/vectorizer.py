@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+import collections
+import zlib
+
+import numpy
+from scipy import sparse
+
+# Feature type initials used on the command line of exp_cluster.py.
+FEATURE_TYPES = 'wWcpPT'
+FEATURE_NAMES = {
+    'w': 'Word frequency',
+    'W': 'Word bigram',
+    'c': 'Character 4-gram',
+    'p': 'POS tag',
+    'P': 'POS tag bigram',
+    'T': 'POS tag trigram'
+}
+# Token kinds and n-gram sizes of the feature types other than character n-grams.
+NGRAM_TYPES = {
+    'w': ('words', 1),
+    'W': ('words', 2),
+    'p': ('postags', 1),
+    'P': ('postags', 2),
+    'T': ('postags', 3)
+}
+# Values of the vectors: presence, n-gram counts, counts relative to the
+# counts of the feature type in the chunk, or relative counts times the IDF.
+WEIGHTINGS = ('binary', 'count', 'freq', 'tfidf')
+# Names of the feature types in metadata and vocabulary files, e.g. output_biword.txt.
+FEATURE_FILES = {
+    'w': 'word',
+    'W': 'biword',
+    'c': 'char',
+    'p': 'pos',
+    'P': 'bipos',
+    'T': 'tripos'
+}
+
+
+def make_ngrams(tokens, size):
+    """
+    Generates space separated n-grams out of a list of tokens.
+    :param tokens: A list of tokens.
+    :param size: A constant number of n to make n-gram.
+    :return: A list of n-gram strings.
+    """
+    if size == 1:
+        return list(tokens)
+    return [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def intern(sequences):
+    """
+    Maps the tokens of many sequences to integer ids shared by all of them.
+    :param sequences: A list of lists of tokens.
+    :return: A tuple (list of distinct tokens in id order, list of int64 NumPy id arrays).
+    """
+    index = {}
+    ids = [numpy.fromiter((index.setdefault(token, len(index)) for token in tokens),
+                          dtype=numpy.int64, count=len(tokens))
+           for tokens in sequences]
+    return list(index), ids
+
+
+def ngram_codes(ids, size, base):
+    """
+    Encodes the n-grams of a token id array as integers, reading the ids of
+    an n-gram as the digits of a number in the given base.
+    :param ids: An integer NumPy array of token ids.
+    :param size: A constant number of n to make n-gram.
+    :param base: A number greater than every id. base ** size must fit in int64.
+    :return: An int64 NumPy array of n-gram codes.
+    """
+    count = max(0, len(ids) - size + 1)
+    codes = numpy.array(ids[:count], dtype=numpy.int64)
+    for k in range(1, size):
+        codes *= base
+        codes += ids[k:k + count]
+    return codes
+
+
+def decode_ngram(code, size, base, tokens):
+    """
+    Decodes an n-gram code made by ngram_codes() into a space separated n-gram.
+    :param code: An n-gram code.
+    :param size: A constant number of n of the n-gram.
+    :param base: The base used to encode the n-gram.
+    :param tokens: A sequence of tokens in id order.
+    :return: An n-gram string.
+    """
+    parts = []
+    for _ in range(size):
+        code, digit = divmod(code, base)
+        parts.append(tokens[digit])
+    return ' '.join(reversed(parts))
+
+
+def fits_codes(size, base):
+    """
+    :param size: A constant number of n of the n-grams.
+    :param base: The number of distinct tokens.
+    :return: True if n-grams of the given size over the given base fit in int64 codes.
+    """
+    return base ** size < 2 ** 63
+
+
+def count_ngrams(tokens, size):
+    """
+    Counts the n-grams of a list of tokens. The n-grams are counted as
+    integer codes, so only distinct n-grams are joined into strings.
+    :param tokens: A list of tokens.
+    :param size: A constant number of n to make n-gram.
+    :return: A dictionary of an n-gram string to its count.
+    """
+    table, (ids,) = intern([tokens])
+    base = max(1, len(table))
+    if size == 1 or not fits_codes(size, base):
+        return collections.Counter(make_ngrams(tokens, size))
+    codes, counts = numpy.unique(ngram_codes(ids, size, base), return_counts=True)
+    return {decode_ngram(code, size, base, table): count
+            for code, count in zip(codes.tolist(), counts.tolist())}
+
+
+def extract_terms(feature_type, text, words, postags):
+    """
+    Extracts the terms of a feature type out of a chunk.
+    :param feature_type: A feature type initial in FEATURE_TYPES.
+    :param text: A text string of the chunk.
+    :param words: A list of words of the chunk.
+    :param postags: A list of POS tags of the chunk.
+    :return: A list of terms, which may contain duplicates.
+    """
+    if feature_type == 'w':
+        return list(words)
+    if feature_type == 'W':
+        return make_ngrams(words, 2)
+    if feature_type == 'c':
+        return [text[i:i + 4] for i in range(len(text) - 3)]
+    if feature_type == 'p':
+        return list(postags)
+    if feature_type == 'P':
+        return make_ngrams(postags, 2)
+    if feature_type == 'T':
+        return make_ngrams(postags, 3)
+    raise Exception(str.format('Unknown feature type {}.', feature_type))
+
+
+def stack_rows(columns, num_rows, num_columns):
+    """
+    Builds a CSR matrix out of the columns and values of every chunk of every feature type.
+    :param columns: A list per feature type of a list per chunk of tuples (sorted
+    NumPy array of distinct columns, NumPy array of their values).
+    :param num_rows: The number of chunks.
+    :param num_columns: The number of columns of the matrix. Column indices are
+    stored as int64 if they do not fit into int32, e.g. for many hashed columns.
+    :return: A scipy.sparse.csr_matrix with a row per chunk.
+    """
+    index_dtype = numpy.int32 if num_columns - 1 <= numpy.iinfo(numpy.int32).max else numpy.int64
+    indptr = numpy.zeros(num_rows + 1, dtype=numpy.int64)
+    indices = []
+    data = []
+    for i in range(num_rows):
+        for type_columns in columns:
+            indices.append(type_columns[i][0])
+            data.append(type_columns[i][1])
+        indptr[i + 1] = indptr[i] + sum(len(type_columns[i][0]) for type_columns in columns)
+    if len(indices) > 0:
+        indices = numpy.concatenate(indices).astype(index_dtype)
+        data = numpy.concatenate(data).astype(numpy.float64)
+    else:
+        indices = numpy.zeros(0, dtype=index_dtype)
+        data = numpy.zeros(0, dtype=numpy.float64)
+    return sparse.csr_matrix((data, indices, indptr), shape=(num_rows, num_columns))
+
+
+class SparseVectorizer:
+    """
+    This class turns chunks into a sparse binary or count matrix. Every reference
+    feature gets a column once, and each chunk only looks up the n-grams it
+    actually contains, so the cost is proportional to the chunk length rather
+    than to the size of the feature metadata.
+    """
+
+    def __init__(self, vocabulary, features, counts=False):
+        """
+        Looks up the feature name to column index of each selected feature type.
+        :param vocabulary: A Vocabulary of reference terms.
+        :param features: A string of feature type initials. Columns are laid out
+        in the order of FEATURE_TYPES regardless of the order of the initials.
+        :param counts: Counts the n-grams of each chunk instead of marking their presence.
+        """
+        assert isinstance(features, str)
+        self.vocabulary = vocabulary
+        self.counts = counts
+        self.features = ''.join(f for f in FEATURE_TYPES if f in features)
+        self.index = {}
+        self.offsets = {}
+        self.widths = {}
+        num_columns = 0
+        for feature_type in self.features:
+            if feature_type not in vocabulary:
+                raise Exception(str.format('No feature metadata for {}.', FEATURE_NAMES[feature_type]))
+            self.index[feature_type] = vocabulary.index(feature_type)
+            self.offsets[feature_type] = num_columns
+            self.widths[feature_type] = len(self.index[feature_type])
+            num_columns += self.widths[feature_type]
+        self.num_columns = num_columns
+
+    def transform(self, texts, words, postags):
+        """
+        Generates a binary, or count, CSR matrix out of chunks.
+        :param texts: A list of chunk text strings.
+        :param words: A list of lists of words, one per chunk.
+        :param postags: A list of lists of POS tags, one per chunk.
+        :return: A scipy.sparse.csr_matrix with a row per chunk.
+        """
+        assert len(texts) == len(words) == len(postags)
+        word_table, word_ids = intern(words)
+        postag_table, postag_ids = intern(postags)
+        return self.transform_ids(texts, word_ids, postag_ids, word_table, postag_table)
+
+    def transform_ids(self, texts, word_ids, postag_ids, word_table, postag_table):
+        """
+        Generates a binary, or count, CSR matrix out of chunks whose tokens are interned.
+        N-grams are looked up as integer codes, so each distinct n-gram is joined
+        into a string only once for all the chunks.
+        :param texts: A list of chunk text strings. Only used for character n-grams.
+        :param word_ids: A list of integer NumPy arrays of word ids, one per chunk.
+        :param postag_ids: A list of integer NumPy arrays of POS tag ids, one per chunk.
+        :param word_table: A sequence of words in id order.
+        :param postag_table: A sequence of POS tags in id order.
+        :return: A scipy.sparse.csr_matrix with a row per chunk.
+        """
+        assert len(word_ids) == len(postag_ids)
+        num_rows = len(word_ids)
+        tokens = {'words': (word_ids, word_table), 'postags': (postag_ids, postag_table)}
+
+        # Tuples (column array, count array) per feature type per chunk.
+        columns = []
+        for feature_type in self.features:
+            index = self.index[feature_type]
+            offset = self.offsets[feature_type]
+            if feature_type == 'c':
+                type_columns = [self._lookup(index, extract_terms('c', text, [], [])) for text in texts]
+            else:
+                kind, size = NGRAM_TYPES[feature_type]
+                ids, table = tokens[kind]
+                type_columns = self._lookup_ids(index, ids, table, size)
+            columns.append([(c + offset, n if self.counts else numpy.ones(len(c))) for c, n in type_columns])
+        return stack_rows(columns, num_rows, self.num_columns)
+
+    @staticmethod
+    def _lookup(index, terms):
+        """
+        :param index: A TermIndex of the terms of a feature type.
+        :param terms: An iterable of terms.
+        :return: A tuple (sorted int64 NumPy array of the distinct columns of the
+        known terms, int64 NumPy array of the number of times each column occurs).
+        """
+        counts = collections.Counter(terms)
+        columns = index.get_many(list(counts))
+        known = columns >= 0
+        order = numpy.argsort(columns[known])
+        type_counts = numpy.fromiter(counts.values(), dtype=numpy.int64, count=len(counts))
+        return columns[known][order], type_counts[known][order]
+
+    @staticmethod
+    def _lookup_ids(index, ids, table, size):
+        """
+        Looks up the n-grams of many chunks of interned tokens.
+        :param index: A TermIndex of the terms of a feature type.
+        :param ids: A list of integer NumPy arrays of token ids, one per chunk.
+        :param table: A sequence of tokens in id order.
+        :param size: A constant number of n to make n-gram.
+        :return: A list of tuples (sorted int64 NumPy array of distinct columns,
+        int64 NumPy array of their counts), one per chunk.
+        """
+        base = max(1, len(table))
+        if not fits_codes(size, base):
+            return [SparseVectorizer._lookup(index, make_ngrams([table[k] for k in chunk_ids], size))
+                    for chunk_ids in ids]
+
+        codes = [ngram_codes(chunk_ids, size, base) for chunk_ids in ids]
+        if sum(len(c) for c in codes) == 0:
+            return [(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)) for _ in codes]
+        unique_codes, inverse = numpy.unique(numpy.concatenate(codes), return_inverse=True)
+        unique_columns = index.get_many([decode_ngram(code, size, base, table) for code in unique_codes.tolist()])
+        columns = []
+        start = 0
+        for chunk_codes in codes:
+            chunk_columns = unique_columns[inverse[start:start + len(chunk_codes)]]
+            columns.append(numpy.unique(chunk_columns[chunk_columns >= 0], return_counts=True))
+            start += len(chunk_codes)
+        return columns
+
+
+def hash_terms(terms, num_features):
+    """
+    Hashes terms into columns with CRC-32. The highest bit of the hash gives
+    the sign of a term, so the terms colliding in a column cancel out rather
+    than add up on average.
+    :param terms: A list of terms.
+    :param num_features: The number of columns, at most 2 ** 31.
+    :return: A tuple (int64 NumPy array of columns, float64 NumPy array of signs).
+    """
+    hashes = numpy.fromiter((zlib.crc32(term.encode()) for term in terms), dtype=numpy.int64, count=len(terms))
+    return hashes % num_features, numpy.where(hashes >> 31, -1.0, 1.0)
+
+
+class HashingVectorizer:
+    """
+    This class turns chunks into a sparse matrix like SparseVectorizer, but the
+    n-grams of every feature type are hashed into a fixed number of columns, so
+    no vocabulary or feature metadata is needed and memory does not grow with
+    the number of distinct n-grams.
+    """
+
+    def __init__(self, features, num_features=2 ** 18, counts=False):
+        """
+        :param features: A string of feature type initials. Columns are laid out
+        in the order of FEATURE_TYPES regardless of the order of the initials.
+        :param num_features: The number of columns of every feature type.
+        :param counts: Sums the signed counts of the n-grams of each column instead
+        of their signed presence.
+        """
+        assert isinstance(features, str)
+        assert isinstance(num_features, int) and 0 < num_features <= 2 ** 31
+        self.features = ''.join(f for f in FEATURE_TYPES if f in features)
+        self.num_features = num_features
+        self.counts = counts
+        self.offsets = {f: i * num_features for i, f in enumerate(self.features)}
+        self.widths = {f: num_features for f in self.features}
+        self.num_columns = len(self.features) * num_features
+
+    def transform(self, texts, words, postags):
+        """
+        Generates a signed CSR matrix out of chunks.
+        :param texts: A list of chunk text strings.
+        :param words: A list of lists of words, one per chunk.
+        :param postags: A list of lists of POS tags, one per chunk.
+        :return: A scipy.sparse.csr_matrix with a row per chunk.
+        """
+        assert len(texts) == len(words) == len(postags)
+        word_table, word_ids = intern(words)
+        postag_table, postag_ids = intern(postags)
+        return self.transform_ids(texts, word_ids, postag_ids, word_table, postag_table)
+
+    def transform_ids(self, texts, word_ids, postag_ids, word_table, postag_table):
+        """
+        Generates a signed CSR matrix out of chunks whose tokens are interned.
+        Each distinct n-gram is joined into a string and hashed only once for all the chunks.
+        The parameters are the same as those of SparseVectorizer.transform_ids().
+        :return: A scipy.sparse.csr_matrix with a row per chunk.
+        """
+        assert len(word_ids) == len(postag_ids)
+        num_rows = len(word_ids)
+        tokens = {'words': (word_ids, word_table), 'postags': (postag_ids, postag_table)}
+
+        columns = []
+        for feature_type in self.features:
+            offset = self.offsets[feature_type]
+            if feature_type == 'c':
+                type_columns = []
+                for text in texts:
+                    terms = collections.Counter(extract_terms('c', text, [], []))
+                    term_columns, signs = hash_terms(list(terms), self.num_features)
+                    type_columns.append(self._sum(term_columns, signs, numpy.array(list(terms.values()))))
+            else:
+                kind, size = NGRAM_TYPES[feature_type]
+                ids, table = tokens[kind]
+                type_columns = self._hash_ids(ids, table, size)
+            columns.append([(c + offset, v) for c, v in type_columns])
+        return stack_rows(columns, num_rows, self.num_columns)
+
+    def _hash_ids(self, ids, table, size):
+        """
+        Hashes the n-grams of many chunks of interned tokens.
+        :param ids: A list of integer NumPy arrays of token ids, one per chunk.
+        :param table: A sequence of tokens in id order.
+        :param size: A constant number of n to make n-gram.
+        :return: A list of tuples (sorted int64 NumPy array of distinct columns,
+        float64 NumPy array of their values), one per chunk.
+        """
+        base = max(1, len(table))
+        if not fits_codes(size, base):
+            columns = []
+            for chunk_ids in ids:
+                terms = collections.Counter(make_ngrams([table[k] for k in chunk_ids], size))
+                term_columns, signs = hash_terms(list(terms), self.num_features)
+                columns.append(self._sum(term_columns, signs, numpy.array(list(terms.values()))))
+            return columns
+
+        codes = [ngram_codes(chunk_ids, size, base) for chunk_ids in ids]
+        if sum(len(c) for c in codes) == 0:
+            return [(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)) for _ in codes]
+        unique_codes, inverse = numpy.unique(numpy.concatenate(codes), return_inverse=True)
+        unique_columns, unique_signs = hash_terms([decode_ngram(code, size, base, table)
+                                                   for code in unique_codes.tolist()], self.num_features)
+        columns = []
+        start = 0
+        for chunk_codes in codes:
+            chunk_terms, counts = numpy.unique(inverse[start:start + len(chunk_codes)], return_counts=True)
+            columns.append(self._sum(unique_columns[chunk_terms], unique_signs[chunk_terms], counts))
+            start += len(chunk_codes)
+        return columns
+
+    def _sum(self, columns, signs, counts):
+        """
+        Sums the signed values of distinct terms hashed into the same column.
+        Without counts, the value of a column is the sign of the sum of the signed
+        presences of its terms, so binary vectors hold -1 and 1 only, as
+        Feature.aggregate() in exp_cluster.py leaves them.
+        :param columns: An int64 NumPy array of the column of every distinct term.
+        :param signs: A NumPy array of the sign of every distinct term.
+        :param counts: A NumPy array of the count of every distinct term.
+        :return: A tuple (sorted int64 NumPy array of distinct columns, float64
+        NumPy array of their non-zero values).
+        """
+        values = signs * counts if self.counts else signs
+        unique_columns, inverse = numpy.unique(columns, return_inverse=True)
+        sums = numpy.bincount(inverse.ravel(), weights=values, minlength=len(unique_columns))
+        if not self.counts:
+            sums = numpy.sign(sums)
+        nonzero = sums != 0
+        return unique_columns[nonzero], sums[nonzero]
+
+
+def inverse_frequencies(counts):
+    """
+    Computes smoothed inverse frequencies of terms out of their counts in the
+    reference corpus, log((1 + total count) / (1 + count)) + 1. The corpus
+    counts of the feature metadata stand in for document frequencies, so
+    frequent terms such as punctuation are weighted down.
+    :param counts: A NumPy array of the corpus count of every term.
+    :return: A float64 NumPy array of the inverse frequency of every term.
+    """
+    counts = numpy.asarray(counts, dtype=numpy.float64)
+    return numpy.log((1 + counts.sum()) / (1 + counts)) + 1
+
+
+def weight(matrix, weighting, idf=None):
+    """
+    Weights a count matrix of a single feature type. Only the stored values
+    are changed, so the matrix is never densified. Signed counts of hashed
+    features keep their signs and are made relative to their absolute sum.
+    :param matrix: A scipy.sparse matrix of n-gram counts with a row per chunk.
+    :param weighting: One of WEIGHTINGS.
+    :param idf: A NumPy array of the inverse frequency of every column, required by tfidf.
+    :return: A weighted scipy.sparse.csr_matrix.
+    """
+    if weighting not in WEIGHTINGS:
+        raise Exception(str.format('Unknown weighting {}.', weighting))
+    matrix = sparse.csr_matrix(matrix, dtype=numpy.float64, copy=True)
+    if weighting == 'binary':
+        matrix.data = numpy.sign(matrix.data)
+    elif weighting in ('freq', 'tfidf'):
+        totals = numpy.asarray(abs(matrix).sum(axis=1)).ravel()
+        totals[totals == 0] = 1
+        matrix.data /= numpy.repeat(totals, numpy.diff(matrix.indptr))
+        if weighting == 'tfidf':
+            if idf is None:
+                raise Exception('TF-IDF weighting needs the corpus counts of the terms.')
+            matrix.data *= idf[matrix.indices]
+    return matrix
+
+
+def compact_columns(matrix):
+    """
+    Drops the columns of a sparse matrix that hold no stored values, so that
+    computations with an array per column, e.g. column_variances() or a sparse
+    product, only cover the columns present however many columns are hashed.
+    :param matrix: A scipy.sparse matrix.
+    :return: A tuple (sorted int64 NumPy array of the index of every kept column,
+    scipy.sparse.csr_matrix of the kept columns in the same order).
+    """
+    matrix = sparse.csr_matrix(matrix)
+    columns, inverse = numpy.unique(matrix.indices, return_inverse=True)
+    compact = sparse.csr_matrix((matrix.data, inverse.ravel(), matrix.indptr), shape=(matrix.shape[0], len(columns)))
+    return columns.astype(numpy.int64), compact
+
+
+def column_variances(matrix):
+    """
+    Computes the variance of every column of a sparse matrix from its stored
+    values, without densifying it. The implicit zeros of a column contribute
+    (number of zeros) * mean^2, so only the stored deviations are summed.
+    For binary features this is p(1 - p), where p is the column frequency.
+    :param matrix: A scipy.sparse matrix.
+    :return: A float64 NumPy array of the column variances.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    num_rows, num_columns = matrix.shape
+    data = matrix.data.astype(numpy.float64)
+    means = numpy.bincount(matrix.indices, weights=data, minlength=num_columns) / num_rows
+    deviations = data - means[matrix.indices]
+    squares = numpy.bincount(matrix.indices, weights=deviations * deviations, minlength=num_columns)
+    num_zeros = num_rows - numpy.bincount(matrix.indices, minlength=num_columns)
+    return (squares + num_zeros * means * means) / num_rows
+
+
+def select_columns(matrix, mask):
+    """
+    Keeps the columns of a sparse matrix selected by a mask.
+    :param matrix: A scipy.sparse matrix.
+    :param mask: A boolean NumPy array with an element per column.
+    :return: A scipy.sparse.csr_matrix of the selected columns.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    num_rows = matrix.shape[0]
+    keep = mask[matrix.indices]
+    new_columns = numpy.cumsum(mask) - 1
+    rows = numpy.repeat(numpy.arange(num_rows), numpy.diff(matrix.indptr))
+    indptr = numpy.zeros(num_rows + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows[keep], minlength=num_rows), out=indptr[1:])
+    return sparse.csr_matrix((matrix.data[keep], new_columns[matrix.indices[keep]], indptr),
+                             shape=(num_rows, int(numpy.count_nonzero(mask))))
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+
+import numpy
+
+from .vectorizer import FEATURE_FILES, FEATURE_TYPES
+
+
+class StringTable:
+    """
+    This class is an immutable sequence of strings stored as a single UTF-8
+    blob and an array of offsets into it. Both can be memory-mapped, so a
+    table of hundreds of thousands of terms opens without parsing anything.
+    """
+
+    def __init__(self, blob, offsets):
+        """
+        :param blob: A uint8 NumPy array of the concatenated UTF-8 strings.
+        :param offsets: An int64 NumPy array of len(table) + 1 offsets into the blob.
+        """
+        assert len(offsets) > 0
+        self.blob = blob
+        self.offsets = offsets
+
+    @staticmethod
+    def from_strings(strings):
+        """
+        Builds a table out of strings.
+        :param strings: An iterable of strings.
+        :return: A StringTable.
+        """
+        encoded = [s.encode() for s in strings]
+        offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+        return StringTable(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[k] for k in range(start, stop, step)]
+            if start >= stop:
+                return []
+            data = self.blob[self.offsets[start]:self.offsets[stop]].tobytes()
+            offsets = (self.offsets[start:stop + 1] - self.offsets[start]).tolist()
+            return [data[offsets[k]:offsets[k + 1]].decode() for k in range(stop - start)]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('String table index out of range.')
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode()
+
+    def __iter__(self):
+        data = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        for i in range(len(offsets) - 1):
+            yield data[offsets[i]:offsets[i + 1]].decode()
+
+    def save(self, path_prefix):
+        """
+        Saves the table to <path_prefix>.blob and <path_prefix>.offsets.npy.
+        :param path_prefix: A path prefix of the output files.
+        :return: None.
+        """
+        assert isinstance(path_prefix, str)
+        with open(path_prefix + '.blob', 'wb') as file:
+            file.write(self.blob.tobytes())
+        numpy.save(path_prefix + '.offsets.npy', self.offsets)
+
+    @staticmethod
+    def load(path_prefix, mmap=True):
+        """
+        Loads a table saved by save().
+        :param path_prefix: A path prefix of the table files.
+        :param mmap: Memory-maps the files instead of reading them.
+        :return: A StringTable.
+        """
+        assert isinstance(path_prefix, str)
+        offsets = numpy.load(path_prefix + '.offsets.npy', mmap_mode='r' if mmap else None)
+        if offsets[-1] == 0:
+            blob = numpy.zeros(0, dtype=numpy.uint8)
+        elif mmap:
+            blob = numpy.memmap(path_prefix + '.blob', dtype=numpy.uint8, mode='r')
+        else:
+            blob = numpy.fromfile(path_prefix + '.blob', dtype=numpy.uint8)
+        return StringTable(blob, offsets)
+
+
+class TermIndex:
+    """
+    This class maps the terms of a sorted StringTable to their positions by
+    binary search, so opening a table of hundreds of thousands of terms does not
+    build a dictionary of all of them. The first bytes of every term are kept as
+    fixed-width keys for numpy.searchsorted, and only terms sharing those bytes
+    are told apart by comparing their full UTF-8 encodings, whose byte order is
+    the order of the sorted strings.
+    """
+
+    # Bytes of every term kept as a search key.
+    KEY_BYTES = 16
+
+    def __init__(self, table):
+        """
+        :param table: A StringTable of sorted unique strings.
+        """
+        assert isinstance(table, StringTable)
+        self.table = table
+        offsets = numpy.asarray(table.offsets)
+        starts = offsets[:-1]
+        lengths = numpy.diff(offsets)
+        keys = numpy.zeros((len(table), self.KEY_BYTES), dtype=numpy.uint8)
+        for k in range(self.KEY_BYTES):
+            mask = lengths > k
+            keys[mask, k] = table.blob[starts[mask] + k]
+        self.keys = keys.view(str.format('S{}', self.KEY_BYTES)).ravel()
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __getitem__(self, term):
+        i = self.get(term)
+        if i is None:
+            raise KeyError(term)
+        return i
+
+    def get(self, term, default=None):
+        """
+        :param term: A string.
+        :param default: The value returned if the term is not in the table.
+        :return: The position of the term in the table, or the default.
+        """
+        i = int(self.get_many([term])[0])
+        return default if i < 0 else i
+
+    def get_many(self, terms):
+        """
+        Looks up many terms with one numpy.searchsorted call.
+        :param terms: A list of strings.
+        :return: An int64 NumPy array of the position of every term in the table, or -1.
+        """
+        encoded = [term.encode() for term in terms]
+        queries = numpy.array([e[:self.KEY_BYTES] for e in encoded], dtype=self.keys.dtype)
+        lows = numpy.searchsorted(self.keys, queries, side='left')
+        highs = numpy.searchsorted(self.keys, queries, side='right')
+        positions = numpy.full(len(terms), -1, dtype=numpy.int64)
+        blob = self.table.blob
+        offsets = self.table.offsets
+        for i in numpy.flatnonzero(highs > lows).tolist():
+            term = encoded[i]
+            low, high = int(lows[i]), int(highs[i])
+            # Terms sharing the key bytes are sorted by their remaining bytes.
+            while low < high:
+                middle = (low + high) // 2
+                if blob[offsets[middle]:offsets[middle + 1]].tobytes() < term:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < highs[i] and blob[offsets[low]:offsets[low + 1]].tobytes() == term:
+                positions[i] = low
+        return positions
+
+
+class InternedStrings:
+    """
+    This class is an immutable sequence of strings stored as an int32 array
+    of ids into a table of the distinct strings, for sequences such as tokens
+    or POS tags that repeat a small set of strings many times.
+    """
+
+    def __init__(self, table, ids):
+        """
+        :param table: A StringTable, or a list, of the distinct strings.
+        :param ids: An int32 NumPy array, or array('i'), of ids into the table.
+        """
+        self.table = table
+        self.ids = ids
+
+    @staticmethod
+    def from_strings(strings):
+        """
+        Interns strings.
+        :param strings: An iterable of strings.
+        :return: An InternedStrings.
+        """
+        index = {}
+        ids = numpy.fromiter((index.setdefault(s, len(index)) for s in strings), dtype=numpy.int32)
+        return InternedStrings(StringTable.from_strings(index), ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            table = self.table
+            return [table[int(k)] for k in self.ids[i]]
+        return self.table[int(self.ids[i])]
+
+    def __iter__(self):
+        strings = list(self.table)
+        for k in self.ids.tolist():
+            yield strings[k]
+
+    def save(self, path_prefix):
+        """
+        Saves the strings to <path_prefix>.terms.* and <path_prefix>.ids.npy.
+        :param path_prefix: A path prefix of the output files.
+        :return: None.
+        """
+        assert isinstance(path_prefix, str)
+        table = self.table
+        if not isinstance(table, StringTable):
+            table = StringTable.from_strings(table)
+        table.save(path_prefix + '.terms')
+        numpy.save(path_prefix + '.ids.npy', numpy.asarray(self.ids, dtype=numpy.int32))
+
+    @staticmethod
+    def load(path_prefix, mmap=True):
+        """
+        Loads strings saved by save().
+        :param path_prefix: A path prefix of the files.
+        :param mmap: Memory-maps the files instead of reading them.
+        :return: An InternedStrings.
+        """
+        assert isinstance(path_prefix, str)
+        table = StringTable.load(path_prefix + '.terms', mmap)
+        ids = numpy.load(path_prefix + '.ids.npy', mmap_mode='r' if mmap else None)
+        return InternedStrings(table, ids)
+
+
+class Vocabulary:
+    """
+    This class assigns every reference term of every feature type a stable
+    column id. Terms are sorted, so the column order does not depend on hash
+    randomization and vectors produced in any process or run are comparable.
+    """
+
+    def __init__(self, tables, counts=None):
+        """
+        :param tables: A dictionary of a feature type initial to a StringTable
+        of sorted unique terms.
+        :param counts: A dictionary of a feature type initial to a NumPy array of
+        the corpus count of every term, in column order, or None. Feature types
+        may be missing, e.g. for metadata without counts.
+        """
+        assert isinstance(tables, dict)
+        assert isinstance(counts, dict) or counts is None
+        self.tables = tables
+        self.counts = counts if counts is not None else {}
+        self._indices = {}
+
+    @staticmethod
+    def from_terms(terms, counts=None):
+        """
+        Builds a vocabulary out of reference terms.
+        :param terms: A dictionary of a feature type initial to an iterable of terms.
+        :param counts: A dictionary of a feature type initial to a dictionary of
+        a term to its corpus count, or None.
+        :return: A Vocabulary.
+        """
+        assert isinstance(terms, dict)
+        counts = counts if counts is not None else {}
+        tables = {}
+        count_arrays = {}
+        for feature_type, type_terms in terms.items():
+            assert feature_type in FEATURE_TYPES
+            type_terms = sorted(set(type_terms))
+            tables[feature_type] = StringTable.from_strings(type_terms)
+            if feature_type in counts:
+                type_counts = counts[feature_type]
+                count_arrays[feature_type] = numpy.fromiter((type_counts.get(t, 0) for t in type_terms),
+                                                            dtype=numpy.int64, count=len(type_terms))
+        return Vocabulary(tables, count_arrays)
+
+    def __contains__(self, feature_type):
+        return feature_type in self.tables
+
+    def terms(self, feature_type):
+        """
+        :param feature_type: A feature type initial.
+        :return: A StringTable of the terms of the feature type, in column order.
+        """
+        return self.tables[feature_type]
+
+    def index(self, feature_type):
+        """
+        Returns the term to column id mapping of a feature type,
+        building it on first use.
+        :param feature_type: A feature type initial.
+        :return: A TermIndex of the terms of the feature type.
+        """
+        index = self._indices.get(feature_type)
+        if index is None:
+            index = TermIndex(self.tables[feature_type])
+            self._indices[feature_type] = index
+        return index
+
+    def digest(self, feature_types=FEATURE_TYPES):
+        """
+        :param feature_types: A string of the feature type initials to digest,
+        all of them by default.
+        :return: A hex digest string identifying the terms and their order.
+        """
+        digest = hashlib.sha1()
+        for feature_type in FEATURE_TYPES:
+            if feature_type not in feature_types:
+                continue
+            table = self.tables.get(feature_type)
+            if table is None:
+                continue
+            digest.update(feature_type.encode())
+            digest.update(numpy.ascontiguousarray(table.offsets).tobytes())
+            digest.update(numpy.ascontiguousarray(table.blob).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        """
+        Saves the vocabulary to a directory, one string table per feature type.
+        :param path: A path to the output directory.
+        :return: None.
+        """
+        assert isinstance(path, str)
+        os.makedirs(path, exist_ok=True)
+        for feature_type, table in self.tables.items():
+            table.save(os.path.join(path, FEATURE_FILES[feature_type]))
+        for feature_type, counts in self.counts.items():
+            numpy.save(os.path.join(path, FEATURE_FILES[feature_type] + '.counts.npy'), numpy.asarray(counts))
+        with open(os.path.join(path, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+            json.dump({'feature_types': ''.join(t for t in FEATURE_TYPES if t in self.tables),
+                       'counts': ''.join(t for t in FEATURE_TYPES if t in self.counts)}, file)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Loads a vocabulary saved by save().
+        :param path: A path to the vocabulary directory.
+        :param mmap: Memory-maps the string tables instead of reading them.
+        :return: A Vocabulary.
+        """
+        assert isinstance(path, str)
+        with open(os.path.join(path, 'vocabulary.json'), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        tables = {}
+        for feature_type in manifest['feature_types']:
+            tables[feature_type] = StringTable.load(os.path.join(path, FEATURE_FILES[feature_type]), mmap)
+        counts = {}
+        for feature_type in manifest.get('counts', ''):
+            counts[feature_type] = numpy.load(os.path.join(path, FEATURE_FILES[feature_type] + '.counts.npy'),
+                                              mmap_mode='r' if mmap else None)
+        return Vocabulary(tables, counts)
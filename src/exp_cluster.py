@@ -1,17 +1,29 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import json
 import logging
+import os
 from collections import Counter
 from multiprocessing.pool import Pool
 
 import numpy
-from sklearn.cluster import SpectralClustering
-from sklearn.feature_selection import VarianceThreshold
+from scipy import sparse
 from sklearn.metrics import silhouette_score
-from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.neighbors import kneighbors_graph
 
+import authorclustering.evaluation
+import authorclustering.feature
+from authorclustering.affinity import cosine_similarity, knn_graph
+from authorclustering.blocks import BlockCache, hstack_blocks
+from authorclustering.cache import AnnotationCache
 from authorclustering.corenlp import StanfordCoreNLP
+from authorclustering.feature import BINARY_SUFFIX
 from authorclustering.multi_author_text import Text
+from authorclustering.spectral import SpectralEmbedding
+from authorclustering.vectorizer import FEATURE_NAMES, FEATURE_TYPES, WEIGHTINGS, HashingVectorizer, \
+    SparseVectorizer, column_variances, compact_columns, inverse_frequencies, select_columns, weight
+from authorclustering.vocabulary import Vocabulary
 
 
 class Corpus:
@@ -19,9 +31,18 @@ class Corpus:
     This class reads a corpus and splits it into sentences and paragraphs.
     """
 
-    def __init__(self):
+    def __init__(self, cache=None, max_in_flight=None):
+        """
+        :param cache: An AnnotationCache shared by the sentence splitting workers, or None.
+        :param max_in_flight: The maximum number of concurrent requests sent by an
+        asynchronous client, or None to split sentences in a pool of worker processes.
+        """
+        assert isinstance(cache, AnnotationCache) or cache is None
+        assert isinstance(max_in_flight, int) or max_in_flight is None
         self.paragraphs = []
         self.sentences = []
+        self.cache = cache
+        self.max_in_flight = max_in_flight
 
     def add_file(self, file_path):
         """
@@ -34,22 +55,47 @@ class Corpus:
             for line in file:
                 self.paragraphs.append(line)
 
-        with Pool() as pool:
-            results = pool.map(Corpus._split_sentences, self.paragraphs)
-            for sentences in results:
+        if self.max_in_flight is not None:
+            results = [asyncio.run(Corpus._async_split_sentences(self.paragraphs, self.cache,
+                                                                 self.max_in_flight))]
+        else:
+            with Pool() as pool:
+                args = []
+                for batch in StanfordCoreNLP.pack(self.paragraphs):
+                    args.append(([self.paragraphs[i] for i in batch], self.cache))
+                results = pool.starmap(Corpus._split_sentences, args)
+
+        for batch_sentences in results:
+            for sentences in batch_sentences:
                 assert isinstance(sentences, list)
                 self.sentences.extend(sentences)
 
     @staticmethod
-    def _split_sentences(text):
+    def _split_sentences(texts, cache=None):
+        """
+        Splits texts into separate sentences.
+        :param texts: A list of text strings that fit into a single request.
+        :param cache: An AnnotationCache to look up annotations in, or None.
+        :return: A list of lists of strings, one per text.
+        """
+        assert isinstance(texts, list)
+        nlp = StanfordCoreNLP('http://localhost:8011', cache=cache)
+        return nlp.split_sentences_many(texts)
+
+    @staticmethod
+    async def _async_split_sentences(texts, cache, max_in_flight):
         """
-        Splits a text into separate sentences.
-        :param text: A text string.
-        :return: A list of strings.
+        Splits texts into separate sentences with concurrent requests from this process.
+        :param texts: A list of text strings.
+        :param cache: An AnnotationCache to look up annotations in, or None.
+        :param max_in_flight: The maximum number of concurrent requests.
+        :return: A list of lists of strings, one per text.
         """
-        assert isinstance(text, str)
-        nlp = StanfordCoreNLP('http://localhost:8011')
-        return nlp.split_sentences(text)
+        from authorclustering.async_corenlp import AsyncStanfordCoreNLP
+
+        async with AsyncStanfordCoreNLP('http://localhost:8011', cache=cache,
+                                        max_in_flight=max_in_flight) as nlp:
+            return await nlp.split_sentences_many(texts)
 
 
 class Chunk:
@@ -60,25 +106,30 @@ class Chunk:
     def __init__(self):
         self.sentences = []
 
-    def append_sentences(self, author, sentences):
+    def append_sentences(self, author, sentences, ids=None):
         """
         Attaches sentences to the chunk with the given author information.
         :param author: A string that represents an author name.
         :param sentences: A list of sentence strings written by the author.
+        :param ids: A list of the sentence indices in the text, or None.
         :return: None.
         """
         assert isinstance(author, str)
         assert isinstance(sentences, list)
-        for sentence in sentences:
-            self.sentences.append({'author': author, 'text': sentence})
+        assert isinstance(ids, list) or ids is None
+        if ids is None:
+            ids = [None] * len(sentences)
+        for sentence, id in zip(sentences, ids):
+            self.sentences.append({'author': author, 'text': sentence, 'id': id})
 
     def generate(self, size):
         """
         Generates a chunk list with the given size.
         :param size: A chunk size integer. You can specify how many sentences
         are in each chunk.
-        :return: A list of dictionaries that contain author names and the
-        corresponding chunks. {'author': list(authors), 'text': texts}.
+        :return: A list of dictionaries that contain author names, the
+        corresponding chunks and the sentence indices of the chunks if known.
+        {'author': list(authors), 'text': texts, 'ids': list(ids)}.
         """
         assert isinstance(size, int)
         if size <= 0:
@@ -86,6 +137,7 @@ class Chunk:
 
         chunks = []
         authors = []
+        ids = []
         texts = ''
 
         for i, sentence in enumerate(self.sentences, start=1):
@@ -93,17 +145,21 @@ class Chunk:
             if size == 1:
                 texts = sentence['text']
                 authors.append(sentence['author'])
-                chunks.append({'author': list(authors), 'text': texts})
+                ids.append(sentence['id'])
+                chunks.append({'author': list(authors), 'text': texts, 'ids': list(ids)})
                 authors.clear()
+                ids.clear()
             elif i % size == 0 and size != 1:
-                chunks.append({'author': list(authors), 'text': texts})
+                chunks.append({'author': list(authors), 'text': texts, 'ids': list(ids)})
                 authors.clear()
+                ids.clear()
                 texts = ''
             else:
                 texts += sentence['text'] + ' '
                 authors.append(sentence['author'])
+                ids.append(sentence['id'])
         if len(authors) > 0:
-            chunks.append({'author': list(authors), 'text': texts})
+            chunks.append({'author': list(authors), 'text': texts, 'ids': list(ids)})
         return chunks
 
 
@@ -113,8 +169,28 @@ class Feature:
     the authorclustering.feature module.
     """
 
-    def __init__(self):
+    def __init__(self, cache=None, max_in_flight=None, weighting='binary', hash_features=None):
+        """
+        :param cache: An AnnotationCache shared by the parsing workers, or None.
+        :param max_in_flight: The maximum number of concurrent requests sent by an
+        asynchronous client, or None to parse in a pool of worker processes.
+        :param weighting: The values of the vectors, one of WEIGHTINGS. tfidf needs
+        feature metadata with counts.
+        :param hash_features: The number of hashed columns of every feature type,
+        or None to use the columns of the feature metadata. Hashed features need
+        no feature metadata to be loaded.
+        """
+        assert isinstance(cache, AnnotationCache) or cache is None
+        assert isinstance(max_in_flight, int) or max_in_flight is None
+        assert weighting in WEIGHTINGS
+        assert isinstance(hash_features, int) or hash_features is None
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self.weighting = weighting
+        self.hash_features = hash_features
         self.most_common_words = set()
+        # Terms of metadata files in the text format. Those of binary metadata files
+        # are only kept in the string tables of the vocabulary, see vocabulary.index().
         self.words = set()
         self.word_bigrams = set()
         self.char_ngrams = set()
@@ -122,6 +198,7 @@ class Feature:
         self.postag_bigrams = set()
         self.postag_trigrams = set()
         self.postag_fourgrams = set()
+        self.vocabulary = None
 
     def load(self, word_path=None, word_bigram_path=None, char_ngram_path=None,
              postag_path=None, postag_bigram_path=None,
@@ -137,203 +214,406 @@ class Feature:
         :param postag_fourgram_path: A path to a POS tag 4-gram metadata file.
         :return: None.
         """
+        # String tables and counts of metadata files in the binary format, which are already sorted.
+        tables = {}
+        table_counts = {}
+        # Corpus counts of the terms of metadata files in the text format.
+        term_counts = {t: {} for t in FEATURE_TYPES}
+
         if word_path is not None:
             assert isinstance(word_path, str)
-            words = {}
-            with open(word_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 2
-                    self.words.add(elements[0])
-                    words[elements[0]] = elements[1]
-
-            for (word, num) in Counter(words).most_common(500):
-                self.most_common_words.add(word)
+            if word_path.endswith(BINARY_SUFFIX):
+                tables['w'], counts = Feature._load_binary(word_path)
+                table_counts['w'] = counts
+                for i in numpy.argsort(-counts, kind='stable')[:500]:
+                    self.most_common_words.add(tables['w'][i])
+            else:
+                words = {}
+                with open(word_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 2
+                        self.words.add(elements[0])
+                        words[elements[0]] = elements[1]
+                        term_counts['w'][elements[0]] = int(elements[1])
+
+                for (word, num) in Counter(words).most_common(500):
+                    self.most_common_words.add(word)
 
         if word_bigram_path is not None:
             assert isinstance(word_bigram_path, str)
-            with open(word_bigram_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 3
-                    key = str.format('{} {}', elements[0], elements[1])
-                    self.word_bigrams.add(key)
+            if word_bigram_path.endswith(BINARY_SUFFIX):
+                tables['W'], table_counts['W'] = Feature._load_binary(word_bigram_path)
+            else:
+                with open(word_bigram_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 3
+                        key = str.format('{} {}', elements[0], elements[1])
+                        self.word_bigrams.add(key)
+                        term_counts['W'][key] = int(elements[2])
 
         if char_ngram_path is not None:
             assert isinstance(char_ngram_path, str)
-            with open(char_ngram_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    self.char_ngrams.add(line[:4])
+            if char_ngram_path.endswith(BINARY_SUFFIX):
+                tables['c'], table_counts['c'] = Feature._load_binary(char_ngram_path)
+            else:
+                with open(char_ngram_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        self.char_ngrams.add(line[:4])
+                        term_counts['c'][line[:4]] = int(line[4:])
 
         if postag_path is not None:
             assert isinstance(postag_path, str)
-            with open(postag_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 2
-                    self.postags.add(elements[0])
+            if postag_path.endswith(BINARY_SUFFIX):
+                tables['p'], table_counts['p'] = Feature._load_binary(postag_path)
+            else:
+                with open(postag_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 2
+                        self.postags.add(elements[0])
+                        term_counts['p'][elements[0]] = int(elements[1])
 
         if postag_bigram_path is not None:
             assert isinstance(postag_bigram_path, str)
-            with open(postag_bigram_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 3
-                    key = str.format('{} {}', elements[0], elements[1])
-                    self.postag_bigrams.add(key)
+            if postag_bigram_path.endswith(BINARY_SUFFIX):
+                tables['P'], table_counts['P'] = Feature._load_binary(postag_bigram_path)
+            else:
+                with open(postag_bigram_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 3
+                        key = str.format('{} {}', elements[0], elements[1])
+                        self.postag_bigrams.add(key)
+                        term_counts['P'][key] = int(elements[2])
 
         if postag_trigram_path is not None:
             assert isinstance(postag_trigram_path, str)
-            with open(postag_trigram_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 4
-                    key = str.format('{} {} {}', elements[0], elements[1], elements[2])
-                    self.postag_trigrams.add(key)
+            if postag_trigram_path.endswith(BINARY_SUFFIX):
+                tables['T'], table_counts['T'] = Feature._load_binary(postag_trigram_path)
+            else:
+                with open(postag_trigram_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 4
+                        key = str.format('{} {} {}', elements[0], elements[1], elements[2])
+                        self.postag_trigrams.add(key)
+                        term_counts['T'][key] = int(elements[3])
 
         if postag_fourgram_path is not None:
             assert isinstance(postag_fourgram_path, str)
-            with open(postag_fourgram_path, 'r', encoding='utf=8') as file:
-                for line in file:
-                    elements = line.split()
-                    assert len(elements) == 5
-                    key = str.format('{} {} {} {}', elements[0], elements[1], elements[2], elements[3])
-                    self.postag_fourgrams.add(key)
+            if postag_fourgram_path.endswith(BINARY_SUFFIX):
+                # POS tag 4-grams are not a feature type of the vocabulary.
+                self.postag_fourgrams.update(Feature._load_binary(postag_fourgram_path)[0])
+            else:
+                with open(postag_fourgram_path, 'r', encoding='utf=8') as file:
+                    for line in file:
+                        elements = line.split()
+                        assert len(elements) == 5
+                        key = str.format('{} {} {} {}', elements[0], elements[1], elements[2], elements[3])
+                        self.postag_fourgrams.add(key)
+
+        terms = {}
+        for feature_type, path, type_terms in (('w', word_path, self.words),
+                                               ('W', word_bigram_path, self.word_bigrams),
+                                               ('c', char_ngram_path, self.char_ngrams),
+                                               ('p', postag_path, self.postags),
+                                               ('P', postag_bigram_path, self.postag_bigrams),
+                                               ('T', postag_trigram_path, self.postag_trigrams)):
+            if path is not None and feature_type not in tables:
+                terms[feature_type] = type_terms
+        text_vocabulary = Vocabulary.from_terms(terms, {t: term_counts[t] for t in terms})
+        tables.update(text_vocabulary.tables)
+        table_counts.update(text_vocabulary.counts)
+        self.vocabulary = Vocabulary(tables, table_counts)
+
+    @staticmethod
+    def _load_binary(path):
+        """
+        Loads a metadata file saved in the binary format with one bulk read.
+        :param path: A path to a binary metadata file.
+        :return: A tuple (StringTable of sorted terms, NumPy array of their counts).
+        """
+        return authorclustering.feature.Feature.load_model(path)
+
+    @staticmethod
+    def metadata_path(path_prefix, name):
+        """
+        Chooses the binary metadata file over the text one if it exists.
+        :param path_prefix: A path prefix of the metadata files.
+        :param name: A feature type name, e.g. biword.
+        :return: A path to the metadata file.
+        """
+        binary_path = str.format('{}_{}{}', path_prefix, name, BINARY_SUFFIX)
+        if os.path.isfile(binary_path):
+            return binary_path
+        return str.format('{}_{}.txt', path_prefix, name)
 
-    def vectorize(self, chunks, features):
+    def load_vocabulary(self, vocabulary_path):
+        """
+        Loads a vocabulary saved from previously loaded feature metadata,
+        instead of parsing the metadata files again.
+        :param vocabulary_path: A path to a vocabulary directory.
+        :return: None.
+        """
+        assert isinstance(vocabulary_path, str)
+        self.vocabulary = Vocabulary.load(vocabulary_path)
+
+    @staticmethod
+    def is_vocabulary_current(vocabulary_path, metadata_paths):
+        """
+        Checks whether a saved vocabulary is newer than the feature metadata files.
+        Vocabularies saved without the corpus counts of the terms are outdated.
+        :param vocabulary_path: A path to a vocabulary directory.
+        :param metadata_paths: A list of paths to feature metadata files.
+        :return: True if the vocabulary can be loaded instead of the metadata files.
+        """
+        manifest = os.path.join(vocabulary_path, 'vocabulary.json')
+        if not os.path.isfile(manifest):
+            return False
+        with open(manifest, 'r', encoding='utf-8') as file:
+            if 'counts' not in json.load(file):
+                return False
+        mtime = os.path.getmtime(manifest)
+        return all(os.path.getmtime(path) <= mtime for path in metadata_paths if path is not None)
+
+    def vectorize(self, chunks, features, text=None, chunk_ids=None):
         """
         Generates vectors from the given chunks and the feature parameters.
         :param chunks: A list of chunks genereated by the Chunk class.
         :param features: A string containing feature parameters from
         command line arguments.
-        :return: A list of vectors corresponding to the given chunks.
+        :param text: A Text whose words were cached with sentence token offsets, or None.
+        :param chunk_ids: A list of lists of the sentence indices of each chunk in the text.
+        Given both, the cached words and tags of the sentences are used and
+        nothing is sent to the CoreNLP server.
+        :return: A sparse matrix with a row per chunk, weighted by weight().
+        """
+        return self.weight(self._vectorize(chunks, features, text, chunk_ids), features)
+
+    def _vectorize(self, chunks, features, text=None, chunk_ids=None):
+        """
+        Generates unweighted vectors, n-gram counts unless the weighting is binary.
+        The parameters are the same as those of vectorize().
+        :return: A sparse binary, or count, matrix with a row per chunk.
         """
         assert isinstance(chunks, list)
         assert isinstance(features, str)
 
+        vectorizer = self.vectorizer(features, counts=self.weighting != 'binary')
+        if text is not None and chunk_ids is not None and text.TokenOffsets is not None:
+            assert len(chunk_ids) == len(chunks)
+            tokens = [text.getSentenceTokens(ids) for ids in chunk_ids]
+            return vectorizer.transform_ids(chunks,
+                                            [words for words, _ in tokens],
+                                            [postags for _, postags in tokens],
+                                            text.WordTable, text.TagTable)
+
         parsed_words = {}
         parsed_postags = {}
 
-        with Pool() as pool:
-            results = pool.map(Feature._parallel_parse, chunks)
-            for i, (words, postags) in enumerate(results):
+        if self.max_in_flight is not None:
+            batches = [list(range(len(chunks)))]
+            results = [asyncio.run(Feature._async_parse(chunks, self.cache, self.max_in_flight))]
+        else:
+            with Pool() as pool:
+                batches = StanfordCoreNLP.pack(chunks)
+                args = [([chunks[i] for i in batch], self.cache) for batch in batches]
+                results = pool.starmap(Feature._parallel_parse, args)
+
+        for batch, batch_results in zip(batches, results):
+            for i, (words, postags) in zip(batch, batch_results):
                 parsed_words[i] = words
                 parsed_postags[i] = postags
 
-        words = self.words if 'w' in features else None
-        word_bigrams = self.word_bigrams if 'W' in features else None
-        char_ngrams = self.char_ngrams if 'c' in features else None
-        postags = self.postags if 'p' in features else None
-        postag_bigrams = self.postag_bigrams if 'P' in features else None
-        postag_trigrams = self.postag_trigrams if 'T' in features else None
-        postag_fourgrams = None
-
-        vectors = []
-        with Pool() as pool:
-            args = []
-            for i, chunk in enumerate(chunks):
-                args.append((chunk, tuple(parsed_words.get(i)), tuple(parsed_postags.get(i)),
-                             words, char_ngrams, postags, postag_bigrams,
-                             word_bigrams, postag_trigrams, postag_fourgrams))
-            results = pool.starmap(Feature._parallel_vectorize, args)
-            vectors.extend(results)
-        return vectors
+        return vectorizer.transform(chunks,
+                                    [parsed_words[i] for i in range(len(chunks))],
+                                    [parsed_postags[i] for i in range(len(chunks))])
+
+    def vectorize_cached(self, chunks, features, block_cache, text_digest, rows, text=None, chunk_ids=None,
+                         weighted=True):
+        """
+        Generates vectors like vectorize(), but loads the columns of every feature
+        type from a block cache if they were vectorized before, so only the feature
+        types missing from the cache are vectorized. Columns are stacked in the
+        same order as vectorize() lays them out. Blocks are cached unweighted, so
+        the weighting of the cached counts can be changed without vectorizing again.
+        :param chunks: A list of chunks genereated by the Chunk class.
+        :param features: A string containing feature parameters from
+        command line arguments.
+        :param block_cache: A BlockCache.
+        :param text_digest: A digest of the text generated by Text.digest().
+        :param rows: A string naming the rows, e.g. chunk20 for chunks of 20 sentences.
+        :param text: A Text whose words were cached with sentence token offsets, or None.
+        :param chunk_ids: A list of lists of the sentence indices of each chunk in the text.
+        :param weighted: Weights the vectors with weight(), otherwise returns them like _vectorize().
+        :return: A sparse matrix with a row per chunk.
+        """
+        assert isinstance(block_cache, BlockCache)
+        vectorizer = self.vectorizer(features)
+        rows = self.block_rows(rows)
+        digests = {f: self.vocabulary_digest(f) for f in vectorizer.features}
+        blocks = {f: block_cache.load(f, text_digest, rows, digests[f]) for f in vectorizer.features}
+
+        missing = ''.join(f for f in vectorizer.features if blocks[f] is None)
+        if len(missing) > 0:
+            vectors = self._vectorize(chunks, missing, text, chunk_ids)
+            missing_vectorizer = self.vectorizer(missing)
+            for f in missing:
+                start = missing_vectorizer.offsets[f]
+                blocks[f] = vectors[:, start:start + missing_vectorizer.widths[f]].tocsr()
+                block_cache.store(f, text_digest, rows, digests[f], blocks[f])
+        if weighted:
+            return hstack_blocks([self.weight_block(blocks[f], f) for f in vectorizer.features])
+        return hstack_blocks([blocks[f] for f in vectorizer.features])
+
+    def vectorizer(self, features, counts=False):
+        """
+        :param features: A string of feature type initials.
+        :param counts: Counts the n-grams of each chunk instead of marking their presence.
+        :return: A HashingVectorizer if features are hashed, otherwise a SparseVectorizer of the vocabulary.
+        """
+        if self.hash_features is not None:
+            return HashingVectorizer(features, self.hash_features, counts=counts)
+        if self.vocabulary is None:
+            raise Exception('Feature metadata is not loaded.')
+        return SparseVectorizer(self.vocabulary, features, counts=counts)
+
+    def vocabulary_digest(self, feature_type):
+        """
+        :param feature_type: A feature type initial.
+        :return: A digest string identifying the columns of the feature type.
+        """
+        if self.hash_features is not None:
+            return str.format('hash{}', self.hash_features)
+        return self.vocabulary.digest(feature_type)
+
+    def block_rows(self, rows):
+        """
+        :param rows: A string naming the rows of a block, e.g. chunk20.
+        :return: The name of the rows in the block cache, which tells binary
+        blocks from count blocks.
+        """
+        return rows if self.weighting == 'binary' else rows + '_counts'
+
+    def weight(self, vectors, features):
+        """
+        Weights unweighted vectors feature type by feature type, so relative
+        frequencies are relative to the n-grams of the same type.
+        :param vectors: A sparse matrix generated by _vectorize() or aggregate().
+        :param features: The string of feature type initials the vectors were generated with.
+        :return: A sparse matrix with the same sparsity pattern.
+        """
+        if self.weighting == 'binary':
+            return vectors
+        vectorizer = self.vectorizer(features)
+        vectors = sparse.csr_matrix(vectors)
+        blocks = []
+        for f in vectorizer.features:
+            start = vectorizer.offsets[f]
+            blocks.append(self.weight_block(vectors[:, start:start + vectorizer.widths[f]], f))
+        return hstack_blocks(blocks)
+
+    def weight_block(self, block, feature_type):
+        """
+        :param block: A sparse matrix of the unweighted columns of a feature type.
+        :param feature_type: A feature type initial.
+        :return: The weighted block.
+        """
+        if self.weighting == 'binary':
+            return block
+        return weight(block, self.weighting, self.idf(feature_type) if self.weighting == 'tfidf' else None)
+
+    def idf(self, feature_type):
+        """
+        :param feature_type: A feature type initial.
+        :return: A NumPy array of the inverse corpus frequency of every column of the feature type.
+        """
+        if self.vocabulary is None or feature_type not in self.vocabulary.counts:
+            raise Exception(str.format('No corpus counts for {}.', FEATURE_NAMES[feature_type]))
+        return inverse_frequencies(self.vocabulary.counts[feature_type])
+
+    def vectorize_sentences(self, text, features, block_cache=None):
+        """
+        Generates a vector per sentence of the text, so that chunk vectors of
+        any chunk size can be derived with aggregate() without vectorizing again.
+        :param text: A Text. Its cached words are used if it has sentence token offsets.
+        :param features: A string containing feature parameters from
+        command line arguments.
+        :param block_cache: A BlockCache to keep the sentence vectors of every
+        feature type in, or None.
+        :return: A sparse matrix with a row per sentence, unweighted so that it can
+        be aggregated. It holds n-gram counts unless the weighting is binary.
+        """
+        sentences = list(text.Sentences)
+        sentence_ids = [[i] for i in range(len(sentences))]
+        if block_cache is not None:
+            return self.vectorize_cached(sentences, features, block_cache, text.digest(), 'sentences',
+                                         text, sentence_ids, weighted=False)
+        return self._vectorize(sentences, features, text, sentence_ids)
 
     @staticmethod
-    def _parallel_parse(chunk):
+    def aggregate(sentence_vectors, chunks, binary=True):
         """
-        This function is internally used to parse texts in parallel.
-        :param chunk: A text string from a chunk.
-        :return: A tuple containing a list of words and a list of POS tags.
+        Derives chunk vectors from sentence vectors. A feature of a chunk is
+        set if it is set for any of the sentences of the chunk, or counted as
+        the sum of its sentence counts. N-grams that span two sentences of a
+        chunk are not counted. A binary hashed column of a chunk is the sign of
+        the sum of its sentence signs, like the sign HashingVectorizer gives the
+        terms of a chunk, although the two differ if terms of opposite signs
+        collide in the column in different sentences.
+        :param sentence_vectors: A sparse matrix generated by vectorize_sentences().
+        :param chunks: A list of chunks generated by the Chunk class with sentence indices.
+        :param binary: Marks the presence of features instead of summing their counts.
+        :return: A sparse binary, or count, matrix with a row per chunk.
         """
-        assert isinstance(chunk, str)
-        nlp = StanfordCoreNLP('http://localhost:8011')
-        words, postags = nlp.parse(chunk)
-        return words, postags
+        assert sparse.issparse(sentence_vectors)
+        assert isinstance(chunks, list)
+        indptr = numpy.zeros(len(chunks) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(chunk['ids']) for chunk in chunks], out=indptr[1:])
+        indices = numpy.fromiter((i for chunk in chunks for i in chunk['ids']),
+                                 dtype=numpy.int64, count=indptr[-1])
+        data = numpy.ones(len(indices), dtype=sentence_vectors.dtype)
+        membership = sparse.csr_matrix((data, indices, indptr),
+                                       shape=(len(chunks), sentence_vectors.shape[0]))
+        # The product is computed over the columns present only, since it needs
+        # an array per column, and mapped back to the columns of the sentences.
+        columns, compact = compact_columns(sentence_vectors)
+        vectors = (membership @ compact).tocsr()
+        if binary:
+            # Signed hashed features keep their signs.
+            vectors.data = numpy.sign(vectors.data)
+            vectors.eliminate_zeros()
+        return sparse.csr_matrix((vectors.data, columns[vectors.indices], vectors.indptr),
+                                 shape=(len(chunks), sentence_vectors.shape[1]))
 
     @staticmethod
-    def _parallel_vectorize(chunk, words, postags, ref_words=None, ref_char_grams=None,
-                            ref_postags=None, ref_postag_bigrams=None, ref_word_bigrams=None,
-                            ref_postag_trigram=None, ref_postag_fourgram=None):
-        """
-        This function is internally used to vectorize chunks in parallel.
-        :param chunk: A text string from a chunk.
-        :param words: A immutable list, which is a tuple, containing a list of words
-        processed by the function _parallel_parse().
-        :param postags: A immutable list, which is a tuple, containing a list of POS tags
-        processed by the function _parallel_parse().
-        :param ref_words: A set of word frequency strings from the feature metadata.
-        :param ref_char_grams: A set of character n-gram strings from the feature metadata.
-        :param ref_postags: A set of POS tag strings from the feature metadata.
-        :param ref_postag_bigrams: A set of POS tag bigram strings from the feature metadata.
-        :param ref_word_bigrams: A set of word bigram strings from the feature metadata.
-        :param ref_postag_trigram: A set of POS tag trigram strings from the feature metadata.
-        :param ref_postag_fourgram: A set of POS tag 4-gram strings from the feature metadata.
-        :return: A binary vector for a chunk.
-        """
-        assert isinstance(chunk, str)
-        assert isinstance(words, tuple)
-        assert isinstance(postags, tuple)
-        assert isinstance(ref_words, set) or ref_words is None
-        assert isinstance(ref_char_grams, set) or ref_char_grams is None
-        assert isinstance(ref_postags, set) or ref_postags is None
-        assert isinstance(ref_postag_bigrams, set) or ref_postag_bigrams is None
-        assert isinstance(ref_word_bigrams, set) or ref_word_bigrams is None
-        assert isinstance(ref_postag_trigram, set) or ref_postag_trigram is None
-        assert isinstance(ref_postag_fourgram, set) or ref_postag_fourgram is None
-
-        vector = []
-
-        if ref_words is not None:
-            word_counter = Counter(words)
-            vector.extend([x in word_counter for x in ref_words])
-
-        if ref_char_grams is not None:
-            char_grams = Feature._make_ngram(chunk, 4)
-            vector.extend([x in char_grams for x in ref_char_grams])
-
-        if ref_postags is not None:
-            tag_counter = Counter(postags)
-            vector.extend([x in tag_counter for x in ref_postags])
-
-        if ref_postag_bigrams is not None:
-            postag_bigrams = set()
-            for pair in Feature._make_ngram(postags, 2):
-                postag_bigrams.add(str.format('{} {}', pair[0], pair[1]))
-            vector.extend([x in postag_bigrams for x in ref_postag_bigrams])
-
-        if ref_word_bigrams is not None:
-            word_bigrams = set()
-            for pair in Feature._make_ngram(words, 2):
-                word_bigrams.add(str.format('{} {}', pair[0], pair[1]))
-            vector.extend([x in word_bigrams for x in ref_word_bigrams])
-
-        if ref_postag_trigram is not None:
-            postag_trigrams = set()
-            for pair in Feature._make_ngram(postags, 3):
-                postag_trigrams.add(str.format('{} {} {}', pair[0], pair[1], pair[2]))
-            vector.extend([x in postag_trigrams for x in ref_postag_trigram])
-
-        if ref_postag_fourgram is not None:
-            postag_fourgrams = set()
-            for pair in Feature._make_ngram(words, 4):
-                postag_fourgrams.add(str.format('{} {} {} {}', pair[0], pair[1], pair[2], pair[3]))
-            vector.extend([x in postag_fourgrams for x in ref_postag_fourgram])
-
-        return vector
+    def _parallel_parse(chunks, cache=None):
+        """
+        This function is internally used to parse texts in parallel.
+        :param chunks: A list of chunk text strings that fit into a single request.
+        :param cache: An AnnotationCache to look up annotations in, or None.
+        :return: A list of tuples containing a list of words and a list of POS tags.
+        """
+        assert isinstance(chunks, list)
+        nlp = StanfordCoreNLP('http://localhost:8011', cache=cache)
+        return nlp.parse_many(chunks)
 
     @staticmethod
-    def _make_ngram(iterable, size):
+    async def _async_parse(chunks, cache, max_in_flight):
         """
-        Generates n-grams out of iterable objects, such as strings or lists.
-        :param iterable: An iterable object.
-        :param size: A constant number of n to make n-gram.
-        :return: A set of generated n-grams out of the iterable object.
+        This function is internally used to parse texts with concurrent requests from this process.
+        :param chunks: A list of chunk text strings.
+        :param cache: An AnnotationCache to look up annotations in, or None.
+        :param max_in_flight: The maximum number of concurrent requests.
+        :return: A list of tuples containing a list of words and a list of POS tags.
         """
-        grams = set()
-        for i in range(len(iterable) - size + 1):
-            grams.add(iterable[i:i + size])
-        return grams
+        from authorclustering.async_corenlp import AsyncStanfordCoreNLP
+
+        async with AsyncStanfordCoreNLP('http://localhost:8011', cache=cache,
+                                        max_in_flight=max_in_flight) as nlp:
+            return await nlp.parse_many(chunks)
 
     @staticmethod
     def remove_features(vectors):
@@ -342,15 +622,19 @@ class Feature:
         vector dimensions by filtering out unnecessary ones
         determined by the variance threshold Var[X] = p(1 - p),
         where p = 0.9 for here.
-        :param vectors: A list of vectors generated by the vectorize() function.
-        :return: A list of new dimension-reduced vectors.
+        The variances are computed from the stored values of the sparse matrix,
+        so it is never densified. Weighted vectors are selected by the variance
+        of the presence of their features, so the threshold means the same.
+        Columns without stored values have no variance and are dropped first, so
+        the work does not grow with the number of hashed columns.
+        :param vectors: A sparse matrix generated by the vectorize() function.
+        :return: A new dimension-reduced sparse matrix.
         """
-        assert isinstance(vectors, list)
-        num = len(vectors[0])
-        for v in vectors:
-            assert num == len(v)
-        sel = VarianceThreshold(.9 * (1 - .9))
-        return sel.fit_transform(vectors)
+        assert sparse.issparse(vectors)
+        _, vectors = compact_columns(vectors)
+        presence = sparse.csr_matrix((numpy.ones(len(vectors.data)), vectors.indices, vectors.indptr),
+                                     shape=vectors.shape)
+        return select_columns(vectors, column_variances(presence) > .9 * (1 - .9))
 
 
 class Evaluation:
@@ -370,34 +654,39 @@ class Evaluation:
         with the truth data.
         """
         assert isinstance(chunks, list)
+        assert len(labels) == len(chunks)
 
         result_text = '===========================================\n'
-        chunk_majorities = []
-        for chunk in chunks:
-            author = Counter(chunk['author']).most_common(1)[0][0]
-            chunk_majorities.append(author)
-
-        clusters = {}
-        for i, label in enumerate(labels):
-            majors = clusters.get(label, list())
-            majors.append(chunk_majorities[i])
-            clusters[label] = majors
-
-        sum_majority = 0
-        for key in clusters.keys():
-            counter = Counter(clusters[key])
-            major_author, sub_purity = counter.most_common(1)[0]
-            sum_majority += sub_purity
+        result = authorclustering.evaluation.evaluate(labels, Evaluation.chunk_majorities(chunks))
+        for key, major_author, sub_purity in zip(result['labels'], result['majorities'], result['purities']):
             result_text += str.format(
                 'Cluster id {} major author: {}, purity: {}\n',
-                key, major_author, sub_purity / len(clusters[key])
+                key, major_author, sub_purity
             )
 
-        total_purity = (1 / len(labels)) * sum_majority
-        result_text += str.format('Overall purity: {}\n', total_purity)
+        result_text += str.format('Overall purity: {}\n', result['purity'])
+        result_text += str.format(
+            'NMI: {}, ARI: {}, B-cubed precision: {}, recall: {}, F1: {}\n',
+            result['nmi'], result['ari'], result['bcubed_precision'], result['bcubed_recall'], result['bcubed_f1']
+        )
         result_text += '==================================================================='
         return result_text
 
+    @staticmethod
+    def chunk_majorities(chunks):
+        """
+        Finds the author of most sentences of every chunk. Ties go to the author
+        who appears first in the chunk, like Counter.most_common().
+        :param chunks: A list of chunks generated by the Chunk class.
+        :return: A NumPy array of a majority author per chunk.
+        """
+        chunk_ids = numpy.repeat(numpy.arange(len(chunks)), [len(chunk['author']) for chunk in chunks])
+        authors = [author for chunk in chunks for author in chunk['author']]
+        contingency, _, author_values = authorclustering.evaluation.contingency_matrix(chunk_ids, authors)
+        first = numpy.full(contingency.shape, len(authors))
+        numpy.minimum.at(first, (chunk_ids, numpy.searchsorted(author_values, authors)), numpy.arange(len(authors)))
+        return author_values[(contingency * (len(authors) + 1) - first).argmax(axis=1)]
+
     @staticmethod
     def silhouette_score(labels, matrix):
         """
@@ -422,8 +711,14 @@ class CommandLineParser:
     def parse():
         """
         Parses command line arguments and returns their values.
-        :return: A tuple containing a list of feature initials,
-        a chunk size number, the number of clusters.
+        :return: An argparse.Namespace containing a string of feature initials (features),
+        a list of chunk size numbers (chunk_sizes), a list of numbers of clusters (n_clusters),
+        the number of k-means seeds (n_seeds),
+        a path to the CoreNLP annotation cache file or None (cache_path),
+        the maximum number of concurrent CoreNLP requests or None (max_in_flight),
+        the number of neighbours of the sparse cosine affinity graph or None (n_neighbors),
+        the number of rows of a similarity block (block_size) and
+        a path to a memory-mapped dense affinity file or None (affinity_path).
         """
         feature_help = 'w:Word frequency, ' \
                        'W:Word bigram, ' \
@@ -434,102 +729,221 @@ class CommandLineParser:
         metavar = 'wWcpPT'
         parser = argparse.ArgumentParser()
         parser.add_argument('features', metavar=metavar, nargs='?', help=feature_help)
-        parser.add_argument('-s', metavar='20', dest='chunk_size', type=int, required=True)
-        parser.add_argument('-c', metavar='3', dest='n_clusters', type=int, required=True)
+        parser.add_argument('-s', metavar='20', dest='chunk_sizes', type=int, nargs='+', required=True,
+                            help='Chunk sizes. Several sizes are swept reusing sentence vectors')
+        parser.add_argument('-c', metavar='3', dest='n_clusters', type=int, nargs='+', required=True,
+                            help='Numbers of clusters, clustered on the same spectral embedding')
+        parser.add_argument('-seeds', metavar='1', dest='n_seeds', type=int, default=1, required=False,
+                            help='Number of k-means seeds tried for each number of clusters')
+        parser.add_argument('-cache', metavar='corenlp_cache.db', dest='cache_path', required=False)
+        parser.add_argument('-concurrency', metavar='100', dest='max_in_flight', type=int, required=False)
+        parser.add_argument('-knn', metavar='10', dest='n_neighbors', type=int, required=False,
+                            help='Clusters a sparse k-nearest-neighbour cosine graph instead of the dense cosine kernel')
+        parser.add_argument('-block', metavar='1024', dest='block_size', type=int, default=1024, required=False,
+                            help='Rows per block when computing cosine similarities, which bounds peak memory')
+        parser.add_argument('-affinity', metavar='affinity.npy', dest='affinity_path', required=False,
+                            help='Memory-maps the dense cosine affinity to this file')
+        parser.add_argument('-weight', dest='weighting', choices=WEIGHTINGS, default='binary', required=False,
+                            help='Feature values: presence, counts, counts relative to the feature type, '
+                                 'or relative counts weighted by the inverse corpus frequency of the metadata')
+        parser.add_argument('-hash', metavar='18', dest='hash_bits', type=int, required=False,
+                            help='Hashes the n-grams of every feature type into 2^bits signed columns '
+                                 'instead of loading feature metadata')
+        parser.add_argument('-blocks', metavar='blocks', dest='block_path', required=False,
+                            help='Directory caching the vectors of every feature type, '
+                                 '<text>_blocks next to the text by default')
         args = parser.parse_args()
-        features = args.features
-        chunk_size = args.chunk_size
-        n_clusters = args.n_clusters
 
-        if not all([f in metavar for f in features]):
+        if not all([f in metavar for f in args.features]):
             parser.print_help()
             exit()
-        return features, chunk_size, n_clusters
+        if args.hash_bits is not None and not 0 < args.hash_bits <= 31:
+            parser.error('-hash must be between 1 and 31.')
+        if args.hash_bits is not None and args.weighting == 'tfidf':
+            parser.error('tfidf needs the corpus counts of feature metadata, which are not loaded with -hash.')
+        return args
 
 
-def main():
-    formatter = logging.Formatter('%(asctime)s %(message)s')
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
+def cluster(feature, vectors, chunks, args, logger):
+    """
+    Removes features, clusters chunk vectors and logs the evaluation.
+    The spectral embedding of each affinity is computed once and clustered
+    with k-means for every number of clusters and seed.
+    :param feature: A Feature.
+    :param vectors: A sparse matrix with a row per chunk.
+    :param chunks: A list of chunks generated by the Chunk class.
+    :param args: Command line arguments returned by CommandLineParser.parse().
+    :param logger: A logger.
+    :return: None.
+    """
+    logger.info(str.format('Number of features: {}', vectors.shape[1]))
+
+    logger.info('Removing features.')
+    vectors = feature.remove_features(vectors)
+    logger.info(str.format('Number of features: {}', vectors.shape[1]))
+
+    if args.n_neighbors is not None:
+        name = str.format('cosine {}-nearest neighbors graph', args.n_neighbors)
+        logger.info(str.format('Spectral embedding - {}.', name))
+        affinity_matrix = knn_graph(vectors, args.n_neighbors, block_size=args.block_size)
+    else:
+        name = 'cosine similarity'
+        logger.info(str.format('Spectral embedding - {}.', name))
+        affinity_matrix = cosine_similarity(vectors, block_size=args.block_size, path=args.affinity_path)
+    embedding = SpectralEmbedding(affinity_matrix, max(args.n_clusters))
+    evaluate(embedding, args.n_clusters, args.n_seeds, chunks, name, logger)
+
+    # The neighbourhood size depends on the number of clusters.
+    neighbors = {}
+    for n_clusters in args.n_clusters:
+        n_neighbors = int(len(chunks) / n_clusters - (n_clusters * 0.1))
+        neighbors.setdefault(n_neighbors, []).append(n_clusters)
+    for n_neighbors, n_clusters_list in neighbors.items():
+        name = 'nearest neighbors'
+        logger.info(str.format('Spectral embedding - {}.', name))
+        connectivity = kneighbors_graph(vectors, n_neighbors=n_neighbors, include_self=True)
+        affinity_matrix = 0.5 * (connectivity + connectivity.T)
+        embedding = SpectralEmbedding(affinity_matrix, max(n_clusters_list))
+        evaluate(embedding, n_clusters_list, args.n_seeds, chunks, name, logger)
+
+
+def evaluate(embedding, n_clusters_list, n_seeds, chunks, name, logger):
+    """
+    Clusters a spectral embedding for several numbers of clusters and seeds and logs the purity.
+    :param embedding: A SpectralEmbedding.
+    :param n_clusters_list: A list of numbers of clusters.
+    :param n_seeds: The number of k-means seeds tried for each number of clusters.
+    :param chunks: A list of chunks generated by the Chunk class.
+    :param name: A name of the affinity for the log.
+    :param logger: A logger.
+    :return: None.
+    """
+    evaluation = Evaluation()
+    for n_clusters in n_clusters_list:
+        for seed in range(n_seeds):
+            labels = embedding.labels(n_clusters, random_state=seed)
+            logger.info(str.format('Evaluating - {}, {} clusters, seed {}.', name, n_clusters, seed))
+            purity = evaluation.purity(labels, chunks)
+            logger.info(purity)
 
-    features, chunk_size, n_clusters = CommandLineParser.parse()
 
-    path_prefix = '../models/spanish_blogs3/4authors_1_200'
+def load_corpus(path_prefix, max_chunk_size, logger):
+    """
+    Loads the text of the experiments and collects its sentences for chunking.
+    :param path_prefix: A path prefix of the text and feature metadata files.
+    :param max_chunk_size: The largest chunk size to generate.
+    :param logger: A logger.
+    :return: A tuple (Text, Chunk holding every sentence of the text).
+    """
     logger.info('Loading text file.')
-    corpus = Text.loadFromFile(path_prefix + '.pickle')
+    text_path = path_prefix + '_text'
+    if not os.path.isdir(text_path):
+        text_path = path_prefix + '.pickle'
+    corpus = Text.loadFromFile(text_path)
     assert isinstance(corpus, Text)
 
     logger.info('Chunking.')
     chunk = Chunk()
-    ids, sentences = corpus.fixed_length_chunk(chunk_size)
     num_sentences = {}
 
-    for id, sentence in zip(ids, sentences):
+    for id, sentence in corpus.iter_chunks(max_chunk_size):
         assert isinstance(id, list)
         assert isinstance(sentence, list)
 
         for i, s in zip(id, sentence):
             author = corpus.getAuthorForSentenceIndex(i)
-            chunk.append_sentences(author, [s])
+            chunk.append_sentences(author, [s], [i])
             n = num_sentences.get(author, 0)
             num_sentences[author] = n + 1
 
     for author, num in num_sentences.items():
         logger.info(str.format('{} sentences: {}', author, num))
+    return corpus, chunk
 
-    chunks = chunk.generate(chunk_size)
-    logger.info(str.format('Number of chunks: {}, chunk size: {}', len(chunks), chunk_size))
+
+def load_feature(path_prefix, cache, max_in_flight, logger, weighting='binary', hash_bits=None):
+    """
+    Loads the feature metadata, or the vocabulary saved from it if it is current.
+    :param path_prefix: A path prefix of the text and feature metadata files.
+    :param cache: An AnnotationCache, or None.
+    :param max_in_flight: The maximum number of concurrent CoreNLP requests, or None.
+    :param logger: A logger.
+    :param weighting: The values of the vectors, one of WEIGHTINGS.
+    :param hash_bits: Hashes the features of every feature type into 2 ** hash_bits
+    columns instead of loading any feature metadata, or None.
+    :return: A Feature with its vocabulary loaded, or a Feature hashing features.
+    """
+    if hash_bits is not None:
+        logger.info(str.format('Hashing features into {} columns per feature type.', 2 ** hash_bits))
+        return Feature(cache=cache, max_in_flight=max_in_flight, weighting=weighting, hash_features=2 ** hash_bits)
 
     logger.info('Loading features.')
-    feature = Feature()
-    word_path = path_prefix + '_word.txt'
-    word_bigram_path = path_prefix + '_biword.txt'
-    char_ngram_path = path_prefix + '_char.txt'
-    postag_path = path_prefix + '_pos.txt'
-    postag_bigram_path = path_prefix + '_bipos.txt'
-    postag_trigram_path = path_prefix + '_tripos.txt'
+    feature = Feature(cache=cache, max_in_flight=max_in_flight, weighting=weighting)
+    word_path = Feature.metadata_path(path_prefix, 'word')
+    word_bigram_path = Feature.metadata_path(path_prefix, 'biword')
+    char_ngram_path = Feature.metadata_path(path_prefix, 'char')
+    postag_path = Feature.metadata_path(path_prefix, 'pos')
+    postag_bigram_path = Feature.metadata_path(path_prefix, 'bipos')
+    postag_trigram_path = Feature.metadata_path(path_prefix, 'tripos')
     postag_fourgram_path = None
-    feature.load(word_path=word_path, word_bigram_path=word_bigram_path,
-                 char_ngram_path=char_ngram_path, postag_path=postag_path,
-                 postag_bigram_path=postag_bigram_path, postag_trigram_path=postag_trigram_path,
-                 postag_fourgram_path=postag_fourgram_path)
-
-    logger.info('Vectorizing.')
-    trans_chunks = []
-    for chunk in chunks:
-        trans_chunks.append(chunk['text'])
-    vectors = feature.vectorize(trans_chunks, features)
-    logger.info(str.format('Number of features: {}', len(vectors[0])))
+    vocabulary_path = path_prefix + '_vocabulary'
+    metadata_paths = [word_path, word_bigram_path, char_ngram_path, postag_path,
+                      postag_bigram_path, postag_trigram_path, postag_fourgram_path]
+    if Feature.is_vocabulary_current(vocabulary_path, metadata_paths):
+        feature.load_vocabulary(vocabulary_path)
+    else:
+        feature.load(word_path=word_path, word_bigram_path=word_bigram_path,
+                     char_ngram_path=char_ngram_path, postag_path=postag_path,
+                     postag_bigram_path=postag_bigram_path, postag_trigram_path=postag_trigram_path,
+                     postag_fourgram_path=postag_fourgram_path)
+        feature.vocabulary.save(vocabulary_path)
+    return feature
 
-    logger.info('Removing features.')
-    vectors = feature.remove_features(vectors)
-    logger.info(str.format('Number of features: {}', len(vectors[0])))
 
-    logger.info('Spectral clustering - cosine similarity.')
-    affinity_matrix = pairwise_kernels(numpy.array(vectors), metric='cosine', n_jobs=12)
-    clustering = SpectralClustering(n_clusters=n_clusters, affinity='precomputed')
-    clustering = clustering.fit(affinity_matrix)
-    labels = clustering.fit_predict(affinity_matrix)
-
-    logger.info('Evaluating - cosine similarity.')
-    evaluation = Evaluation()
-    purity = evaluation.purity(labels, chunks)
-    logger.info(purity)
+def main():
+    formatter = logging.Formatter('%(asctime)s %(message)s')
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
 
-    logger.info('Spectral clustering - nearest neighbors.')
-    n_neighbors = int(len(chunks) / n_clusters - (n_clusters * 0.1))
-    clustering = SpectralClustering(n_clusters=n_clusters,
-                                    affinity='nearest_neighbors',
-                                    n_neighbors=n_neighbors)
-    labels = clustering.fit_predict(vectors)
+    args = CommandLineParser.parse()
+    features = args.features
+    chunk_sizes = args.chunk_sizes
+    cache = AnnotationCache(args.cache_path) if args.cache_path is not None else None
 
-    logger.info('Evaluating - nearest neighbors.')
-    evaluation = Evaluation()
-    purity = evaluation.purity(labels, chunks)
-    logger.info(purity)
+    path_prefix = '../models/spanish_blogs3/4authors_1_200'
+    corpus, chunk = load_corpus(path_prefix, max(chunk_sizes), logger)
+    feature = load_feature(path_prefix, cache, args.max_in_flight, logger, args.weighting, args.hash_bits)
+
+    if corpus.TokenOffsets is None:
+        logger.info('No sentence token offsets cached in the text, parsing chunks.')
+
+    block_cache = BlockCache(args.block_path if args.block_path is not None else path_prefix + '_blocks')
+    if len(chunk_sizes) == 1:
+        chunk_size = chunk_sizes[0]
+        chunks = chunk.generate(chunk_size)
+        logger.info(str.format('Number of chunks: {}, chunk size: {}', len(chunks), chunk_size))
+
+        logger.info('Vectorizing.')
+        trans_chunks = []
+        chunk_ids = []
+        for c in chunks:
+            trans_chunks.append(c['text'])
+            chunk_ids.append(c['ids'])
+        vectors = feature.vectorize_cached(trans_chunks, features, block_cache, corpus.digest(),
+                                           str.format('chunk{}', chunk_size), corpus, chunk_ids)
+        cluster(feature, vectors, chunks, args, logger)
+    else:
+        logger.info('Vectorizing sentences.')
+        sentence_vectors = feature.vectorize_sentences(corpus, features, block_cache)
+        for chunk_size in chunk_sizes:
+            chunks = chunk.generate(chunk_size)
+            logger.info(str.format('Number of chunks: {}, chunk size: {}', len(chunks), chunk_size))
+            vectors = feature.weight(Feature.aggregate(sentence_vectors, chunks, feature.weighting == 'binary'),
+                                     features)
+            cluster(feature, vectors, chunks, args, logger)
 
     logger.info('Done.')
 
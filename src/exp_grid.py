@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import itertools
+import logging
+import time
+from multiprocessing.pool import Pool
+
+import authorclustering.evaluation
+from authorclustering.affinity import cosine_similarity, knn_graph
+from authorclustering.blocks import BlockCache, hstack_blocks
+from authorclustering.cache import AnnotationCache
+from authorclustering.spectral import SpectralEmbedding
+from authorclustering.vectorizer import FEATURE_TYPES, WEIGHTINGS, weight
+from exp_cluster import Evaluation, Feature, load_corpus, load_feature
+
+RESULT_FIELDS = ['features', 'chunk_size', 'n_clusters', 'seed', 'affinity', 'num_features',
+                 'purity', 'nmi', 'ari', 'bcubed_precision', 'bcubed_recall', 'bcubed_f1', 'seconds']
+
+# Shared by the grid workers, set by _init_worker().
+_weighting = None
+_idf = None
+_block_cache = None
+_blocks = None
+_truth = None
+
+
+class CommandLineParser:
+    """
+    This class parses command line arguments and returns post-processed values.
+    """
+
+    @staticmethod
+    def parse():
+        """
+        Parses command line arguments and returns their values.
+        :return: An argparse.Namespace containing a string of feature initials whose
+        subsets are swept (features), a list of chunk size numbers (chunk_sizes),
+        a list of numbers of clusters (n_clusters), the number of k-means seeds (n_seeds),
+        the number of neighbours of the sparse cosine affinity graph or None (n_neighbors),
+        the number of rows of a similarity block (block_size),
+        the number of worker processes or None (processes),
+        one of WEIGHTINGS (weighting), the number of hash bits or None (hash_bits),
+        a path to the block directory or None (block_path),
+        a path to the output CSV file (output_path),
+        a path to the CoreNLP annotation cache file or None (cache_path) and
+        the maximum number of concurrent CoreNLP requests or None (max_in_flight).
+        """
+        parser = argparse.ArgumentParser(
+            description='Clusters every subset of the feature types for every chunk size and '
+                        'number of clusters, and writes the scores to a CSV file.')
+        parser.add_argument('features', metavar='wWcpPT', nargs='?', default=FEATURE_TYPES,
+                            help='Feature types whose non-empty subsets are swept')
+        parser.add_argument('-s', metavar='20', dest='chunk_sizes', type=int, nargs='+', required=True,
+                            help='Chunk sizes')
+        parser.add_argument('-c', metavar='3', dest='n_clusters', type=int, nargs='+', required=True,
+                            help='Numbers of clusters, clustered on the same spectral embedding')
+        parser.add_argument('-seeds', metavar='1', dest='n_seeds', type=int, default=1, required=False,
+                            help='Number of k-means seeds tried for each number of clusters')
+        parser.add_argument('-knn', metavar='10', dest='n_neighbors', type=int, required=False,
+                            help='Clusters a sparse k-nearest-neighbour cosine graph instead of the dense cosine kernel')
+        parser.add_argument('-block', metavar='1024', dest='block_size', type=int, default=1024, required=False,
+                            help='Rows per block when computing cosine similarities')
+        parser.add_argument('-processes', metavar='4', dest='processes', type=int, required=False,
+                            help='Number of worker processes, the number of CPUs by default')
+        parser.add_argument('-weight', dest='weighting', choices=WEIGHTINGS, default='binary', required=False,
+                            help='Feature values: presence, counts, counts relative to the feature type, '
+                                 'or relative counts weighted by the inverse corpus frequency of the metadata')
+        parser.add_argument('-hash', metavar='18', dest='hash_bits', type=int, required=False,
+                            help='Hashes the n-grams of every feature type into 2^bits signed columns '
+                                 'instead of loading feature metadata')
+        parser.add_argument('-blocks', metavar='blocks', dest='block_path', required=False,
+                            help='Directory caching the vectors of every feature type, '
+                                 '<text>_blocks next to the text by default')
+        parser.add_argument('-o', metavar='grid.csv', dest='output_path', default='grid.csv', required=False)
+        parser.add_argument('-cache', metavar='corenlp_cache.db', dest='cache_path', required=False)
+        parser.add_argument('-concurrency', metavar='100', dest='max_in_flight', type=int, required=False)
+        args = parser.parse_args()
+
+        if len(args.features) == 0 or not all([f in FEATURE_TYPES for f in args.features]):
+            parser.print_help()
+            exit()
+        if args.hash_bits is not None and not 0 < args.hash_bits <= 31:
+            parser.error('-hash must be between 1 and 31.')
+        if args.hash_bits is not None and args.weighting == 'tfidf':
+            parser.error('tfidf needs the corpus counts of feature metadata, which are not loaded with -hash.')
+        return args
+
+
+def feature_subsets(features):
+    """
+    :param features: A string of feature type initials.
+    :return: A list of all the non-empty subsets of the feature types, as strings
+    in the order of FEATURE_TYPES.
+    """
+    features = ''.join(f for f in FEATURE_TYPES if f in features)
+    return [''.join(subset) for size in range(1, len(features) + 1)
+            for subset in itertools.combinations(features, size)]
+
+
+def build_blocks(feature, corpus, chunk, features, chunk_sizes, block_cache, logger):
+    """
+    Makes sure the chunk vectors of every feature type and chunk size are in
+    the block cache, vectorizing only the blocks that are not. Chunks are
+    vectorized directly if the text has sentence token offsets, otherwise
+    sentences are parsed once and aggregated into chunks of every size.
+    :param feature: A Feature with its vocabulary loaded.
+    :param corpus: A Text.
+    :param chunk: A Chunk holding every sentence of the text.
+    :param features: A string of feature type initials.
+    :param chunk_sizes: A list of chunk sizes.
+    :param block_cache: A BlockCache.
+    :param logger: A logger.
+    :return: A tuple (dictionary of (feature type, chunk size) to the key of
+    its block in the cache, dictionary of a chunk size to a NumPy array of the
+    majority author per chunk).
+    """
+    vectorizer = feature.vectorizer(features)
+    text_digest = corpus.digest()
+    digests = {f: feature.vocabulary_digest(f) for f in vectorizer.features}
+    sentence_vectors = None
+    if corpus.TokenOffsets is None:
+        logger.info('No sentence token offsets cached in the text, vectorizing sentences.')
+        sentence_vectors = feature.vectorize_sentences(corpus, vectorizer.features, block_cache)
+
+    blocks = {}
+    truth = {}
+    for chunk_size in chunk_sizes:
+        chunks = chunk.generate(chunk_size)
+        logger.info(str.format('Vectorizing - chunk size: {}, number of chunks: {}', chunk_size, len(chunks)))
+        truth[chunk_size] = Evaluation.chunk_majorities(chunks)
+        if sentence_vectors is None:
+            rows = str.format('chunk{}', chunk_size)
+            feature.vectorize_cached([c['text'] for c in chunks], vectorizer.features, block_cache,
+                                     text_digest, rows, corpus, [c['ids'] for c in chunks], weighted=False)
+            rows = feature.block_rows(rows)
+        else:
+            rows = feature.block_rows(str.format('sentences_chunk{}', chunk_size))
+            vectors = Feature.aggregate(sentence_vectors, chunks, feature.weighting == 'binary')
+            for f in vectorizer.features:
+                if block_cache.load(f, text_digest, rows, digests[f]) is None:
+                    start = vectorizer.offsets[f]
+                    block = vectors[:, start:start + vectorizer.widths[f]]
+                    block_cache.store(f, text_digest, rows, digests[f], block)
+        for f in vectorizer.features:
+            blocks[(f, chunk_size)] = (f, text_digest, rows, digests[f])
+    return blocks, truth
+
+
+def _init_worker(weighting, idf, block_cache, blocks, truth):
+    """
+    Shares the arguments of build_blocks() and the weighting with run() in a worker process.
+    :param weighting: One of WEIGHTINGS.
+    :param idf: A dictionary of a feature type initial to a NumPy array of inverse
+    frequencies, empty unless the weighting is tfidf.
+    :param block_cache: A BlockCache.
+    :param blocks: A dictionary of (feature type, chunk size) to the key of its block.
+    :param truth: A dictionary of a chunk size to a NumPy array of the majority author per chunk.
+    :return: None.
+    """
+    global _weighting, _idf, _block_cache, _blocks, _truth
+    _weighting = weighting
+    _idf = idf
+    _block_cache = block_cache
+    _blocks = blocks
+    _truth = truth
+
+
+def run(features, chunk_size, n_clusters_list, n_seeds, n_neighbors, block_size):
+    """
+    Clusters the chunks of one feature subset and chunk size. The blocks are
+    memory-mapped from the block cache, so all the workers share the pages of
+    the same files. Features are removed from the stacked blocks as in exp_cluster.py.
+    :param features: A string of feature type initials.
+    :param chunk_size: A chunk size.
+    :param n_clusters_list: A list of numbers of clusters.
+    :param n_seeds: The number of k-means seeds tried for each number of clusters.
+    :param n_neighbors: The number of neighbours of the cosine kNN graph, or None for the dense cosine kernel.
+    :param block_size: Rows per block when computing cosine similarities.
+    :return: A list of result rows, dictionaries with the keys of RESULT_FIELDS.
+    """
+    start_time = time.time()
+    vectors = hstack_blocks([weight(_block_cache.load(*_blocks[(f, chunk_size)]), _weighting, _idf.get(f))
+                             for f in features])
+    vectors = Feature.remove_features(vectors)
+    truth = _truth[chunk_size]
+    if vectors.shape[1] == 0:
+        return []
+
+    if n_neighbors is not None:
+        name = str.format('cosine {}-nn', n_neighbors)
+        affinity_matrix = knn_graph(vectors, n_neighbors, block_size=block_size)
+    else:
+        name = 'cosine'
+        affinity_matrix = cosine_similarity(vectors, block_size=block_size)
+    embedding = SpectralEmbedding(affinity_matrix, max(n_clusters_list))
+
+    rows = []
+    for n_clusters in n_clusters_list:
+        for seed in range(n_seeds):
+            result = authorclustering.evaluation.evaluate(embedding.labels(n_clusters, random_state=seed), truth)
+            row = {'features': features, 'chunk_size': chunk_size, 'n_clusters': n_clusters, 'seed': seed,
+                   'affinity': name, 'num_features': vectors.shape[1]}
+            for field in RESULT_FIELDS[6:-1]:
+                row[field] = result[field]
+            rows.append(row)
+    elapsed = time.time() - start_time
+    for row in rows:
+        row['seconds'] = elapsed / len(rows)
+    return rows
+
+
+def main():
+    formatter = logging.Formatter('%(asctime)s %(message)s')
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    args = CommandLineParser.parse()
+    cache = AnnotationCache(args.cache_path) if args.cache_path is not None else None
+
+    path_prefix = '../models/spanish_blogs3/4authors_1_200'
+    corpus, chunk = load_corpus(path_prefix, max(args.chunk_sizes), logger)
+    feature = load_feature(path_prefix, cache, args.max_in_flight, logger, args.weighting, args.hash_bits)
+
+    block_cache = BlockCache(args.block_path if args.block_path is not None else path_prefix + '_blocks')
+    blocks, truth = build_blocks(feature, corpus, chunk, args.features, args.chunk_sizes, block_cache, logger)
+    idf = {f: feature.idf(f) for f in args.features} if args.weighting == 'tfidf' else {}
+
+    tasks = [(features, chunk_size, args.n_clusters, args.n_seeds, args.n_neighbors, args.block_size)
+             for chunk_size in args.chunk_sizes for features in feature_subsets(args.features)]
+    logger.info(str.format('Clustering {} combinations.', len(tasks)))
+    with Pool(args.processes, initializer=_init_worker, initargs=(feature.weighting, idf, block_cache, blocks, truth)) as pool, \
+            open(args.output_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for i, rows in enumerate(pool.imap_unordered(_run_task, tasks)):
+            writer.writerows(rows)
+            file.flush()
+            if len(rows) == 0:
+                logger.info(str.format('{}/{} - a combination has no features left.', i + 1, len(tasks)))
+            else:
+                best = max(rows, key=lambda row: row['purity'])
+                logger.info(str.format('{}/{} - {} chunk size {}: purity {}', i + 1, len(tasks),
+                                       best['features'], best['chunk_size'], best['purity']))
+
+    logger.info(str.format('Results written to {}.', args.output_path))
+
+
+def _run_task(task):
+    return run(*task)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ from authorclustering.clusterEvaluator import ClusterEvaluator
 def main():
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('-pt','--pickledtext', help='path to a pickled text object', required=True)
+    parser.add_argument('-pt','--pickledtext', help='path to a saved or pickled text object', required=True)
     parser.add_argument('-nc', '--numclusters', help='number of author clusters', required=True)
     parser.add_argument('-chunk', '--chunksize', help='number of sentences per chunk', required=False, default = 20)
     parser.add_argument('-op', '--outputfile', help='number of sentences per chunk', required=False, default = 'cluster_evaluation_output.txt')
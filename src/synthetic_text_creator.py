@@ -1,8 +1,10 @@
 #!/usr/bin/python3
 
+import json
 import os
 import pickle
 from authorclustering.multi_author_text import Text
+from authorclustering.vocabulary import StringTable
 
 from authorclustering.corenlp import StanfordCoreNLP
 
@@ -16,6 +18,8 @@ class TextMerger(object):
         scnlp = StanfordCoreNLP()
         if author not in self.texts:
             self.texts[author] = []
+        elif not isinstance(self.texts[author], list):
+            self.texts[author] = list(self.texts[author])
         try:
             #print('Text: %s' % text)
             self.texts[author].extend(scnlp.split_sentences(text))
@@ -27,8 +31,10 @@ class TextMerger(object):
 
     def generateText(self, lower, upper):
         text = Text(verbose=self.Verbose)
-        textFile = ""
-        metaFile = ""
+        textParts = []
+        metaParts = []
+        textLength = 0
+        batches = []
         # lower and upper ignored for now, just randomly concatenates texts
         import random
         auths = list(self.texts.keys())
@@ -51,21 +57,43 @@ class TextMerger(object):
             #print(new_text_sentences[0])
             #assert False
             new_text = ' '.join(new_text_sentences)
-            text.add_sentences(curauth, new_text_sentences)
-            metaFile += '%d,,, %d,,, %s\n' % (len(textFile), len(textFile) + len(new_text) - 1, curauth)
-            textFile += new_text
+            batches.append((curauth, new_text_sentences))
+            metaParts.append('%d,,, %d,,, %s\n' % (textLength, textLength + len(new_text) - 1, curauth))
+            textParts.append(new_text)
+            textLength += len(new_text)
 
-        return textFile, metaFile, text
+        text.add_sentence_batches(batches)
+        return ''.join(textParts), ''.join(metaParts), text
 
     def writeToFile(self, fname):
-        with open(fname, 'wb') as f:
-            import pickle
-            pickle.dump(self, f)
+        """
+        Writes the sentences of every author to a directory, one offset-indexed
+        UTF-8 blob per author, so that they can be memory-mapped when loaded.
+        :param fname: Directory name to write this generator to.
+        """
+        os.makedirs(fname, exist_ok=True)
+        authors = list(self.texts.keys())
+        for i, author in enumerate(authors):
+            StringTable.from_strings(self.texts[author]).save(os.path.join(fname, 'author%d' % i))
+        with open(os.path.join(fname, 'merger.json'), 'w', encoding='utf-8') as f:
+            json.dump({'authors': authors, 'failcount': self.failcount}, f)
 
     @staticmethod
     def loadFromFile(fname, verbose = False):
+        """
+        :param fname: Directory name written by writeToFile(), or file name of
+        a pickled generator.
+        :return: the read generator.
+        """
+        if os.path.isdir(fname):
+            with open(os.path.join(fname, 'merger.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            textgen = TextMerger(verbose)
+            textgen.failcount = meta['failcount']
+            for i, author in enumerate(meta['authors']):
+                textgen.texts[author] = StringTable.load(os.path.join(fname, 'author%d' % i))
+            return textgen
         with open(fname, 'rb') as f:
-            import pickle
             textgen = pickle.load(f)
             textgen.Verbose = verbose
             return textgen
@@ -77,13 +105,18 @@ def main():
     parser.add_argument('-c', '--chunk', help='number of sentences per chunk, as -c <size> or -c <lower> <upper> for random values between a range', required=True, nargs = '*')
     parser.add_argument('-oth', '--hrtxt', help='output human-readable text file', required=False)
     parser.add_argument('-omh', '--hrmeta', help='output human-readable metadata file', required=False)
-    parser.add_argument('-opick', '--pickletext', help='output file for pickled Text object', required=True)
-    parser.add_argument('-ogenpick', '--generatorpickle', help='output file for pickled text generator', required=False)
+    parser.add_argument('-otext', '--textdir', '-opick', '--pickletext', dest='textdir',
+                        help='output directory for the Text object, written in the memory-mapped columnar format '
+                             '(-opick is the former name of this flag)', required=True)
+    parser.add_argument('-ogen', '--generatordir', '-ogenpick', '--generatorpickle', dest='generatordir',
+                        help='directory of the text generator, loaded if it exists and written otherwise; '
+                             'a generator pickled by earlier versions is loaded too '
+                             '(-ogenpick is the former name of this flag)', required=False)
     args = parser.parse_args()
 
     tm = None
-    if args.generatorpickle and os.path.exists(args.generatorpickle):
-        tm = TextMerger.loadFromFile(args.generatorpickle, verbose = True)
+    if args.generatordir and os.path.exists(args.generatordir):
+        tm = TextMerger.loadFromFile(args.generatordir, verbose = True)
     else:
         tm = TextMerger(verbose=True)
         for subdir, dirs, files in os.walk(args.texts):
@@ -111,8 +144,8 @@ def main():
             #print(tm.texts)
             print("\t\tRead %d texts for author." % count)
 
-        if(args.generatorpickle):
-            tm.writeToFile(args.generatorpickle)
+        if(args.generatordir):
+            tm.writeToFile(args.generatordir)
 
     if len(args.chunk) == 1:
         textFile, metaFile, text = tm.generateText(int(args.chunk[0]), int(args.chunk[0]))
@@ -130,6 +163,6 @@ def main():
     print("Parsing sentences...")
     text.cacheWords()
     print("Done parsing sentences...")
-    text.writeToFile(args.pickletext)
+    text.writeToFile(args.textdir)
 
 main()
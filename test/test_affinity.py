@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy
+from scipy import sparse
+
+from authorclustering.affinity import cosine_similarity, knn_graph, normalize_rows
+
+
+class KnnGraphTest(TestCase):
+    def setUp(self):
+        self.vectors = sparse.csr_matrix(numpy.array([
+            [1, 1, 0, 0],
+            [1, 1, 1, 0],
+            [0, 0, 1, 1],
+            [0, 0, 1, 2],
+            [0, 0, 0, 0]
+        ]))
+
+    def test_normalize_rows(self):
+        norms = numpy.asarray(normalize_rows(self.vectors).multiply(normalize_rows(self.vectors)).sum(axis=1))
+        self.assertTrue(numpy.allclose(norms.ravel(), [1, 1, 1, 1, 0]))
+
+    def test_blocks_match_whole(self):
+        whole = knn_graph(self.vectors, 1, block_size=5).toarray()
+        blocked = knn_graph(self.vectors, 1, block_size=2).toarray()
+        self.assertTrue(numpy.allclose(whole, blocked))
+        self.assertTrue(numpy.allclose(whole, whole.T))
+        self.assertAlmostEqual(whole[0, 1], numpy.sqrt(2 / 3))
+        self.assertAlmostEqual(whole[2, 3], 3 / numpy.sqrt(10))
+        self.assertEqual(whole[0, 2], 0)
+        self.assertEqual(knn_graph(self.vectors, 1).dtype, numpy.float64)
+
+    def test_block_bytes(self):
+        # Blocks of a single row of five float32 similarities match whole blocks.
+        whole = knn_graph(self.vectors, 2, block_size=5).toarray()
+        bounded = knn_graph(self.vectors, 2, block_size=5, max_block_bytes=20).toarray()
+        self.assertTrue(numpy.allclose(whole, bounded))
+
+
+class CosineSimilarityTest(TestCase):
+    def test_blocks_match_whole(self):
+        vectors = numpy.random.RandomState(0).rand(7, 5)
+        normalized = vectors / numpy.linalg.norm(vectors, axis=1)[:, numpy.newaxis]
+        expected = normalized @ normalized.T
+        for block_size in [1, 3, 7]:
+            similarity = cosine_similarity(sparse.csr_matrix(vectors), block_size=block_size)
+            self.assertEqual(similarity.dtype, numpy.float32)
+            self.assertTrue(numpy.allclose(similarity, expected, atol=1e-6))
+
+    def test_memmap_output(self):
+        vectors = numpy.eye(3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'affinity.npy')
+            similarity = cosine_similarity(vectors, block_size=2, path=path)
+            similarity.flush()
+            self.assertTrue(numpy.allclose(numpy.load(path), numpy.eye(3)))
+            del similarity
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from authorclustering.async_corenlp import AsyncStanfordCoreNLP
+from authorclustering.cache import AnnotationCache
+
+OUTPUT = {'sentences': [{'tokens': [{'word': 'Hola', 'pos': 'I'}]}]}
+
+
+class FakeResponse:
+    def __init__(self, session, status):
+        self.session = session
+        self.status = status
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        # Yields to the other requests, so they pile up if nothing bounds them.
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.session.in_flight -= 1
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return json.dumps(OUTPUT).encode()
+
+
+class FakeSession:
+    """
+    Stands in for an aiohttp.ClientSession, answering 503 to the first POST requests.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.posts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def post(self, url, params=None, data=None):
+        self.posts += 1
+        return FakeResponse(self, 503 if self.posts <= self.failures else 200)
+
+    async def close(self):
+        pass
+
+
+def run(nlp, session, coroutine):
+    async def main():
+        nlp._session = session
+        nlp._semaphore = asyncio.Semaphore(nlp.max_in_flight)
+        try:
+            return await coroutine()
+        finally:
+            await nlp.close()
+    return asyncio.run(main())
+
+
+class AsyncStanfordCoreNLPTest(TestCase):
+    def test_retry_server_errors(self):
+        nlp = AsyncStanfordCoreNLP('http://localhost:1', retries=3, backoff=0)
+        session = FakeSession(failures=2)
+        self.assertEqual(run(nlp, session, lambda: nlp.parse('Hola')), (['Hola'], ['I']))
+        self.assertEqual(session.posts, 3)
+
+        nlp = AsyncStanfordCoreNLP('http://localhost:1', retries=1, backoff=0)
+        session = FakeSession(failures=10)
+        with self.assertRaises(Exception):
+            run(nlp, session, lambda: nlp.parse('Hola'))
+        self.assertEqual(session.posts, 2)
+
+    def test_max_in_flight(self):
+        nlp = AsyncStanfordCoreNLP('http://localhost:1', max_in_flight=3)
+        session = FakeSession()
+
+        async def parse():
+            return await asyncio.gather(*[nlp.parse(str.format('Hola {}', i)) for i in range(20)])
+
+        self.assertEqual(len(run(nlp, session, parse)), 20)
+        self.assertEqual(session.posts, 20)
+        self.assertEqual(session.max_in_flight, 3)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AnnotationCache(os.path.join(directory, 'cache.db'))
+            # The connection is opened here and used from the thread of the client.
+            self.assertIsNone(cache.get('Hola', {}))
+            texts = ['Hola', '']
+            nlp = AsyncStanfordCoreNLP('http://localhost:1', cache=cache)
+            session = FakeSession()
+            self.assertEqual(run(nlp, session, lambda: nlp.parse_many(texts)), [(['Hola'], ['I']), ([], [])])
+            posts = session.posts
+
+            nlp = AsyncStanfordCoreNLP('http://localhost:1', cache=cache)
+            self.assertEqual(run(nlp, session, lambda: nlp.parse_many(texts)), [(['Hola'], ['I']), ([], [])])
+            self.assertEqual(session.posts, posts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import re
+import unittest
+from unittest import TestCase, mock
+
+from authorclustering.authorcluster import AuthorCluster
+from authorclustering.corenlp import StanfordCoreNLP
+from authorclustering.multi_author_text import Text
+
+
+def parse_many(texts):
+    # Splits punctuation off words like CoreNLP, unlike splitting on whitespace.
+    tokens = [re.findall(r'\w+|[^\w\s]', text) for text in texts]
+    return [(words, ['X'] * len(words)) for words in tokens]
+
+
+class AuthorClusterTest(TestCase):
+    def test_cluster_unknown_number(self):
+        text = Text()
+        first = ['el perro come carne roja.', 'el perro ladra mucho hoy.']
+        second = ['la casa tiene puerta azul.', 'la casa tiene ventana grande.']
+        for i in range(10):
+            text.add_sentences('ana' if i % 2 == 0 else 'luis', first if i % 2 == 0 else second)
+
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=parse_many) as parse, \
+                mock.patch.object(StanfordCoreNLP, 'parse') as parse_text:
+            num_clusters, clusters = AuthorCluster().cluster_unknown_number(text, 2, numNeighbors=3,
+                                                                            nlp=StanfordCoreNLP())
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(parse_text.call_count, 0)
+        self.assertIsNone(text.Words)
+        self.assertEqual(num_clusters, 2)
+        self.assertEqual(sorted(len(c) for c in clusters), [10, 10])
+        for c in clusters:
+            self.assertEqual(len(set(text.getAuthorIndexForSentence(i) for i in c)), 1)
+
+    def test_chunk_vectors_use_parsed_words(self):
+        text = Text()
+        text.add_sentences('ana', ['Hola, perro.', 'Adiós, gato.'])
+        with self.assertRaises(Exception):
+            AuthorCluster()._chunkVectors(text, 1)
+
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=parse_many):
+            chunkIds, parsed = AuthorCluster()._chunkVectors(text, 1, StanfordCoreNLP())
+            self.assertIsNone(text.TokenOffsets)
+            text.cacheWords()
+        with mock.patch.object(StanfordCoreNLP, 'parse_many') as parse:
+            _, cached = AuthorCluster()._chunkVectors(text, 1)
+        self.assertEqual(parse.call_count, 0)
+        self.assertEqual(chunkIds, [[0], [1]])
+        # Every token of a chunk is among the most common words, punctuation included.
+        self.assertEqual(parsed.sum(axis=1).tolist(), [4, 4])
+        self.assertEqual(cached.tolist(), parsed.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy
+from scipy import sparse
+
+from authorclustering.blocks import BlockCache, hstack_blocks, load_csr, save_csr
+
+
+class BlocksTest(TestCase):
+    def test_save_load(self):
+        matrix = sparse.csr_matrix(numpy.array([[1, 0, 2], [0, 0, 0], [0, 3, 0]], dtype=numpy.float64))
+        with tempfile.TemporaryDirectory() as directory:
+            save_csr(matrix, os.path.join(directory, 'w_20'))
+            loaded = load_csr(os.path.join(directory, 'w_20'))
+            self.assertEqual(loaded.shape, (3, 3))
+            self.assertEqual(loaded.toarray().tolist(), matrix.toarray().tolist())
+
+            stacked = hstack_blocks([loaded, sparse.csr_matrix(numpy.ones((3, 1)))])
+            self.assertEqual(stacked.shape, (3, 4))
+            self.assertEqual(stacked.toarray()[:, 3].tolist(), [1, 1, 1])
+
+    def test_save_replaces_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path_prefix = os.path.join(directory, 'w_20')
+            save_csr(sparse.csr_matrix(numpy.eye(2)), path_prefix)
+            loaded = load_csr(path_prefix)
+            save_csr(sparse.csr_matrix(2 * numpy.eye(2)), path_prefix)
+            # A matrix mapped before it was saved again still reads the files it mapped.
+            self.assertEqual(loaded.toarray().tolist(), [[1, 0], [0, 1]])
+            self.assertEqual(load_csr(path_prefix).toarray().tolist(), [[2, 0], [0, 2]])
+            self.assertEqual([name for name in os.listdir(directory) if name.endswith('.tmp')], [])
+
+
+class BlockCacheTest(TestCase):
+    def test_keys(self):
+        matrix = sparse.csr_matrix(numpy.eye(2))
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BlockCache(directory)
+            self.assertIsNone(cache.load('W', 'text', 'chunk20', 'vocabulary'))
+            cache.store('W', 'text', 'chunk20', 'vocabulary', matrix)
+            self.assertEqual(cache.load('W', 'text', 'chunk20', 'vocabulary').toarray().tolist(), [[1, 0], [0, 1]])
+            # Word and word bigram blocks must not collide on case-insensitive file systems.
+            self.assertIsNone(cache.load('w', 'text', 'chunk20', 'vocabulary'))
+            self.assertIsNone(cache.load('W', 'text', 'chunk10', 'vocabulary'))
+            self.assertIsNone(cache.load('W', 'other', 'chunk20', 'vocabulary'))
+
+    def test_store_replaces_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BlockCache(directory)
+            cache.store('w', 'text', 'chunk20', 'vocabulary', sparse.csr_matrix(numpy.eye(2)))
+            loaded = cache.load('w', 'text', 'chunk20', 'vocabulary')
+            cache.store('w', 'text', 'chunk20', 'vocabulary', sparse.csr_matrix(2 * numpy.eye(2)))
+            # A block mapped before it was stored again still reads the files it mapped.
+            self.assertEqual(loaded.toarray().tolist(), [[1, 0], [0, 1]])
+            self.assertEqual(cache.load('w', 'text', 'chunk20', 'vocabulary').toarray().tolist(), [[2, 0], [0, 2]])
+            self.assertEqual([name for name in os.listdir(directory) if name.endswith('.tmp')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
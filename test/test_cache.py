@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import TestCase
+
+from authorclustering.cache import AnnotationCache
+
+
+class AnnotationCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.db')
+        self.properties = {'annotators': 'tokenize,ssplit'}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_put(self):
+        cache = AnnotationCache(self.path)
+        self.assertIsNone(cache.get('Hola.', self.properties))
+        cache.put('Hola.', self.properties, {'sentences': []})
+        self.assertEqual(cache.get('Hola.', self.properties), {'sentences': []})
+        self.assertIsNone(cache.get('Hola.', {'annotators': 'tokenize,ssplit,pos'}))
+
+    def test_shared_after_pickling(self):
+        cache = AnnotationCache(self.path)
+        cache.put('Hola.', self.properties, {'sentences': []})
+        copied = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(copied.get('Hola.', self.properties), {'sentences': []})
+
+    def test_lru_eviction(self):
+        output = {'sentences': [str(i) for i in range(100)]}
+        cache = AnnotationCache(self.path, max_bytes=1000)
+        for i in range(50):
+            cache.put(str(i), self.properties, output)
+        self.assertLess(len(cache), 50)
+        self.assertIsNotNone(cache.get('49', self.properties))
+        self.assertIsNone(cache.get('0', self.properties))
+
+    def test_total_size(self):
+        cache = AnnotationCache(self.path, max_bytes=1000)
+        for i in range(50):
+            cache.put(str(i % 30), self.properties, {'sentences': [str(i)] * (i % 7)})
+        connection = cache._connect()
+        total = connection.execute('SELECT size FROM totals').fetchone()[0]
+        self.assertEqual(total, connection.execute('SELECT SUM(size) FROM annotations').fetchone()[0])
+        self.assertLessEqual(total, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import glob
 import os
+import re
 from unittest import TestCase
 
 from authorclustering.corenlp import StanfordCoreNLP
@@ -33,6 +34,39 @@ class StanfordCoreNLPTest(TestCase):
                 file.write(s + '\n')
         self.assertTrue(os.path.isfile('test_split_sentences.txt'))
 
+    def test_parse_many(self):
+        requests = []
+
+        def fake_request(text, properties):
+            # Splits on whitespace and blank lines like tokenize,ssplit,pos would.
+            requests.append(text)
+            sentences = []
+            for paragraph in re.finditer(r'(?:(?!\n\n).)+', text, re.DOTALL):
+                tokens = []
+                for match in re.finditer(r'\S+', paragraph.group()):
+                    tokens.append({'word': match.group(), 'pos': 'x',
+                                   'characterOffsetBegin': paragraph.start() + match.start(),
+                                   'characterOffsetEnd': paragraph.start() + match.end()})
+                if len(tokens) > 0:
+                    sentences.append({'tokens': tokens})
+            return {'sentences': sentences}
+
+        self.nlp._request = fake_request
+        texts = ['Hola mundo.', '', 'Otra frase aqui.', 'Adios.']
+        results = self.nlp.parse_many(texts)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(results[0], (['Hola', 'mundo.'], ['x', 'x']))
+        self.assertEqual(results[1], ([], []))
+        self.assertEqual(results[2][0], ['Otra', 'frase', 'aqui.'])
+        self.assertEqual(results[3][0], ['Adios.'])
+
+        sentences = self.nlp.split_sentences_many(texts)
+        self.assertEqual(sentences, [['Hola mundo.'], [], ['Otra frase aqui.'], ['Adios.']])
+
+    def test_pack(self):
+        batches = StanfordCoreNLP.pack(['a' * 6, 'b' * 6, 'c' * 20, 'd'], max_bytes=16)
+        self.assertEqual(batches, [[0, 1], [2], [3]])
+
     def test_parse(self):
         nlp = StanfordCoreNLP('http://localhost:8011')
         nlp.parse('Por presupuesto, calidad, historia y escenario. Otra cosa con el 1-1 en la mochila y esta plantilla sería catastrófico.A la pizarra vuelve la ficha maestra, Cristiano Ronaldo. Y seguramente que esto le muestre el camino de banco a un Adebayor que, aunque bregador como en pocos tramos de su carrera, debería dejar su sitio a un Benzema de dulce. En la ida desatascó el asunto en un ramalazo de nueve y se confía en él para hacer lo propio en la vuelta. Además el galo se entiende bien con Cristiano. Son dos nueves invisibles, distantes de la ortodoxia que pide la camiseta y precisamente por ello temibles. En particular se espera que un Cristiano fresco tenga la llave que la abra al Madrid la puerta de cuartos. Para volver a pasear por los pasillos nobles de la que siempre ha sido su casa.El resto deberán aportar movilidad a la receta. El centro del campo del Olympique no aguanta la comparación técnica con el merengue pero es correoso y sacrificado como pocos. Son chicles en la suela durante un día de verano y el Madrid deberá moverse y mover para asomarse a los huecos. Ya saben, a lo que digan Xabi y Özil. Atrás habrá tirar de retrovisor para pegarse a un listo como Lisandro y no permitir ni una alegría a balón parado. Clave puede ser esto último si hay cromos como Pjanic (que quizá sustituya al tocado Gorcouff) de por medio.El Madrid es favorito por historia juego y factor campo aunque las dificultades que siempre se han encontrado frente al Lyon no deben menospreciarse a la hora de la apuesta. bwin.com paga 1.35 € por la victoria del Madrid y 7.75 € por la del club francés. Números cantán. La clasificación gala se paga a 5. 25 euros.')
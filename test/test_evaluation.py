@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import TestCase
+
+import numpy
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+from authorclustering.clusterEvaluator import ClusterEvaluator
+from authorclustering.evaluation import contingency_matrix, evaluate
+from authorclustering.multi_author_text import Text
+
+
+class EvaluationTest(TestCase):
+    def setUp(self):
+        self.labels = numpy.array([2, 2, 2, 0, 0, 0, 0, 5, 5])
+        self.truth = ['a', 'a', 'b', 'b', 'b', 'b', 'c', 'c', 'c']
+
+    def test_contingency_matrix(self):
+        contingency, labels, classes = contingency_matrix(self.labels, self.truth)
+        self.assertEqual(labels.tolist(), [0, 2, 5])
+        self.assertEqual(classes.tolist(), ['a', 'b', 'c'])
+        self.assertEqual(contingency.tolist(), [[0, 3, 1], [2, 1, 0], [0, 0, 2]])
+
+    def test_scores(self):
+        result = evaluate(self.labels, self.truth)
+        self.assertAlmostEqual(result['purity'], 7 / 9)
+        self.assertAlmostEqual(result['nmi'], normalized_mutual_info_score(self.truth, self.labels))
+        self.assertAlmostEqual(result['ari'], adjusted_rand_score(self.truth, self.labels))
+        self.assertAlmostEqual(result['bcubed_precision'], (10 / 4 + 5 / 3 + 2) / 9)
+        self.assertAlmostEqual(result['bcubed_recall'], (4 / 2 + 10 / 4 + 5 / 3) / 9)
+        self.assertEqual(result['majorities'].tolist(), ['b', 'a', 'c'])
+        self.assertEqual(result['sizes'].tolist(), [4, 3, 2])
+
+    def test_perfect(self):
+        result = evaluate([1, 1, 0], ['x', 'x', 'y'])
+        for name in ('purity', 'nmi', 'ari', 'bcubed_f1'):
+            self.assertAlmostEqual(result[name], 1)
+
+
+class ClusterEvaluatorTest(TestCase):
+    def test_evaluate_purity(self):
+        text = Text()
+        text.add_sentences('ana', ['uno', 'dos', 'tres'])
+        text.add_sentences('luis', ['cuatro', 'cinco'])
+        majorities, purities, overall = ClusterEvaluator().evaluatePurity([[0, 1, 3], None, [2, 4]], text)
+        self.assertEqual(majorities, [0, -1, 0])
+        self.assertEqual(purities[1], -1)
+        self.assertAlmostEqual(purities[0], 2 / 3)
+        self.assertAlmostEqual(overall, 3 / 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
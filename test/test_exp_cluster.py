@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy
+from scipy import sparse
+
+import authorclustering.feature
+from authorclustering.vectorizer import HashingVectorizer, SparseVectorizer
+from authorclustering.vocabulary import Vocabulary
+from exp_cluster import Evaluation, Feature
+
+
+class AggregateTest(TestCase):
+    def setUp(self):
+        self.words = [['la', 'casa', '.'], ['el', 'perro', 'y', 'la', 'casa', '.'], ['el', 'gato', '.']]
+        self.postags = [['DA0', 'NC0', 'Fp'], ['DA0', 'NC0', 'CC0', 'DA0', 'NC0', 'Fp'], ['DA0', 'NC0', 'Fp']]
+        self.chunks = [{'ids': [0, 1]}, {'ids': [2]}, {'ids': [1, 2]}]
+
+    def vectorize(self, vectorizer):
+        """
+        :return: A tuple (chunk vectors aggregated from sentence vectors, chunk vectors
+        of the words of their sentences).
+        """
+        sentences = vectorizer.transform([' '.join(w) for w in self.words], self.words, self.postags)
+        words = [sum([self.words[i] for i in chunk['ids']], []) for chunk in self.chunks]
+        postags = [sum([self.postags[i] for i in chunk['ids']], []) for chunk in self.chunks]
+        chunks = vectorizer.transform([' '.join(w) for w in words], words, postags)
+        return (Feature.aggregate(sentences, self.chunks, not vectorizer.counts).toarray(),
+                chunks.toarray())
+
+    def test_aggregate_like_chunks(self):
+        vocabulary = Vocabulary.from_terms({
+            'w': ['la', 'casa', 'el', 'perro', '.'],
+            'W': ['la casa', 'el perro', 'casa .'],
+            'p': ['DA0', 'NC0', 'Fp'],
+            'P': ['DA0 NC0', 'NC0 Fp']
+        })
+        for counts in (False, True):
+            aggregated, chunks = self.vectorize(SparseVectorizer(vocabulary, 'wWpP', counts=counts))
+            self.assertEqual(aggregated.tolist(), chunks.tolist())
+
+    def test_cross_sentence_ngrams(self):
+        # '. el' and 'Fp DA0' span the sentences of the first and last chunks only.
+        vocabulary = Vocabulary.from_terms({'W': ['. el', 'la casa'], 'P': ['Fp DA0', 'DA0 NC0']})
+        for counts in (False, True):
+            aggregated, chunks = self.vectorize(SparseVectorizer(vocabulary, 'WP', counts=counts))
+            # Columns: . el, la casa | DA0 NC0, Fp DA0
+            spanning = [0, 3]
+            self.assertEqual(aggregated[:, [1, 2]].tolist(), chunks[:, [1, 2]].tolist())
+            self.assertEqual(aggregated[:, spanning].tolist(), [[0, 0], [0, 0], [0, 0]])
+            self.assertEqual(chunks[:, spanning].tolist(), [[1, 1], [0, 0], [1, 1]])
+
+    def test_hashed_signs(self):
+        vectorizer = HashingVectorizer('wp', 1024)
+        aggregated, chunks = self.vectorize(vectorizer)
+        self.assertTrue(numpy.all(numpy.isin(aggregated, [-1, 0, 1])))
+        self.assertTrue(numpy.all(numpy.isin(chunks, [-1, 0, 1])))
+        # A chunk of one sentence is vectorized the same way either way.
+        self.assertEqual(aggregated[1].tolist(), chunks[1].tolist())
+
+    def test_many_hashed_columns(self):
+        num_columns = 6 * 2 ** 31
+        sentences = sparse.csr_matrix(([1.0, -1.0, 1.0], [num_columns - 1, 7, num_columns - 1], [0, 2, 3]),
+                                      shape=(2, num_columns))
+        aggregated = Feature.aggregate(sentences, [{'ids': [0, 1]}, {'ids': [1]}])
+        self.assertEqual(aggregated.shape, (2, num_columns))
+        self.assertEqual(aggregated.indices.tolist(), [7, num_columns - 1, num_columns - 1])
+        self.assertEqual(aggregated.data.tolist(), [-1, 1, 1])
+
+
+class RemoveFeaturesTest(TestCase):
+    def test_many_hashed_columns(self):
+        # Columns set in half the rows are kept, those set in every row are not.
+        rows = [[0, 2 ** 33], [0, 2 ** 34], [0, 2 ** 33], [0, 2 ** 34]]
+        vectors = sparse.csr_matrix((numpy.ones(8), numpy.ravel(rows), numpy.arange(0, 9, 2)), shape=(4, 2 ** 35))
+        selected = Feature.remove_features(vectors)
+        self.assertEqual(selected.toarray().tolist(), [[1, 0], [0, 1], [1, 0], [0, 1]])
+
+
+class LoadTest(TestCase):
+    def test_load_binary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            word_path = authorclustering.feature.Feature.save_model(
+                {'la': 3, 'casa': 1, 'ñu': 2}, os.path.join(directory, 'word'), binary=True)
+            postag_path = os.path.join(directory, 'postag.txt')
+            with open(postag_path, 'w', encoding='utf-8') as file:
+                file.write('DA0 4\nNC0 2\n')
+            feature = Feature()
+            feature.load(word_path=word_path, postag_path=postag_path)
+        # Binary terms are only in the vocabulary, text terms are also in the sets.
+        self.assertEqual(feature.words, set())
+        self.assertEqual(feature.postags, {'DA0', 'NC0'})
+        self.assertEqual(feature.most_common_words, {'la', 'casa', 'ñu'})
+        self.assertIn('ñu', feature.vocabulary.index('w'))
+        self.assertNotIn('perro', feature.vocabulary.index('w'))
+        self.assertEqual(list(feature.vocabulary.terms('p')), ['DA0', 'NC0'])
+
+
+class EvaluationTest(TestCase):
+    def test_chunk_majorities(self):
+        chunks = [{'author': ['luis', 'ana', 'ana']}, {'author': ['luis', 'ana']},
+                  {'author': ['luis', 'ana', 'luis', 'ana']}, {'author': ['ana']}]
+        # Ties go to the author who appears first in the chunk.
+        self.assertEqual(Evaluation.chunk_majorities(chunks).tolist(), ['ana', 'luis', 'luis', 'ana'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import logging
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+from authorclustering.blocks import BlockCache
+from authorclustering.corenlp import StanfordCoreNLP
+from authorclustering.multi_author_text import Text
+from authorclustering.vocabulary import Vocabulary
+from exp_cluster import Chunk, Feature
+from exp_grid import RESULT_FIELDS, _init_worker, build_blocks, feature_subsets, run
+
+SENTENCES = {
+    'ana': ['el perro come carne', 'el perro ladra hoy', 'el gato come pescado', 'el gato duerme hoy'],
+    'luis': ['la casa tiene puerta', 'la casa es azul', 'la mesa tiene patas', 'la mesa es grande']
+}
+
+
+def parse_many(texts):
+    return [(text.split(), ['DA0', 'NC0'] + ['VMI'] * (len(text.split()) - 2)) for text in texts]
+
+
+def parallel_parse(chunks, cache=None):
+    # Stands in for Feature._parallel_parse() without a CoreNLP server.
+    return parse_many(chunks)
+
+
+class ExpGridTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.block_cache = BlockCache(self.directory.name)
+        self.text = Text()
+        for i in range(4):
+            for author, sentences in SENTENCES.items():
+                self.text.add_sentences(author, sentences[i:i + 1])
+        self.chunk = Chunk()
+        for i, sentence in enumerate(self.text.Sentences):
+            self.chunk.append_sentences(self.text.getAuthorForSentenceIndex(i), [sentence], [i])
+        words = sorted(set(' '.join(self.text.Sentences).split()))
+        self.feature = Feature()
+        self.feature.vocabulary = Vocabulary.from_terms({'w': words, 'p': ['DA0', 'NC0', 'VMI']})
+        self.logger = logging.getLogger(__name__)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_feature_subsets(self):
+        self.assertEqual(feature_subsets('Pw'), ['w', 'P', 'wP'])
+        self.assertEqual(len(feature_subsets('wWcpPT')), 63)
+
+    def test_build_blocks(self):
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=parse_many):
+            self.text.cacheWords()
+        blocks, truth = build_blocks(self.feature, self.text, self.chunk, 'pw', [1, 2], self.block_cache, self.logger)
+        self.assertEqual(sorted(blocks), [('p', 1), ('p', 2), ('w', 1), ('w', 2)])
+        self.assertEqual(truth[1].tolist(), ['ana', 'luis'] * 4)
+
+        chunks = self.chunk.generate(2)
+        expected = self.feature._vectorize([c['text'] for c in chunks], 'w', self.text, [c['ids'] for c in chunks])
+        self.assertEqual(self.block_cache.load(*blocks[('w', 2)]).toarray().tolist(), expected.toarray().tolist())
+
+        # Without sentence token offsets, chunks are aggregated from parsed sentences.
+        self.text.Words = None
+        self.text.Tags = None
+        block_cache = BlockCache(self.directory.name + '/sentences')
+        with mock.patch.object(Feature, '_parallel_parse', staticmethod(parallel_parse)):
+            sentence_blocks, _ = build_blocks(self.feature, self.text, self.chunk, 'pw', [1, 2], block_cache, self.logger)
+        self.assertEqual(sentence_blocks[('w', 2)][2], 'sentences_chunk2')
+        for key in blocks:
+            self.assertEqual(block_cache.load(*sentence_blocks[key]).toarray().tolist(),
+                             self.block_cache.load(*blocks[key]).toarray().tolist())
+
+    def test_run(self):
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=parse_many):
+            self.text.cacheWords()
+        blocks, truth = build_blocks(self.feature, self.text, self.chunk, 'wp', [1], self.block_cache, self.logger)
+        _init_worker('binary', {}, self.block_cache, blocks, truth)
+        for n_neighbors in (None, 3):
+            rows = run('wp', 1, [2, 3], 2, n_neighbors, 4)
+            self.assertEqual([(row['n_clusters'], row['seed']) for row in rows], [(2, 0), (2, 1), (3, 0), (3, 1)])
+            for row in rows:
+                self.assertEqual(sorted(row), sorted(RESULT_FIELDS))
+                self.assertEqual(row['features'], 'wp')
+                self.assertTrue(0 < row['num_features'] <= len(self.feature.vocabulary.terms('w')) + 3)
+                self.assertTrue(0 <= row['purity'] <= 1)
+            self.assertEqual(max(row['purity'] for row in rows if row['n_clusters'] == 2), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
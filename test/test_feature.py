@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import os
-from unittest import TestCase
+import tempfile
+from unittest import TestCase, mock
 
 from authorclustering.corenlp import StanfordCoreNLP
-from authorclustering.feature import Feature
+from authorclustering.feature import BINARY_SUFFIX, Feature, NgramCounter
+
+
+def count_whitespace_tokens(url, text, paragraphs, cache=None, num_gram=4):
+    # Stands in for Feature._multi_count() without a CoreNLP server.
+    words = text.split()
+    return NgramCounter.from_chunk(words, [word[0] for word in words], paragraphs, num_gram)
 
 
 class FeatureTest(TestCase):
@@ -27,5 +34,68 @@ class FeatureTest(TestCase):
         self.assertTrue(os.path.isfile('test_bipos_model.txt'))
 
 
+class CorporaCountTest(TestCase):
+    def test_incremental_counts_like_whole(self):
+        texts = {'b/2.txt': 'e f g\nh i\n', 'a/2.txt': 'c d\n', 'b/1.txt': 'x y z\n', 'a/1.txt': 'a b\nb c\n'}
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Feature, '_multi_count', staticmethod(count_whitespace_tokens)):
+            input_path = os.path.join(directory, 'corpora')
+            for name, text in texts.items():
+                os.makedirs(os.path.dirname(os.path.join(input_path, name)), exist_ok=True)
+                with open(os.path.join(input_path, name), 'w', encoding='utf-8') as file:
+                    file.write(text)
+            wf = Feature('localhost')
+            whole = NgramCounter.tree_reduce(wf._count_chunks(wf._read_chunks(input_path))).models()
+            manifest_path = os.path.join(directory, 'manifest')
+            self.assertEqual(wf._count_incrementally(input_path, manifest_path).models(), whole)
+            # The second run reuses the stored counts of every file.
+            self.assertEqual(wf._count_incrementally(input_path, manifest_path).models(), whole)
+            self.assertEqual(whole['triword']['b c c'], 1)
+            self.assertEqual(whole['triword']['d x y'], 1)
+
+
+class ModelFileTest(TestCase):
+    def test_save_load_binary(self):
+        model = {'la': 3, 'casa': 1, 'ñu': 2}
+        with tempfile.TemporaryDirectory() as directory:
+            path = Feature.save_model(model, os.path.join(directory, 'word.txt'), binary=True)
+            self.assertEqual(path, os.path.join(directory, 'word.txt' + BINARY_SUFFIX))
+            self.assertFalse(os.path.exists(os.path.join(directory, 'word.txt')))
+            table, counts = Feature.load_model(path)
+            self.assertEqual(list(table), ['casa', 'la', 'ñu'])
+            self.assertEqual(counts.tolist(), [1, 3, 2])
+
+            path = os.path.join(directory, 'word' + BINARY_SUFFIX)
+            self.assertEqual(Feature.save_model(model, path, binary=True), path)
+            table, counts = Feature.load_model(path)
+            self.assertEqual(dict(zip(table, counts.tolist())), model)
+
+
+class NgramCounterTest(TestCase):
+    def test_chunks_count_like_whole(self):
+        words = ['a', 'b', 'c', 'a', 'b', 'c', 'd']
+        postags = ['X', 'Y', 'X', 'Y', 'X', 'Y', 'Z']
+        whole = NgramCounter()
+        whole.update(words, postags, ['abcde'])
+        chunked = NgramCounter()
+        for i in range(0, len(words), 2):
+            chunked.update(words[i:i + 2], postags[i:i + 2], ['abcde'] if i == 0 else [])
+        self.assertEqual(whole.models(), chunked.models())
+        self.assertEqual(whole.models()['triword'], {'a b c': 2, 'b c a': 1, 'c a b': 1, 'b c d': 1})
+
+    def test_tree_reduce_counts_like_whole(self):
+        words = ['a', 'b', 'c', 'a', 'b', 'c', 'd', 'e', 'a']
+        postags = ['X', 'Y', 'X', 'Y', 'X', 'Y', 'Z', 'X', 'Y']
+        whole = NgramCounter.from_chunk(words, postags, ['abcde'])
+        chunks = [NgramCounter.from_chunk(words[i:i + 1], postags[i:i + 1], ['abcde'] if i == 0 else [])
+                  for i in range(len(words))]
+        self.assertEqual(whole.models(), NgramCounter.tree_reduce(chunks).models())
+
+    def test_min_count(self):
+        counter = NgramCounter()
+        counter.update(['a', 'b', 'a'], ['X', 'Y', 'X'], [])
+        self.assertEqual(counter.models(min_count=2)['word'], {'a': 2})
+
+
 if __name__ == '__main__':
     nosetest.main()
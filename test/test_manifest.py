@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from authorclustering.feature import NgramCounter
+from authorclustering.manifest import CountManifest
+
+
+class CountManifestTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'manifest')
+        self.corpus_file = os.path.join(self.directory.name, 'text1.txt')
+        with open(self.corpus_file, 'w', encoding='utf-8') as file:
+            file.write('la casa\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_store_load(self):
+        file_hash = CountManifest.hash_file(self.corpus_file)
+        manifest = CountManifest(self.path)
+        self.assertFalse(manifest.is_current('a/text1.txt', file_hash))
+        manifest.store('a/text1.txt', file_hash, NgramCounter.from_chunk(['la', 'casa'], ['DA0', 'NC0'], []))
+        manifest.save(['a/text1.txt'])
+
+        manifest = CountManifest(self.path)
+        self.assertTrue(manifest.is_current('a/text1.txt', file_hash))
+        self.assertEqual(manifest.load('a/text1.txt').models()['biword'], {'la casa': 1})
+
+    def test_modified_and_removed_files(self):
+        file_hash = CountManifest.hash_file(self.corpus_file)
+        manifest = CountManifest(self.path)
+        manifest.store('a/text1.txt', file_hash, NgramCounter())
+        manifest.save(['a/text1.txt'])
+        with open(self.corpus_file, 'a', encoding='utf-8') as file:
+            file.write('el perro\n')
+        self.assertFalse(manifest.is_current('a/text1.txt', CountManifest.hash_file(self.corpus_file)))
+
+        manifest.save([])
+        self.assertEqual(CountManifest(self.path).files, {})
+        self.assertEqual(os.listdir(self.path), ['manifest.json'])
+
+    def test_num_gram_change_discards_counts(self):
+        file_hash = CountManifest.hash_file(self.corpus_file)
+        manifest = CountManifest(self.path, num_gram=4)
+        manifest.store('a/text1.txt', file_hash, NgramCounter())
+        manifest.save(['a/text1.txt'])
+        self.assertFalse(CountManifest(self.path, num_gram=3).is_current('a/text1.txt', file_hash))
+
+
+if __name__ == '__main__':
+    unittest.main()
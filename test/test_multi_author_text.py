@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+from authorclustering.corenlp import StanfordCoreNLP
+from authorclustering.multi_author_text import Text
+
+
+class TextStorageTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'text')
+        self.text = Text()
+        self.text.add_sentences('ana', ['La casa es azul.', 'El perro ladra.'])
+        self.text.add_sentences('ñoño', ['Hola.'])
+        self.text.add_sentences('ana', ['Adiós.'])
+        self.text.Words = ['La', 'casa', 'es', 'azul', '.', 'El', 'perro', 'ladra', '.', 'Hola', '.', 'Adiós', '.']
+        self.text.Tags = ['DA0', 'NC0', 'VSI', 'AQ0', 'Fp', 'DA0', 'NC0', 'VMI', 'Fp', 'I', 'Fp', 'NC0', 'Fp']
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_open(self):
+        self.text.writeToFile(self.path)
+        text = Text.loadFromFile(self.path)
+        self.assertEqual(list(text.Sentences), self.text.Sentences)
+        self.assertEqual(text.Authors, ['ana', 'ñoño'])
+        self.assertEqual(text.getAuthorIndexForSentence(2), 1)
+        self.assertEqual(text.getAuthorForSentenceIndex(3), 'ana')
+        self.assertEqual(list(text.Words), list(self.text.Words))
+        self.assertEqual(text.Tags[5:8], ['DA0', 'NC0', 'VMI'])
+        self.assertEqual(text.fixed_length_chunk(3), self.text.fixed_length_chunk(3))
+        self.assertEqual(list(text.iter_chunks(3)), [([0, 1, 2], self.text.Sentences[:3]),
+                                                     ([3], ['Adiós.'])])
+
+    def test_add_sentences_after_open(self):
+        self.text.Words = None
+        self.text.Tags = None
+        self.text.save(self.path)
+        text = Text.open(self.path)
+        text.add_sentences('luis', ['Buenas.'])
+        self.assertEqual(text.Sentences[-1], 'Buenas.')
+        self.assertEqual(text.AuthorIds, [0, 0, 1, 0, 2])
+
+
+class TextTokensTest(TestCase):
+    def setUp(self):
+        self.text = Text()
+        self.text.add_sentences('ana', ['La casa.', 'El perro ladra.'])
+
+    @staticmethod
+    def parse_many(texts):
+        return [(text.split(), ['X'] * len(text.split())) for text in texts]
+
+    def test_cache_words(self):
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=self.parse_many):
+            self.text.cacheWords()
+            self.text.add_sentences('luis', ['La perro.'])
+        self.assertEqual(list(self.text.Words), ['La', 'casa.', 'El', 'perro', 'ladra.', 'La', 'perro.'])
+        self.assertEqual(self.text.WordTable, ['La', 'casa.', 'El', 'perro', 'ladra.', 'perro.'])
+        self.assertEqual(self.text.TagTable, ['X'])
+        self.assertEqual(self.text.getSentenceTokenSpan(1), (2, 5))
+        self.assertEqual(self.text.getSentenceTokenSpan(2), (5, 7))
+
+    def test_chunk_tokens(self):
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=self.parse_many):
+            self.text.cacheWords()
+            self.text.add_sentences('luis', ['La perro.'])
+        ids, sentences, words, tags = self.text.fixed_length_chunk(2, tokens=True)
+        self.assertEqual(ids, [[0, 1], [2]])
+        self.assertEqual([list(w) for w in words], [['La', 'casa.', 'El', 'perro', 'ladra.'], ['La', 'perro.']])
+        self.assertEqual(list(tags[1]), ['X', 'X'])
+        word_ids, tag_ids = self.text.getSentenceTokens([0, 2])
+        self.assertEqual([self.text.WordTable[i] for i in word_ids], ['La', 'casa.', 'La', 'perro.'])
+        self.assertEqual(len(tag_ids), 4)
+
+    def test_add_sentence_batches(self):
+        with mock.patch.object(StanfordCoreNLP, 'parse_many', side_effect=self.parse_many) as parse_many:
+            self.text.cacheWords()
+            self.text.add_sentence_batches([('luis', ['Hola.']), ('ana', ['Adiós.', 'Ya.']), ('luis', [])])
+        self.assertEqual(parse_many.call_count, 2)
+        self.assertEqual(self.text.Authors, ['ana', 'luis'])
+        self.assertEqual(self.text.AuthorIds, [0, 0, 1, 0, 0])
+        self.assertEqual(self.text.getSentenceTokenSpan(4), (7, 8))
+
+    def test_legacy_pickle(self):
+        state = self.text.__dict__.copy()
+        for key in ['WordTable', 'WordIds', 'TagTable', 'TagIds', 'TokenOffsets', '_wordIndex', '_tagIndex']:
+            del state[key]
+        state['Words'] = ['La', 'casa', '.']
+        state['Tags'] = ['DA0', 'NC0', 'Fp']
+        legacy = Text.__new__(Text)
+        legacy.__setstate__(state)
+        text = pickle.loads(pickle.dumps(legacy))
+        self.assertEqual(list(text.Words), ['La', 'casa', '.'])
+        self.assertEqual(text.Tags[1], 'NC0')
+        self.assertIsNone(text.TokenOffsets)
+
+
+if __name__ == '__main__':
+    unittest.main()
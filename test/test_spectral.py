@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import TestCase, mock
+
+import numpy
+from scipy import sparse
+
+from authorclustering import spectral
+from authorclustering.spectral import SpectralEmbedding
+
+
+class SpectralEmbeddingTest(TestCase):
+    def setUp(self):
+        block = numpy.ones((4, 4))
+        self.affinity = numpy.block([[block, numpy.full((4, 4), 0.01)],
+                                     [numpy.full((4, 4), 0.01), block]])
+
+    def test_labels(self):
+        embedding = SpectralEmbedding(self.affinity, 3, random_state=0)
+        self.assertEqual(embedding.embedding.shape, (8, 3))
+        self.assertTrue(numpy.all(numpy.diff(embedding.eigenvalues) >= 0))
+        self.assertAlmostEqual(embedding.eigenvalues[0], 0)
+        for seed in range(3):
+            labels = embedding.labels(2, random_state=seed)
+            self.assertEqual(len(set(labels[:4])), 1)
+            self.assertEqual(len(set(labels[4:])), 1)
+            self.assertNotEqual(labels[0], labels[4])
+
+    def test_eigengap(self):
+        embedding = SpectralEmbedding(self.affinity, 5, random_state=0)
+        self.assertEqual(embedding.eigengap_candidates(4)[0], 2)
+        labels = embedding.labels(2, random_state=0)
+        self.assertGreater(embedding.silhouette(labels, sample_size=6), 0.9)
+
+    def test_sparse_matches_dense(self):
+        dense = SpectralEmbedding(self.affinity, 2, random_state=0)
+        with mock.patch.object(spectral, 'DENSE_SOLVER_MAX_ROWS', 0):
+            sparse_embedding = SpectralEmbedding(sparse.csr_matrix(self.affinity), 2, random_state=0)
+        self.assertTrue(numpy.allclose(dense.eigenvalues, sparse_embedding.eigenvalues))
+        self.assertTrue(numpy.allclose(numpy.abs(dense.embedding), numpy.abs(sparse_embedding.embedding)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase, mock
+
+from authorclustering import transport
+from authorclustering.transport import CoreNLPTransport
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Answers 503 to the first POST requests and the JSON body afterwards.
+    """
+    failures = 0
+    posts = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        FlakyHandler.posts += 1
+        if FlakyHandler.posts <= FlakyHandler.failures:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'sentences': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CoreNLPTransportTest(TestCase):
+    def test_liveness_interval(self):
+        corenlp = CoreNLPTransport('http://localhost:1', liveness_interval=10)
+        session = corenlp.session
+        corenlp._session = mock.Mock()
+        with mock.patch.object(transport.time, 'monotonic', return_value=100.0):
+            corenlp.check_alive()
+            corenlp.check_alive()
+        self.assertEqual(corenlp._session.get.call_count, 1)
+        with mock.patch.object(transport.time, 'monotonic', return_value=109.0):
+            corenlp.check_alive()
+        self.assertEqual(corenlp._session.get.call_count, 1)
+        with mock.patch.object(transport.time, 'monotonic', return_value=111.0):
+            corenlp.check_alive()
+        self.assertEqual(corenlp._session.get.call_count, 2)
+        with mock.patch.object(transport.time, 'monotonic', return_value=112.0):
+            corenlp.check_alive(force=True)
+        self.assertEqual(corenlp._session.get.call_count, 3)
+        session.close()
+
+    def test_session_per_process(self):
+        corenlp = CoreNLPTransport('http://localhost:1')
+        session = corenlp.session
+        corenlp._checked_at = 1.0
+        self.assertIs(corenlp.session, session)
+        # A forked child has another pid and must not reuse the parent sockets.
+        with mock.patch.object(transport.os, 'getpid', return_value=corenlp._pid + 1):
+            child_session = corenlp.session
+        self.assertIsNot(child_session, session)
+        self.assertIsNone(corenlp._checked_at)
+        session.close()
+        child_session.close()
+
+    def test_session_per_thread_race(self):
+        corenlp = CoreNLPTransport('http://localhost:1')
+        sessions = []
+
+        def create():
+            # Gives the other threads time to race for the session.
+            time.sleep(0.01)
+            session = mock.Mock()
+            sessions.append(session)
+            return session
+
+        with mock.patch.object(transport.requests, 'Session', side_effect=create):
+            threads = [threading.Thread(target=lambda: corenlp.session) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(sessions), 1)
+        self.assertIs(corenlp.session, sessions[0])
+
+    def test_retry_server_errors(self):
+        server = HTTPServer(('localhost', 0), FlakyHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            FlakyHandler.posts = 0
+            FlakyHandler.failures = 2
+            url = str.format('http://localhost:{}', server.server_port)
+            corenlp = CoreNLPTransport(url, retries=3, backoff=0)
+            self.assertEqual(corenlp.post('hola', {'annotators': 'tokenize'}), {'sentences': []})
+            self.assertEqual(FlakyHandler.posts, 3)
+
+            FlakyHandler.posts = 0
+            FlakyHandler.failures = 10
+            corenlp = CoreNLPTransport(url, retries=1, backoff=0)
+            with self.assertRaises(Exception):
+                corenlp.post('hola', {'annotators': 'tokenize'})
+            self.assertEqual(FlakyHandler.posts, 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
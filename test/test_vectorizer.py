@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy
+from scipy import sparse
+
+import zlib
+
+from authorclustering.vectorizer import HashingVectorizer, SparseVectorizer, column_variances, compact_columns, \
+    hash_terms, inverse_frequencies, select_columns, weight
+from authorclustering.vocabulary import TermIndex, Vocabulary
+
+
+class SparseVectorizerTest(TestCase):
+    def setUp(self):
+        self.vocabulary = Vocabulary.from_terms({
+            'w': ['el', 'la', 'casa'],
+            'W': ['la casa', 'el perro'],
+            'c': ['casa', 'perr'],
+            'p': ['DA0', 'NC0'],
+            'P': ['DA0 NC0'],
+            'T': ['DA0 NC0 DA0']
+        })
+        self.texts = ['la casa', 'el perro']
+        self.words = [['la', 'casa'], ['el', 'perro']]
+        self.postags = [['DA0', 'NC0'], ['DA0', 'NC0']]
+
+    def test_transform(self):
+        vectorizer = SparseVectorizer(self.vocabulary, 'wWc')
+        matrix = vectorizer.transform(self.texts, self.words, self.postags)
+        self.assertEqual(matrix.shape, (2, 7))
+        # Columns are sorted: casa el la | el perro, la casa | casa perr
+        self.assertEqual(matrix.toarray().tolist(), [
+            [1, 0, 1, 0, 1, 1, 0],
+            [0, 1, 0, 1, 0, 0, 1]
+        ])
+
+    def test_column_order_follows_feature_types(self):
+        vectorizer = SparseVectorizer(self.vocabulary, 'Pp')
+        matrix = vectorizer.transform(self.texts, self.words, self.postags)
+        self.assertEqual(matrix.toarray().tolist(), [[1, 1, 1], [1, 1, 1]])
+        self.assertEqual(vectorizer.offsets, {'p': 0, 'P': 2})
+
+    def test_counts(self):
+        vectorizer = SparseVectorizer(self.vocabulary, 'wp', counts=True)
+        matrix = vectorizer.transform(['la la casa'], [['la', 'la', 'casa']], [['DA0', 'DA0', 'NC0']])
+        # Columns: casa el la | DA0 NC0
+        self.assertEqual(matrix.toarray().tolist(), [[1, 0, 2, 2, 1]])
+
+
+class HashingVectorizerTest(TestCase):
+    def test_hash_terms(self):
+        columns, signs = hash_terms(['la casa', 'el'], 16)
+        for term, column, sign in zip(['la casa', 'el'], columns, signs):
+            self.assertEqual(column, zlib.crc32(term.encode()) % 16)
+            self.assertEqual(sign, -1 if zlib.crc32(term.encode()) >= 2 ** 31 else 1)
+
+    def test_transform(self):
+        words = [['la', 'casa', 'la', 'casa'], ['el', 'perro']]
+        postags = [['DA0', 'NC0', 'DA0', 'NC0'], ['DA0', 'NC0']]
+        texts = [' '.join(w) for w in words]
+        vectorizer = HashingVectorizer('Wp', 1024, counts=True)
+        matrix = vectorizer.transform(texts, words, postags)
+        self.assertEqual(matrix.shape, (2, 2048))
+        self.assertEqual(vectorizer.offsets, {'W': 0, 'p': 1024})
+
+        # Bigrams: la casa (2), casa la (1) | POS tags: DA0 (2), NC0 (2)
+        expected = numpy.zeros(2048)
+        for terms, offset in (({'la casa': 2, 'casa la': 1}, 0), ({'DA0': 2, 'NC0': 2}, 1024)):
+            columns, signs = hash_terms(list(terms), 1024)
+            numpy.add.at(expected, columns + offset, signs * numpy.array(list(terms.values())))
+        self.assertTrue(numpy.allclose(matrix.toarray()[0], expected))
+
+        binary = HashingVectorizer('Wp', 1024).transform(texts, words, postags)
+        self.assertTrue(numpy.array_equal(binary.toarray(), numpy.sign(matrix.toarray())))
+
+    def test_int64_columns(self):
+        # Two feature types of 2^31 columns each overflow int32 column indices.
+        vectorizer = HashingVectorizer('wp', 2 ** 31)
+        matrix = vectorizer.transform(['la casa'], [['la', 'casa']], [['DA0', 'NC0']])
+        self.assertEqual(matrix.shape, (1, 2 ** 32))
+        columns, _ = hash_terms(['DA0', 'NC0'], 2 ** 31)
+        self.assertEqual(sorted(matrix.indices[matrix.indices >= 2 ** 31].tolist()), sorted((columns + 2 ** 31).tolist()))
+        self.assertEqual(matrix.nnz, 4)
+
+
+class WeightTest(TestCase):
+    def setUp(self):
+        self.counts = sparse.csr_matrix(numpy.array([[2, 0, 2], [0, 0, 0], [1, 3, 0]], dtype=numpy.float64))
+
+    def test_freq(self):
+        weighted = weight(self.counts, 'freq')
+        self.assertTrue(numpy.allclose(weighted.toarray(), [[0.5, 0, 0.5], [0, 0, 0], [0.25, 0.75, 0]]))
+        self.assertEqual(weight(self.counts, 'binary').toarray().tolist(), [[1, 0, 1], [0, 0, 0], [1, 1, 0]])
+        self.assertEqual(self.counts.toarray()[0].tolist(), [2, 0, 2])
+
+    def test_tfidf(self):
+        idf = inverse_frequencies([98, 1, 0])
+        self.assertTrue(numpy.allclose(idf, numpy.log(100 / numpy.array([99, 2, 1])) + 1))
+        weighted = weight(self.counts, 'tfidf', idf)
+        self.assertTrue(numpy.allclose(weighted.toarray()[2], [0.25 * idf[0], 0.75 * idf[1], 0]))
+
+
+class ColumnSelectionTest(TestCase):
+    def test_variance_threshold(self):
+        matrix = sparse.csr_matrix(numpy.array([[1, 0, 1, 2], [1, 0, 0, 0], [1, 1, 0, 0], [1, 0, 0, 2]]))
+        variances = column_variances(matrix)
+        self.assertTrue(numpy.allclose(variances, [0, 0.1875, 0.1875, 1]))
+        selected = select_columns(matrix, variances > 0.5)
+        self.assertEqual(selected.toarray().tolist(), [[2], [0], [0], [2]])
+
+    def test_compact_columns(self):
+        matrix = sparse.csr_matrix(([1.0, 2.0, 3.0], [2 ** 40, 5, 2 ** 40], [0, 2, 3]), shape=(2, 2 ** 41))
+        columns, compact = compact_columns(matrix)
+        self.assertEqual(columns.tolist(), [5, 2 ** 40])
+        self.assertEqual(compact.toarray().tolist(), [[2, 1], [0, 3]])
+
+
+class VocabularyTest(TestCase):
+    def test_sorted_columns(self):
+        vocabulary = Vocabulary.from_terms({'w': {'la', 'casa', 'el', 'ñu'}})
+        self.assertEqual(list(vocabulary.terms('w')), ['casa', 'el', 'la', 'ñu'])
+        self.assertEqual(vocabulary.index('w')['ñu'], 3)
+
+    def test_index(self):
+        # Terms longer than the search keys are told apart by their remaining bytes.
+        prefix = 'ñ' * TermIndex.KEY_BYTES
+        terms = ['', 'a', 'ab', prefix, prefix + 'a', prefix + 'b', prefix + 'ba', 'z']
+        index = Vocabulary.from_terms({'W': terms}).index('W')
+        self.assertEqual(len(index), len(terms))
+        for i, term in enumerate(sorted(terms)):
+            self.assertEqual(index[term], i)
+        self.assertIsNone(index.get(prefix + 'c'))
+        self.assertIsNone(index.get('ñ'))
+        self.assertNotIn('b', index)
+        self.assertEqual(index.get_many(['z', 'y', prefix + 'ba']).tolist(), [3, -1, 7])
+        self.assertEqual(Vocabulary.from_terms({'w': []}).index('w').get('a', -1), -1)
+
+    def test_save_load(self):
+        vocabulary = Vocabulary.from_terms({'w': ['la', 'casa'], 'W': ['la casa'], 'p': []})
+        with tempfile.TemporaryDirectory() as directory:
+            vocabulary.save(directory)
+            loaded = Vocabulary.load(directory)
+            self.assertEqual(list(loaded.terms('w')), ['casa', 'la'])
+            self.assertEqual(loaded.terms('W')[0], 'la casa')
+            self.assertEqual(len(loaded.terms('p')), 0)
+            self.assertNotIn('c', loaded)
+            self.assertEqual(loaded.digest(), vocabulary.digest())
+            self.assertEqual(loaded.counts, {})
+
+    def test_counts(self):
+        vocabulary = Vocabulary.from_terms({'w': ['la', 'casa'], 'p': ['DA0']}, {'w': {'la': 7, 'casa': 3}})
+        self.assertEqual(vocabulary.counts['w'].tolist(), [3, 7])
+        self.assertNotIn('p', vocabulary.counts)
+        with tempfile.TemporaryDirectory() as directory:
+            vocabulary.save(directory)
+            self.assertEqual(Vocabulary.load(directory).counts['w'].tolist(), [3, 7])
+
+
+if __name__ == '__main__':
+    unittest.main()